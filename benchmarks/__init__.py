@@ -0,0 +1,4 @@
+"""
+Benchmark scripts for the store. Run them from the project root, for
+example: python -m benchmarks.bench_columnar
+"""
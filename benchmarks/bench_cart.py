@@ -0,0 +1,74 @@
+"""
+Time the cart optimizer on carts of 500 lines with alternative
+promotions per product and overlapping cross-product bundles.
+
+Usage: python -m benchmarks.bench_cart [lines] [bundles]
+"""
+import random
+import sys
+import time
+
+import cart
+import products
+import promotions
+
+
+def build(lines, bundle_count, seed=42):
+    """
+    Build a cart and an optimizer for it.
+
+    Parameters:
+    lines (int): The number of cart lines.
+    bundle_count (int): The number of bundle deals.
+    seed (int): The random seed.
+
+    Returns:
+    tuple: (shopping_list, alternatives, bundles).
+    """
+    rng = random.Random(seed)
+    choices = [promotions.PercentDiscount("10% off", percent=10),
+               promotions.SecondHalfPrice("Second Half price!"),
+               promotions.ThirdOneFree("Third One Free!")]
+    catalog = [products.Product(f"sku-{i}", price=rng.randint(1, 200),
+                                quantity=10 ** 6) for i in range(lines)]
+    alternatives = {}
+    for product in catalog:
+        eligible = rng.sample(choices, rng.randint(0, 2))
+        if eligible:
+            product.set_promotion(eligible[0])
+            alternatives[product] = eligible[1:]
+    bundles = []
+    for b in range(bundle_count):
+        items = [(product, rng.randint(1, 2))
+                 for product in rng.sample(catalog, rng.randint(2, 4))]
+        full = sum(product.price * quantity for product, quantity in items)
+        bundles.append(cart.BundleDeal(f"bundle-{b}", items,
+                                       round(full * rng.uniform(0.6, 0.95))))
+    shopping_list = [(product, rng.randint(1, 6)) for product in catalog]
+    return shopping_list, alternatives, bundles
+
+
+def main():
+    """
+    Print the pricing time per cart for several bundle counts and
+    time budgets.
+    """
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    bundle_counts = ([int(sys.argv[2])] if len(sys.argv) > 2
+                     else [0, 20, 100, 500])
+    for bundle_count in bundle_counts:
+        shopping_list, alternatives, bundles = build(lines, bundle_count)
+        for budget in (0.002, 0.01):
+            optimizer = cart.CartOptimizer(bundles, alternatives, budget)
+            best = float('inf')
+            for _ in range(5):
+                start = time.perf_counter()
+                result = optimizer.optimize(shopping_list)
+                best = min(best, time.perf_counter() - start)
+            print(f"{lines} lines, {bundle_count:4} bundles, budget "
+                  f"{budget * 1e3:4.0f} ms: {best * 1e3:7.2f} ms, "
+                  f"total {result.total:10.2f}, exact {result.exact}")
+
+
+if __name__ == "__main__":
+    main()
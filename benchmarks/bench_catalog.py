@@ -0,0 +1,128 @@
+"""
+Measure how long loading a large catalog takes: CSV and JSON Lines
+files through catalog.load_catalog, against building the same products
+one constructor call at a time and adding them with Store.add_product.
+
+Usage: python -m benchmarks.bench_catalog [products]
+"""
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+import catalog
+import kinds
+import products
+import promotions
+import store
+
+
+def make_records(count):
+    """
+    Build catalog records: two promotions, then a mix of product kinds.
+
+    Parameters:
+    count (int): The number of products.
+
+    Returns:
+    list: The records.
+    """
+    records = [{"kind": "percent", "name": "30% off!", "percent": 30},
+               {"kind": "third_one_free", "name": "Third One Free!"}]
+    for i in range(count):
+        record = {"kind": kinds.PRODUCT, "name": f"sku-{i}",
+                  "price": f"{1 + i % 500}.{i % 100:02d}", "quantity": 50}
+        if i % 10 == 0:
+            record = {"kind": kinds.NON_STOCKED, "name": f"sku-{i}",
+                      "price": "9.99"}
+        elif i % 10 == 1:
+            record["kind"] = kinds.LIMITED
+            record["max_per_order"] = 2
+        if i % 7 == 0:
+            record["promotion"] = ("30% off!" if i % 2 else
+                                   "Third One Free!")
+        records.append(record)
+    return records
+
+
+def one_by_one(records):
+    """
+    Build a store the way main used to: one constructor call and one
+    add_product per product.
+
+    Parameters:
+    records (list): The records of make_records.
+
+    Returns:
+    Store: The store.
+    """
+    promotion_table = {}
+    store_inst = store.Store([])
+    for record in records:
+        kind = record["kind"]
+        if kind not in kinds.PRODUCT_CLASSES:
+            promotion_table[record["name"]] = promotions.from_record(
+                record)
+            continue
+        price = float(record["price"])
+        if kind == kinds.NON_STOCKED:
+            product = products.NonStockedProduct(record["name"], price)
+        elif kind == kinds.LIMITED:
+            product = products.LimitedProduct(record["name"], price,
+                                              record["quantity"],
+                                              record["max_per_order"])
+        else:
+            product = products.Product(record["name"], price,
+                                       record["quantity"])
+        if "promotion" in record:
+            product.set_promotion(promotion_table[record["promotion"]])
+        store_inst.add_product(product)
+    return store_inst
+
+
+def timed(function, *args):
+    """
+    Time one call of a function.
+
+    Returns:
+    tuple: (result, seconds).
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """
+    Print the load time of every way of loading.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    records = make_records(count)
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl_path = os.path.join(directory, "catalog.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as stream:
+            for record in records:
+                stream.write(json.dumps(record) + "\n")
+        csv_path = os.path.join(directory, "catalog.csv")
+        with open(csv_path, "w", newline="", encoding="utf-8") as stream:
+            writer = csv.DictWriter(stream, catalog.CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+
+        print(f"{count:,} products")
+        store_inst, seconds = timed(one_by_one, records)
+        print(f"one by one      {seconds:8.2f} s (records already in memory)")
+        expected = store_inst.get_inventory_summary()
+        store_inst = None
+        for label, path in (("csv", csv_path), ("jsonl", jsonl_path)):
+            store_inst, seconds = timed(catalog.load_catalog, path)
+            assert store_inst.get_inventory_summary() == expected
+            store_inst = None
+            print(f"load {label:10} {seconds:8.2f} s "
+                  f"({count / seconds:,.0f} products/s)")
+
+
+if __name__ == "__main__":
+    main()
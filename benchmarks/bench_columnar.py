@@ -0,0 +1,82 @@
+"""
+Compare the object-list Store with the NumPy-backed ColumnarStore on
+catalog-wide operations.
+
+Usage: python -m benchmarks.bench_columnar [product_count]
+"""
+import sys
+import time
+
+import columnar
+import products
+import store
+
+
+def build_catalog(count):
+    """
+    Build a catalog mixing all product types.
+
+    Parameters:
+    count (int): The number of products to build.
+
+    Returns:
+    list: The products.
+    """
+    catalog = []
+    for i in range(count):
+        if i % 10 == 0:
+            catalog.append(products.NonStockedProduct(f"sku-{i}", 5))
+        elif i % 10 == 1:
+            catalog.append(products.LimitedProduct(
+                f"sku-{i}", 10, quantity=i % 50,
+                max_quantity_per_order=1))
+        else:
+            catalog.append(products.Product(f"sku-{i}", 20,
+                                            quantity=i % 100))
+    return catalog
+
+
+def best_of(func, repeat=5):
+    """
+    Time a function and return the fastest of several runs.
+
+    Parameters:
+    func (callable): The function to time.
+    repeat (int): How many times to run it.
+
+    Returns:
+    float: The fastest run in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """
+    Run the benchmark and print one line per operation and backend.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for backend in (store.Store, columnar.ColumnarStore):
+        catalog = build_catalog(count)
+        start = time.perf_counter()
+        store_inst = backend(catalog)
+        build_time = time.perf_counter() - start
+        cart = [(catalog[i], 1) for i in range(0, count, 97)]
+        print(f"{backend.__name__} ({count} products)")
+        print(f"  build:              {build_time * 1000:10.2f} ms")
+        print(f"  get_total_quantity: "
+              f"{best_of(store_inst.get_total_quantity) * 1000:10.2f} ms")
+        print(f"  get_all_products:   "
+              f"{best_of(store_inst.get_all_products) * 1000:10.2f} ms")
+        if isinstance(store_inst, columnar.ColumnarStore):
+            check = best_of(lambda: store_inst.check_stock(cart))
+            print(f"  check_stock({len(cart)}): "
+                  f"{check * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Time Product.buy on a promoted product with each event sink
+installed: the null sink, the ring buffer and the background file
+writer.
+
+Usage: python -m benchmarks.bench_events [buys]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import events
+import products
+import promotions
+
+
+def per_buy(buys):
+    """
+    Time buying one unit of a promoted product, buys times in a row.
+
+    Parameters:
+    buys (int): The number of buys.
+
+    Returns:
+    float: Nanoseconds per buy.
+    """
+    product = products.Product("bench", price=10, quantity=10 ** 12)
+    product.set_promotion(promotions.ThirdOneFree("Third One Free!"))
+    buy = product.buy
+    start = time.perf_counter()
+    for _ in range(buys):
+        buy(1)
+    return (time.perf_counter() - start) / buys * 1e9
+
+
+def main():
+    """
+    Print the cost per buy with every sink.
+    """
+    buys = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as directory:
+        sinks = [("null", None),
+                 ("ring buffer", events.RingBufferSink()),
+                 ("file", events.FileSink(os.path.join(directory,
+                                                       "events.jsonl")))]
+        for label, sink in sinks:
+            events.set_sink(sink)
+            try:
+                print(f"{label:12} {per_buy(buys):8.1f} ns per buy")
+            finally:
+                events.set_sink(None)
+                if sink is not None:
+                    start = time.perf_counter()
+                    sink.close()
+                    print(f"{'':12} close took "
+                          f"{(time.perf_counter() - start) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure stock holds at scale: taking millions of holds, releasing part
+of them early, expiring the rest in bulk, and what outstanding holds
+cost an order.
+
+Usage: python -m benchmarks.bench_holds [holds] [products]
+"""
+import random
+import sys
+import time
+
+import products
+import store
+
+
+def rate(count, seconds):
+    """
+    Format a number of operations per second.
+
+    Parameters:
+    count (int): The number of operations.
+    seconds (float): The time they took.
+
+    Returns:
+    str: The rate and time per operation.
+    """
+    return (f"{count / seconds:12,.0f} /s "
+            f"({seconds / count * 1e6:.2f} µs each)")
+
+
+def main():
+    """
+    Print the rate of every hold operation.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    product_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    rng = random.Random(0)
+    product_list = [products.Product(f"sku-{i}", price=1 + i % 100,
+                                     quantity=count)
+                    for i in range(product_count)]
+    store_inst = store.Store(product_list)
+    plain = products.Product("plain", price=5, quantity=10 ** 9)
+    store_inst.add_product(plain)
+    picks = [product_list[rng.randrange(product_count)]
+             for _ in range(count)]
+    ttls = [rng.uniform(600, 1200) for _ in range(count)]
+
+    def order_rate(repeat=20_000):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            store_inst.order([(plain, 1)])
+        return rate(repeat, time.perf_counter() - start)
+
+    print(f"{count:,} holds over {product_count:,} products")
+    order_rate()
+    print(f"order, no holds  {order_rate()}")
+    start = time.perf_counter()
+    holds = [store_inst.hold(product, 1, ttl)
+             for product, ttl in zip(picks, ttls)]
+    print(f"hold             {rate(count, time.perf_counter() - start)}")
+    print(f"order, all held  {order_rate()}")
+
+    early = holds[::4]
+    start = time.perf_counter()
+    for hold in early:
+        store_inst.release(hold)
+    print(f"release          {rate(len(early), time.perf_counter() - start)}")
+
+    cart = holds[1:41:4]
+    start = time.perf_counter()
+    store_inst.order_holds(cart)
+    print(f"order 10 holds   {(time.perf_counter() - start) * 1e3:12.3f} ms")
+
+    outstanding = store_inst.get_hold_count()
+    start = time.perf_counter()
+    expired = store_inst.expire_holds(now=time.monotonic() + 1200)
+    seconds = time.perf_counter() - start
+    assert expired == outstanding and store_inst.get_hold_count() == 0
+    print(f"expire in bulk   {rate(expired, seconds)}")
+    assert all(product.held == 0 for product in product_list)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measure the cost of showing the first page of the product listing,
+the old way (every active product rendered with show()) against
+Store.iter_products, cold and with the rendering cache warm.
+
+Usage: python -m benchmarks.bench_listing [products] [page_size]
+"""
+import sys
+import time
+
+import products
+import promotions
+import store
+
+
+def timed(function, repeat):
+    """
+    Time a function.
+
+    Parameters:
+    function (callable): Takes no arguments.
+    repeat (int): The number of calls.
+
+    Returns:
+    float: Milliseconds per call.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    """
+    Print the time per listing for each way of listing.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    promotion = promotions.PercentDiscount("30% off!", percent=30)
+    product_list = [products.Product(f"sku-{i}", price=1 + i % 100,
+                                     quantity=10) for i in range(count)]
+    for product in product_list[::3]:
+        product.set_promotion(promotion)
+    store_inst = store.Store(product_list)
+
+    def full():
+        return [product.show() for product in store_inst.get_all_products()]
+
+    def page():
+        return list(store_inst.iter_products(0, page_size))
+
+    def deep_page():
+        return list(store_inst.iter_products(count // 2, page_size))
+
+    print(f"{count:,} products, {page_size} per page")
+    print(f"render all     {timed(full, 1):10.3f} ms")
+    print(f"first page     {timed(page, 1):10.3f} ms (cold)")
+    print(f"first page     {timed(page, 1000):10.3f} ms (cached)")
+    print(f"middle page    {timed(deep_page, 1000):10.3f} ms (cached)")
+
+
+if __name__ == "__main__":
+    main()
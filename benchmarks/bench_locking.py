@@ -0,0 +1,92 @@
+"""
+Compare order throughput of the per-product locking Store with a store
+that serializes every order behind one global lock.
+
+Usage: python -m benchmarks.bench_locking [threads] [orders_per_thread]
+"""
+import contextlib
+import io
+import random
+import sys
+import threading
+import time
+
+import products
+import store
+
+
+class GlobalLockStore(store.Store):
+    """
+    A store that takes one store-wide lock for every order.
+    """
+    def __init__(self, product_list):
+        """
+        Initialize the store and its global lock.
+
+        Parameters:
+        product_list (list): The initial list of products.
+        """
+        super().__init__(product_list)
+        self._global_lock = threading.Lock()
+
+    def order(self, shopping_list):
+        """
+        Place an order while holding the global lock.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples.
+
+        Returns:
+        float: The total price of the order.
+        """
+        with self._global_lock:
+            return super().order(shopping_list)
+
+
+def run(backend, thread_count, orders_per_thread):
+    """
+    Hammer a store from several threads and measure throughput.
+
+    Parameters:
+    backend (type): The store class to benchmark.
+    thread_count (int): The number of shopper threads.
+    orders_per_thread (int): The number of orders each thread places.
+
+    Returns:
+    float: Orders per second.
+    """
+    catalog = [products.Product(f"sku-{i}", price=1, quantity=10 ** 9)
+               for i in range(1000)]
+    store_inst = backend(catalog)
+
+    def shopper(seed):
+        rng = random.Random(seed)
+        for _ in range(orders_per_thread):
+            store_inst.order([(rng.choice(catalog), 1) for _ in range(5)])
+
+    threads = [threading.Thread(target=shopper, args=(seed,))
+               for seed in range(thread_count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return thread_count * orders_per_thread / elapsed
+
+
+def main():
+    """
+    Run the benchmark for both locking strategies.
+    """
+    thread_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    orders_per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    for backend in (store.Store, GlobalLockStore):
+        with contextlib.redirect_stdout(io.StringIO()):
+            throughput = run(backend, thread_count, orders_per_thread)
+        print(f"{backend.__name__:16} {thread_count} threads: "
+              f"{throughput:12.0f} orders/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Report the memory used per product, comparing the compact slotted
+Product with a product laid out like the original dict-based class
+(per-instance __dict__, listener list and eager RLock).
+
+Usage: python -m benchmarks.bench_memory [product_count]
+"""
+import sys
+import threading
+import tracemalloc
+
+import products
+import promotions
+
+
+class DictProduct:
+    """
+    A product with the original memory layout, for comparison.
+    """
+    def __init__(self, name, price, quantity):
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+        self.active = True
+        self.promotion = None
+        self._listeners = []
+        self.lock = threading.RLock()
+
+
+def bytes_per_product(factory, count):
+    """
+    Measure the memory allocated per product.
+
+    Parameters:
+    factory (callable): Builds a product from an index.
+    count (int): The number of products to build.
+
+    Returns:
+    float: Bytes per product.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    catalog = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del catalog
+    return (after - before) / count
+
+
+def main():
+    """
+    Print bytes per product for each layout.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    def legacy(i):
+        product = DictProduct(f"sku-{i}", 10.0, i)
+        product.promotion = promotions.ThirdOneFree("Third One Free!")
+        return product
+
+    def compact(i):
+        product = products.Product(f"sku-{i}", 10.0, i)
+        product.set_promotion(promotions.ThirdOneFree("Third One Free!"))
+        return product
+
+    for label, factory in (("dict-based (before)", legacy),
+                           ("slotted (after)", compact)):
+        print(f"{label:20} {bytes_per_product(factory, count):8.1f} "
+              f"bytes/product over {count} products")
+
+
+if __name__ == "__main__":
+    main()
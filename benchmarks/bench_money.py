@@ -0,0 +1,111 @@
+"""
+Compare integer-cents pricing with the float pricing it replaced, for
+the built-in promotions and for summing the lines of a large order.
+
+Usage: python -m benchmarks.bench_money [calls]
+"""
+import sys
+import time
+
+import products
+import promotions
+
+
+class FloatProduct:
+    """
+    A product with a plain float price, as products were before.
+    """
+    __slots__ = ("price",)
+
+    def __init__(self, price):
+        self.price = price
+
+
+def float_percent(ratio):
+    def price_percent(product, quantity):
+        price = product.price
+        return (price - ratio * price) * quantity
+    return price_percent
+
+
+def float_second_half(product, quantity):
+    price = product.price
+    discounted = quantity // 2
+    return ((quantity - discounted) * price) + (discounted * price * 0.5)
+
+
+def float_third_free(product, quantity):
+    return (quantity - quantity // 3) * product.price
+
+
+def per_call(price, product, calls):
+    """
+    Time a pricing function on growing quantities.
+
+    Parameters:
+    price (callable): The pricing function.
+    product: The product to price.
+    calls (int): The number of calls.
+
+    Returns:
+    float: Nanoseconds per call, best of five runs.
+    """
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        for quantity in range(1, calls + 1):
+            price(product, quantity)
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e9
+
+
+def sum_time(values):
+    """
+    Time summing order lines, as Store.order_many and Store.quote do.
+
+    Parameters:
+    values (list): The line prices.
+
+    Returns:
+    float: Nanoseconds per line, best of five runs.
+    """
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        sum(values)
+        best = min(best, time.perf_counter() - start)
+    return best / len(values) * 1e9
+
+
+def main():
+    """
+    Print the cost per call of the float and the cents path, and the
+    drift of a float order total.
+    """
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    float_product = FloatProduct(19.99)
+    product = products.Product("bench", price=19.99, quantity=10 ** 9)
+    pairs = [
+        ("percent discount", float_percent(0.3),
+         promotions.PercentDiscount("bench", percent=30)),
+        ("second half price", float_second_half,
+         promotions.SecondHalfPrice("bench")),
+        ("third one free", float_third_free,
+         promotions.ThirdOneFree("bench")),
+    ]
+    for label, float_price, promotion in pairs:
+        cents_call = per_call(promotion.apply_promotion_cents, product, calls)
+        print(f"{label:18} float "
+              f"{per_call(float_price, float_product, calls):7.1f} ns, "
+              f"cents {cents_call:7.1f} ns")
+    lines = [float_third_free(float_product, q) for q in range(1, calls + 1)]
+    cents = [promotions.ThirdOneFree("bench").apply_promotion_cents(product, q)
+             for q in range(1, calls + 1)]
+    print(f"{'order total':18} float {sum_time(lines):7.1f} ns, "
+          f"cents {sum_time(cents):7.1f} ns per line")
+    print(f"{'':18} float total {sum(lines):.6f}, "
+          f"exact total {sum(cents) / 100:.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the compiled rule promotions with the original hand-written
+promotion classes.
+
+Usage: python -m benchmarks.bench_rules [calls]
+"""
+import sys
+import time
+
+import products
+import promotions
+
+
+class HandPercentDiscount:
+    def __init__(self, percent):
+        self.percent = percent
+
+    def apply_promotion(self, product, quantity):
+        discount = (self.percent / 100) * product.price
+        return (product.price - discount) * quantity
+
+
+class HandSecondHalfPrice:
+    def apply_promotion(self, product, quantity):
+        full_price_count = quantity // 2 + quantity % 2
+        half_price_count = quantity // 2
+        return (full_price_count * product.price) + (
+                half_price_count * product.price * 0.5)
+
+
+class HandThirdOneFree:
+    def apply_promotion(self, product, quantity):
+        free_count = quantity // 3
+        payable_count = quantity - free_count
+        return payable_count * product.price
+
+
+def per_call(promotion, product, calls):
+    """
+    Time apply_promotion on growing quantities.
+
+    Parameters:
+    promotion: The promotion to time.
+    product (Product): The product to price.
+    calls (int): The number of calls.
+
+    Returns:
+    float: Nanoseconds per call, best of five runs.
+    """
+    best = float('inf')
+    apply_promotion = promotion.apply_promotion
+    for _ in range(5):
+        start = time.perf_counter()
+        for quantity in range(1, calls + 1):
+            apply_promotion(product, quantity)
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e9
+
+
+def main():
+    """
+    Print the cost per call of each pair of implementations.
+    """
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    product = products.Product("bench", price=19.99, quantity=10 ** 9)
+    pairs = [
+        ("percent discount", HandPercentDiscount(30),
+         promotions.PercentDiscount("bench", percent=30)),
+        ("second half price", HandSecondHalfPrice(),
+         promotions.SecondHalfPrice("bench")),
+        ("third one free", HandThirdOneFree(),
+         promotions.ThirdOneFree("bench")),
+    ]
+    for label, hand_written, compiled in pairs:
+        print(f"{label:18} hand-written "
+              f"{per_call(hand_written, product, calls):7.1f} ns, "
+              f"compiled {per_call(compiled, product, calls):7.1f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measure product name lookups on a large store: exact, prefix and fuzzy
+search through the search index, against a linear scan of
+get_all_products, plus the time to build the index, how long orders
+wait meanwhile, and the time to keep it up to date when products are
+added and deactivated.
+
+Usage: python -m benchmarks.bench_search [products]
+"""
+import random
+import sys
+import threading
+import time
+
+import products
+import store
+
+BRANDS = ["Apple", "Samsung", "Sony", "Bose", "Google", "Lenovo", "Dell",
+          "Asus", "Canon", "Nikon", "Philips", "Logitech", "Garmin", "LG"]
+KINDS = ["Laptop", "Phone", "Earbuds", "Headphones", "Monitor", "Camera",
+         "Speaker", "Tablet", "Watch", "Keyboard", "Mouse", "Router"]
+QUERIES = 1_000
+
+
+def make_name(i):
+    """
+    Build a realistic, unique product name.
+
+    Parameters:
+    i (int): The product number.
+
+    Returns:
+    str: The name.
+    """
+    return (f"{BRANDS[i % len(BRANDS)]} {KINDS[i // 7 % len(KINDS)]} "
+            f"{chr(65 + i % 26)}{i}")
+
+
+def per_query(function, queries):
+    """
+    Time a lookup function over a list of queries.
+
+    Parameters:
+    function (callable): Takes one query.
+    queries (list): The queries.
+
+    Returns:
+    float: Microseconds per query.
+    """
+    start = time.perf_counter()
+    for query in queries:
+        function(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    """
+    Print build, lookup and update times.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(1)
+    start = time.perf_counter()
+    store_inst = store.Store([products.Product(make_name(i), price=10,
+                                               quantity=5)
+                              for i in range(count)])
+    print(f"store of {count:,} products built in "
+          f"{time.perf_counter() - start:.2f} s")
+
+    picks = [make_name(rng.randrange(count)) for _ in range(QUERIES)]
+    start = time.perf_counter()
+    builder = threading.Thread(target=store_inst.find, args=(picks[0],))
+    builder.start()
+    # Orders go on while the index is built; the slowest shows how long
+    # the build holds up the rest of the store.
+    extra = products.Product("extra", price=1, quantity=10 ** 9)
+    store_inst.add_product(extra)
+    slowest = 0
+    while builder.is_alive():
+        ordered = time.perf_counter()
+        store_inst.order([(extra, 1)])
+        slowest = max(slowest, time.perf_counter() - ordered)
+    builder.join()
+    print(f"search index built in {time.perf_counter() - start:.2f} s, "
+          f"slowest order meanwhile {slowest * 1e3:.1f} ms")
+
+    exact = [name.upper() for name in picks]
+    prefixes = [name[:len(name) - 2] for name in picks]
+    typos = [name[:5] + name[6:] for name in picks]
+    print(f"exact   {per_query(store_inst.find, exact):10.1f} us per query")
+    print(f"prefix  {per_query(store_inst.find_prefix, prefixes):10.1f} "
+          f"us per query")
+    print(f"fuzzy   {per_query(store_inst.search, typos[:100]):10.1f} "
+          f"us per query")
+
+    def scan(query):
+        query = query.casefold()
+        return [product for product in store_inst.get_all_products()
+                if product.name.casefold() == query]
+    print(f"scan    {per_query(scan, exact[:5]):10.1f} us per query")
+
+    start = time.perf_counter()
+    for i in range(count, count + QUERIES):
+        store_inst.add_product(products.Product(make_name(i), price=10,
+                                                quantity=5))
+    for name in picks:
+        product = store_inst.get_product(name)
+        if product.is_active():
+            product.deactivate()
+    per_update = (time.perf_counter() - start) / (2 * QUERIES) * 1e6
+    print(f"update  {per_update:10.1f} us per add or deactivate")
+
+
+if __name__ == "__main__":
+    main()
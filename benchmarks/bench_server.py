@@ -0,0 +1,93 @@
+"""
+Load test the asyncio order server with many concurrent clients and
+report requests per second and latency percentiles.
+
+Usage: python -m benchmarks.bench_server [clients] [requests_per_client]
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+
+import products
+import server
+import store
+
+
+def build_store(count=1000):
+    """
+    Build a store with plenty of stock.
+
+    Parameters:
+    count (int): The number of products.
+
+    Returns:
+    Store: The store.
+    """
+    return store.Store([
+        products.Product(f"sku-{i}", price=10, quantity=10 ** 9)
+        for i in range(count)])
+
+
+async def client(port, request_count, seed, latencies):
+    """
+    Send orders and quotes over one connection and record latencies.
+
+    Parameters:
+    port (int): The server port.
+    request_count (int): The number of requests to send.
+    seed (int): The seed for choosing products.
+    latencies (list): Receives the latency of every request.
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for _ in range(request_count):
+        request = {
+            "op": rng.choice(("order", "quote")),
+            "lines": [{"product": f"sku-{rng.randrange(1000)}",
+                       "quantity": rng.randint(1, 3)}
+                      for _ in range(3)]}
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        await reader.readline()
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def run(client_count, request_count):
+    """
+    Run the load test against an in-process server.
+
+    Parameters:
+    client_count (int): The number of concurrent clients.
+    request_count (int): The number of requests per client.
+    """
+    order_server = server.OrderServer(build_store())
+    port = await order_server.start(port=0)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, request_count, seed, latencies)
+                           for seed in range(client_count)))
+    elapsed = time.perf_counter() - start
+    await order_server.close()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{client_count} clients, {len(latencies)} requests: "
+          f"{len(latencies) / elapsed:.0f} req/s, "
+          f"p50 {p50 * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms")
+
+
+def main():
+    """
+    Run the load test with the sizes from the command line.
+    """
+    client_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    request_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(run(client_count, request_count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure order throughput of ShardedStore with 1 to N shards, against
+a single in-process Store.
+
+Orders are sent in batches with order_many so each shard gets enough
+work per round trip to run in parallel with the others. Scaling is
+bounded by the number of cores: on a single-core machine more shards
+only add overhead.
+
+Usage: python -m benchmarks.bench_sharded [orders] [max_shards]
+"""
+import os
+import random
+import sys
+import time
+
+import products
+import sharded
+import store
+
+CATALOG = 20_000
+LINES = 5
+BATCH = 5_000
+
+
+def make_catalog():
+    """
+    Build a catalog with practically unlimited stock.
+
+    Returns:
+    list: The products.
+    """
+    return [products.Product(f"sku-{i}", price=1 + i % 100,
+                             quantity=10 ** 9) for i in range(CATALOG)]
+
+
+def make_orders(count, seed=1):
+    """
+    Build random orders of LINES lines, naming products by name.
+
+    Parameters:
+    count (int): The number of orders.
+    seed (int): The random seed.
+
+    Returns:
+    list: The shopping lists.
+    """
+    rng = random.Random(seed)
+    return [[(f"sku-{rng.randrange(CATALOG)}", rng.randint(1, 3))
+             for _ in range(LINES)] for _ in range(count)]
+
+
+def throughput(order_many, orders):
+    """
+    Place orders in batches and measure orders per second.
+
+    Parameters:
+    order_many (callable): Places a batch of orders.
+    orders (list): The orders.
+
+    Returns:
+    float: Orders per second.
+    """
+    start = time.perf_counter()
+    for offset in range(0, len(orders), BATCH):
+        order_many(orders[offset:offset + BATCH])
+    return len(orders) / (time.perf_counter() - start)
+
+
+def main():
+    """
+    Print orders per second for a single store and for each shard
+    count.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    max_shards = (int(sys.argv[2]) if len(sys.argv) > 2
+                  else os.cpu_count() or 1)
+    orders = make_orders(count)
+    single = store.Store(make_catalog())
+    resolved = [[(single.get_product(name), quantity)
+                 for name, quantity in shopping_list]
+                for shopping_list in orders]
+    baseline = throughput(single.order_many, resolved)
+    print(f"{'single store':14} {baseline:12,.0f} orders/s")
+    shard_counts = sorted({1, 2, 4, max_shards} & set(range(1,
+                                                             max_shards + 1)))
+    for shards in shard_counts:
+        with sharded.ShardedStore(make_catalog(), shards=shards) as store_inst:
+            rate = throughput(store_inst.order_many, orders)
+        print(f"{shards:2} shard(s)    {rate:12,.0f} orders/s "
+              f"({rate / baseline:.2f}x single store)")
+
+
+if __name__ == "__main__":
+    main()
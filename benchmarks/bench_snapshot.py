@@ -0,0 +1,97 @@
+"""
+Measure store startup time from a binary snapshot, lazily and all at
+once, against the object path: one constructor call per product and
+Store(product_list). Also times the first lookups after a lazy load,
+which pay for building their products.
+
+Usage: python -m benchmarks.bench_snapshot [products]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import products
+import promotions
+import store
+
+
+def make_products(count):
+    """
+    Build a mix of product kinds, some with a promotion.
+
+    Parameters:
+    count (int): The number of products.
+
+    Returns:
+    list: The products.
+    """
+    percent = promotions.PercentDiscount("30% off!", percent=30)
+    third = promotions.ThirdOneFree("Third One Free!")
+    product_list = []
+    for i in range(count):
+        price = 1 + i % 500 + i % 100 / 100
+        if i % 10 == 0:
+            product = products.NonStockedProduct(f"sku-{i}", price)
+        elif i % 10 == 1:
+            product = products.LimitedProduct(f"sku-{i}", price, 50, 2)
+        else:
+            product = products.Product(f"sku-{i}", price, 50)
+        if i % 7 == 0:
+            product.set_promotion(percent if i % 2 else third)
+        product_list.append(product)
+    return product_list
+
+
+def timed(function, *args):
+    """
+    Time one call of a function.
+
+    Returns:
+    tuple: (result, seconds).
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """
+    Print the startup time of every way of building the store.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"{count:,} products")
+
+    def object_path():
+        return store.Store(make_products(count))
+
+    store_inst, seconds = timed(object_path)
+    print(f"object path     {seconds:10.3f} s")
+    expected = store_inst.get_inventory_summary()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "store.snap")
+        _, seconds = timed(store_inst.save, path)
+        store_inst = None
+        print(f"save            {seconds:10.3f} s "
+              f"({os.path.getsize(path) / 2 ** 20:.1f} MiB)")
+
+        store_inst, seconds = timed(store.Store.load, path, False)
+        assert store_inst.get_inventory_summary() == expected
+        store_inst = None
+        print(f"load eager      {seconds:10.3f} s")
+
+        store_inst, seconds = timed(store.Store.load, path)
+        assert store_inst.get_inventory_summary() == expected
+        print(f"load lazy       {seconds:10.3f} s")
+        name = f"sku-{count // 2}"
+        _, seconds = timed(store_inst.get_product, name)
+        print(f"first lookup    {seconds * 1e6:10.1f} µs")
+        _, seconds = timed(store_inst.get_product, name)
+        print(f"second lookup   {seconds * 1e6:10.1f} µs")
+        _, seconds = timed(lambda: list(store_inst.iter_products(0, 20)))
+        print(f"first page      {seconds * 1e3:10.3f} ms")
+        store_inst = None
+
+
+if __name__ == "__main__":
+    main()
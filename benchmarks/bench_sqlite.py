@@ -0,0 +1,71 @@
+"""
+Compare the SQLite-backed store with the in-memory Store: bulk load,
+aggregates, listing and orders.
+
+Usage: python -m benchmarks.bench_sqlite [product_count] [order_count]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import products
+import sqlite_store
+import store
+
+
+def timed(func):
+    """
+    Run a function once and time it.
+
+    Parameters:
+    func (callable): The function to run.
+
+    Returns:
+    tuple: (result, seconds).
+    """
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    """
+    Run the benchmark for both stores.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    order_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    catalog = [products.Product(f"sku-{i}", price=10, quantity=1000)
+               for i in range(count)]
+    rng = random.Random(1)
+    orders = [[(catalog[rng.randrange(count)], 1) for _ in range(3)]
+              for _ in range(order_count)]
+    with tempfile.TemporaryDirectory() as directory:
+        backends = [
+            ("Store", lambda: store.Store(catalog)),
+            ("SQLiteStore", lambda: sqlite_store.SQLiteStore(
+                catalog, os.path.join(directory, "store.db"))),
+        ]
+        for label, build in backends:
+            store_inst, load = timed(build)
+            _, total = timed(store_inst.get_total_quantity)
+            _, listing = timed(store_inst.get_all_products)
+            with contextlib.redirect_stdout(io.StringIO()):
+                _, ordering = timed(
+                    lambda: [store_inst.order(shopping_list)
+                             for shopping_list in orders])
+            print(f"{label} ({count} SKUs)")
+            print(f"  load:               {load * 1000:10.1f} ms")
+            print(f"  get_total_quantity: {total * 1000:10.1f} ms")
+            print(f"  get_all_products:   {listing * 1000:10.1f} ms")
+            print(f"  {order_count} orders:      "
+                  f"{order_count / ordering:10.0f} orders/s")
+            if isinstance(store_inst, sqlite_store.SQLiteStore):
+                store_inst.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Benchmark suite for the hot paths of the store: Product.buy, every
+Promotion.apply_promotion, Store.order, Store.get_all_products,
+Store.get_total_quantity and Store.get_inventory_summary, at several
+catalog and cart sizes.
+
+Results are seconds per call, keyed by case and size, and can be saved
+as a JSON baseline. When comparing against a baseline, the run fails
+with exit code 1 if any case got slower than the threshold allows.
+
+Usage:
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+    python -m benchmarks.suite --sizes 100,10000 --threshold 0.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+
+import products
+import promotions
+import store
+
+DEFAULT_SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+STOCK = 10 ** 12
+
+
+def best_time(func, repeat):
+    """
+    Run a function several times and return the fastest run.
+
+    Parameters:
+    func (callable): The function to time.
+    repeat (int): The number of runs.
+
+    Returns:
+    float: The fastest run in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_product_buy(size, repeat):
+    """
+    Time buying one unit of a product, size times in a row.
+
+    Returns:
+    float: Seconds per buy.
+    """
+    product = products.Product("bench", price=10, quantity=STOCK)
+
+    def run():
+        buy = product.buy
+        for _ in range(size):
+            buy(1)
+    return best_time(run, repeat) / size
+
+
+def make_promotion_bench(promotion):
+    """
+    Make a benchmark that times one promotion on a cart of size items.
+
+    Parameters:
+    promotion (Promotion): The promotion to time.
+
+    Returns:
+    callable: The benchmark function.
+    """
+    def bench(size, repeat):
+        product = products.Product("bench", price=10, quantity=STOCK)
+        calls = 1000
+
+        def run():
+            apply_promotion = promotion.apply_promotion
+            for _ in range(calls):
+                apply_promotion(product, size)
+        return best_time(run, repeat) / calls
+    return bench
+
+
+def build_store(size):
+    """
+    Build a store of size products with unlimited practical stock.
+
+    Parameters:
+    size (int): The number of products.
+
+    Returns:
+    Store: The store.
+    """
+    return store.Store([products.Product(f"sku-{i}", price=10,
+                                         quantity=STOCK)
+                        for i in range(size)])
+
+
+def bench_store_order(size, repeat):
+    """
+    Time one order of size lines over a catalog of size products.
+
+    Returns:
+    float: Seconds per order.
+    """
+    store_inst = build_store(size)
+    shopping_list = [(product, 1) for product in store_inst.product_list]
+    return best_time(lambda: store_inst.order(shopping_list), repeat)
+
+
+def bench_get_all_products(size, repeat):
+    """
+    Time listing the active products of a catalog of size products.
+
+    Returns:
+    float: Seconds per call.
+    """
+    store_inst = build_store(size)
+    return best_time(store_inst.get_all_products, repeat)
+
+
+def bench_get_total_quantity(size, repeat):
+    """
+    Time the total quantity of a catalog of size products.
+
+    Returns:
+    float: Seconds per call.
+    """
+    store_inst = build_store(size)
+    return best_time(store_inst.get_total_quantity, repeat)
+
+
+def bench_get_inventory_summary(size, repeat):
+    """
+    Time the inventory summary of a catalog of size products.
+
+    Returns:
+    float: Seconds per call.
+    """
+    store_inst = build_store(size)
+    return best_time(store_inst.get_inventory_summary, repeat)
+
+
+CASES = {
+    "product_buy": bench_product_buy,
+    "promotion_percent_discount": make_promotion_bench(
+        promotions.PercentDiscount("bench", percent=30)),
+    "promotion_second_half_price": make_promotion_bench(
+        promotions.SecondHalfPrice("bench")),
+    "promotion_third_one_free": make_promotion_bench(
+        promotions.ThirdOneFree("bench")),
+    "store_order": bench_store_order,
+    "store_get_all_products": bench_get_all_products,
+    "store_get_total_quantity": bench_get_total_quantity,
+    "store_get_inventory_summary": bench_get_inventory_summary,
+}
+
+
+def run_suite(sizes, repeat, cases=None):
+    """
+    Run the benchmark cases at every size.
+
+    Parameters:
+    sizes (list): The catalog and cart sizes.
+    repeat (int): The number of runs per measurement.
+    cases (list): The case names to run, or None for all.
+
+    Returns:
+    dict: The results, {case: {size: seconds per call}}, with sizes
+          as strings so the results round-trip through JSON.
+    """
+    results = {}
+    for name, bench in CASES.items():
+        if cases and name not in cases:
+            continue
+        results[name] = {}
+        for size in sizes:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name][str(size)] = bench(size, repeat)
+            print(f"{name:30} {size:>9}: "
+                  f"{results[name][str(size)] * 1e6:14.3f} us",
+                  file=sys.stderr)
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+
+    Parameters:
+    results (dict): The results of run_suite.
+    baseline (dict): The baseline results.
+    threshold (float): The allowed slowdown, 0.2 meaning 20%.
+
+    Returns:
+    list: (case, size, baseline_seconds, seconds) for every
+          measurement slower than the threshold allows.
+    """
+    regressions = []
+    for name, by_size in results.items():
+        for size, seconds in by_size.items():
+            expected = baseline.get(name, {}).get(size)
+            if expected and seconds > expected * (1 + threshold):
+                regressions.append((name, size, expected, seconds))
+    return regressions
+
+
+def main(argv=None):
+    """
+    Run the suite from the command line.
+
+    Parameters:
+    argv (list): The arguments, or None for sys.argv.
+
+    Returns:
+    int: The exit code, 1 if a regression was found.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default=",".join(map(str,
+                                                        DEFAULT_SIZES)),
+                        help="comma separated catalog/cart sizes")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per measurement, the best is kept")
+    parser.add_argument("--cases", help="comma separated case names")
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--compare",
+                        help="baseline file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    cases = args.cases.split(",") if args.cases else None
+    results = run_suite(sizes, args.repeat, cases)
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump({"python": platform.python_version(),
+                       "results": results}, baseline_file, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, size, expected, seconds in regressions:
+            print(f"REGRESSION {name} at {size}: "
+                  f"{expected * 1e6:.3f} us -> {seconds * 1e6:.3f} us "
+                  f"({seconds / expected - 1:+.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
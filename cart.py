@@ -0,0 +1,379 @@
+from heapq import heapify, heappop, heappush
+from time import perf_counter
+
+import money
+
+# Carts with more candidate bundles than this are only priced greedily,
+# which also keeps the branch-and-bound recursion shallow.
+MAX_SEARCH_BUNDLES = 200
+
+
+class BundleDeal:
+    """
+    A cart-level promotion: buying the listed quantities of one or more
+    products together costs a fixed price.
+
+    Attributes:
+    name (str): The name of the deal.
+    items (list): (product, quantity) tuples making up one bundle.
+    price_cents (int): The price of one bundle in cents.
+    price (float): The price of one bundle.
+    """
+
+    def __init__(self, name, items, price):
+        """
+        Initialize the bundle deal.
+
+        Parameters:
+        name (str): The name of the deal.
+        items (list): (product, quantity) tuples making up one bundle.
+        price (float): The price of one bundle.
+
+        Raises:
+        ValueError: If the bundle is empty, a quantity is not positive
+                    or the price is negative.
+        """
+        if not items:
+            raise ValueError("A bundle needs at least one item")
+        merged = {}
+        for product, quantity in items:
+            if not (isinstance(quantity, int) and quantity > 0):
+                raise ValueError("Bundle quantities must be positive "
+                                 "integers")
+            merged[product] = merged.get(product, 0) + quantity
+        if price < 0:
+            raise ValueError("Bundle price can't be negative")
+        self.name = name
+        self.items = list(merged.items())
+        self.price_cents = money.to_cents(price)
+
+    @property
+    def price(self):
+        """
+        Get the price of one bundle.
+
+        Returns:
+        float: The price in currency units.
+        """
+        return self.price_cents / money.CENTS
+
+
+class CartPrice:
+    """
+    The result of pricing a cart with CartOptimizer.
+
+    Attributes:
+    total (float): The price of the cart.
+    bundles (dict): How many times each BundleDeal was applied.
+    lines (list): (product, quantity, promotion, price) tuples for the
+                  units not covered by bundles. promotion is None when
+                  list price was cheapest.
+    exact (bool): True if the search proved the total optimal, False
+                  if the time budget ran out first.
+    """
+
+    def __init__(self, total, bundles, lines, exact):
+        self.total = total
+        self.bundles = bundles
+        self.lines = lines
+        self.exact = exact
+
+    def __repr__(self):
+        bundles = {deal.name: count
+                   for deal, count in self.bundles.items()}
+        return (f"CartPrice(total={self.total!r}, bundles={bundles}, "
+                f"exact={self.exact})")
+
+
+class CartOptimizer:
+    """
+    Chooses the cheapest combination of deals for a whole cart. All
+    prices are compared in int cents, so ties are exact.
+
+    Every product can be priced with its own promotion, any of its
+    alternative promotions or its list price, whichever is cheapest for
+    the units left over. On top of that, cross-product BundleDeals can
+    be applied any number of times as long as the cart holds the
+    items.
+
+    A greedy pass, which keeps adding the bundle that saves the most,
+    gives a first answer. A depth-first branch-and-bound search over
+    bundle counts then improves on it until it has proven the best
+    answer or the time budget runs out, in which case the best answer
+    found so far is returned.
+
+    Attributes:
+    bundles (list): The available BundleDeals.
+    alternatives (dict): Extra promotions per product.
+    time_budget (float): The longest search time in seconds.
+    """
+
+    def __init__(self, bundles=(), alternatives=None, time_budget=0.005):
+        """
+        Initialize the optimizer.
+
+        Parameters:
+        bundles (list): The available BundleDeals.
+        alternatives (dict): Maps products to lists of extra
+                             promotions they are eligible for.
+        time_budget (float): The longest search time in seconds.
+        """
+        self.bundles = list(bundles)
+        self.alternatives = alternatives or {}
+        self.time_budget = time_budget
+
+    def _line_pricer(self):
+        """
+        Make a memoized function pricing units of one product without
+        bundles.
+
+        Returns:
+        callable: (product, quantity) -> (price in cents, promotion).
+        """
+        cache = {}
+        alternatives = self.alternatives
+
+        def price_line(product, quantity):
+            key = (product, quantity)
+            best = cache.get(key)
+            if best is None:
+                if quantity == 0:
+                    best = (0, None)
+                else:
+                    best = (product.price_cents * quantity, None)
+                    candidates = list(alternatives.get(product, ()))
+                    if product.promotion:
+                        candidates.append(product.promotion)
+                    for promotion in candidates:
+                        price = promotion.apply_promotion_cents(product,
+                                                                quantity)
+                        if price < best[0]:
+                            best = (price, promotion)
+                cache[key] = best
+            return best
+        return price_line
+
+    def optimize(self, shopping_list):
+        """
+        Price a cart with the cheapest combination of deals.
+
+        Parameters:
+        shopping_list (list): (product, quantity) tuples. Lines for the
+                              same product are combined.
+
+        Returns:
+        CartPrice: The cheapest combination found.
+        """
+        deadline = perf_counter() + self.time_budget
+        quantities = {}
+        for product, quantity in shopping_list:
+            quantities[product] = quantities.get(product, 0) + quantity
+        cart = list(quantities)
+        index = {product: i for i, product in enumerate(cart)}
+        price_line = self._line_pricer()
+
+        # Keep the bundles the cart can hold at least once, as lists
+        # of (product index, quantity).
+        deals = []
+        for deal in self.bundles:
+            items = [(index.get(product), quantity)
+                     for product, quantity in deal.items]
+            if all(i is not None and quantities[cart[i]] >= quantity
+                   for i, quantity in items):
+                deals.append((deal, items))
+
+        remaining = [quantities[product] for product in cart]
+
+        def line_cost(i):
+            return price_line(cart[i], remaining[i])[0]
+
+        counts = self._greedy(deals, remaining, line_cost)
+
+        # Bundles that share no product can be decided independently,
+        # so search each group of overlapping bundles on its own,
+        # smallest first, starting from the greedy answer.
+        exact = True
+        remaining = [quantities[product] for product in cart]
+        for group in sorted(_overlapping_groups(deals), key=len):
+            members = sorted({i for d in group for i, _ in deals[d][1]})
+            greedy_cost = 0
+            for d in group:
+                greedy_cost += deals[d][0].price_cents * counts[d]
+                for i, quantity in deals[d][1]:
+                    remaining[i] -= quantity * counts[d]
+            greedy_cost += sum(line_cost(i) for i in members)
+            for d in group:
+                for i, quantity in deals[d][1]:
+                    remaining[i] += quantity * counts[d]
+            best = {"total": greedy_cost, "counts": None}
+            # A search that ran out of time still applies the best
+            # counts it found; only the proof of optimality is lost.
+            if (len(group) > MAX_SEARCH_BUNDLES or
+                    not self._search([deals[d] for d in group], members,
+                                     remaining, line_cost, best, deadline)):
+                exact = False
+            if best["counts"] is not None:
+                for d, count in zip(group, best["counts"]):
+                    counts[d] = count
+
+        remaining = [quantities[product] for product in cart]
+        for (_, items), count in zip(deals, counts):
+            for i, quantity in items:
+                remaining[i] -= quantity * count
+        lines = []
+        total = 0
+        bundles = {}
+        for (deal, _), count in zip(deals, counts):
+            if count:
+                bundles[deal] = count
+                total += deal.price_cents * count
+        for i, product in enumerate(cart):
+            if remaining[i]:
+                price, promotion = price_line(product, remaining[i])
+                lines.append((product, remaining[i], promotion,
+                              price / money.CENTS))
+                total += price
+        return CartPrice(total / money.CENTS, bundles, lines, exact)
+
+    @staticmethod
+    def _greedy(deals, remaining, line_cost):
+        """
+        Apply bundles greedily, the one saving the most first, until no
+        bundle saves anything. Savings are kept in a heap and only
+        recomputed when a bundle reaches the top, so each step costs a
+        heap operation rather than a pass over every bundle.
+
+        Parameters:
+        deals (list): (BundleDeal, items) tuples.
+        remaining (list): Units per product, updated in place.
+        line_cost (callable): Prices the leftover units of a product.
+
+        Returns:
+        list: How many times each deal was applied.
+        """
+        def saving(deal, items):
+            if any(remaining[i] < quantity for i, quantity in items):
+                return 0
+            before = sum(line_cost(i) for i, _ in items)
+            for i, quantity in items:
+                remaining[i] -= quantity
+            after = sum(line_cost(i) for i, _ in items)
+            for i, quantity in items:
+                remaining[i] += quantity
+            return before - after - deal.price_cents
+
+        counts = [0] * len(deals)
+        heap = [(-saving(*deal), d) for d, deal in enumerate(deals)]
+        heap = [entry for entry in heap if entry[0] < 0]
+        heapify(heap)
+        while heap:
+            _, d = heappop(heap)
+            current = saving(*deals[d])
+            if current <= 0:
+                continue
+            if heap and current < -heap[0][0]:
+                heappush(heap, (-current, d))
+                continue
+            counts[d] += 1
+            for i, quantity in deals[d][1]:
+                remaining[i] -= quantity
+            heappush(heap, (-current, d))
+        return counts
+
+    @staticmethod
+    def _search(deals, members, remaining, line_cost, best, deadline):
+        """
+        Branch-and-bound over bundle counts, improving best in place.
+
+        Bundles are decided one at a time. Once no undecided bundle
+        touches a product, its leftover units are priced and added to
+        the fixed cost; the fixed cost plus the bundles chosen so far
+        is a lower bound for the branch, since undecided bundles and
+        lines can only add cost.
+
+        Parameters:
+        deals (list): (BundleDeal, items) tuples.
+        members (list): The indexes of the products the deals touch.
+        remaining (list): Units per product, restored after searching.
+        line_cost (callable): Prices the leftover units of a product.
+        best (dict): The best "total" and "counts" found so far. counts
+                     stays None if nothing beats the starting total.
+        deadline (float): perf_counter() value to stop searching at.
+
+        Returns:
+        bool: True if the search finished, False on timeout.
+        """
+        # settled_at[d] lists the products no bundle from d on touches.
+        last_touch = {}
+        for d, (_, items) in enumerate(deals):
+            for i, _ in items:
+                last_touch[i] = d
+        settled_at = [[] for _ in range(len(deals) + 1)]
+        for i in members:
+            settled_at[last_touch[i] + 1].append(i)
+        counts = [0] * len(deals)
+        nodes = [0]
+
+        def visit(d, cost):
+            nodes[0] += 1
+            if nodes[0] % 256 == 0 and perf_counter() > deadline:
+                raise TimeoutError
+            for i in settled_at[d]:
+                cost += line_cost(i)
+            if cost >= best["total"]:
+                return
+            if d == len(deals):
+                best["total"] = cost
+                best["counts"] = list(counts)
+                return
+            deal, items = deals[d]
+            most = min(remaining[i] // quantity for i, quantity in items)
+            for count in range(most, -1, -1):
+                for i, quantity in items:
+                    remaining[i] -= quantity * count
+                counts[d] = count
+                visit(d + 1, cost + deal.price_cents * count)
+                for i, quantity in items:
+                    remaining[i] += quantity * count
+            counts[d] = 0
+
+        try:
+            visit(0, 0)
+        except TimeoutError:
+            for d, (_, items) in enumerate(deals):
+                for i, quantity in items:
+                    remaining[i] += quantity * counts[d]
+            return False
+        return True
+
+
+def _overlapping_groups(deals):
+    """
+    Split deals into groups where deals in different groups share no
+    product.
+
+    Parameters:
+    deals (list): (BundleDeal, items) tuples.
+
+    Returns:
+    list: Lists of deal indexes.
+    """
+    parent = list(range(len(deals)))
+
+    def find(d):
+        while parent[d] != d:
+            parent[d] = parent[parent[d]]
+            d = parent[d]
+        return d
+
+    owner = {}
+    for d, (_, items) in enumerate(deals):
+        for i, _ in items:
+            if i in owner:
+                parent[find(d)] = find(owner[i])
+            else:
+                owner[i] = d
+    groups = {}
+    for d in range(len(deals)):
+        groups.setdefault(find(d), []).append(d)
+    return list(groups.values())
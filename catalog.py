@@ -0,0 +1,438 @@
+import csv
+import json
+import os
+from itertools import islice
+
+import kinds
+import money
+import products
+import promotions
+import store
+
+# The columns of a CSV catalog. Columns that a catalog does not use can
+# be left out of its header.
+CSV_FIELDS = ("kind", "name", "price", "quantity", "max_per_order",
+              "promotion", "percent", "rule")
+
+# The number of records validated and added to the store at a time.
+CHUNK_SIZE = 10000
+
+# The most distinct prices build_products remembers the cents of.
+PRICE_CACHE_SIZE = 100_000
+
+# The most errors a CatalogError message lists.
+_MAX_REPORTED = 10
+
+
+class CatalogError(ValueError):
+    """
+    Raised when a catalog has invalid records. No store is returned.
+
+    Attributes:
+    errors (list): (line_number, message) for every invalid record.
+    """
+    def __init__(self, errors):
+        """
+        Initialize the error with the invalid records.
+
+        Parameters:
+        errors (list): (line_number, message) for every invalid record.
+        """
+        shown = "; ".join(f"line {line_number}: {message}"
+                          for line_number, message in errors[:_MAX_REPORTED])
+        if len(errors) > _MAX_REPORTED:
+            shown += f"; and {len(errors) - _MAX_REPORTED} more"
+        super().__init__(f"Invalid catalog: {shown}")
+        self.errors = errors
+
+
+def read_csv(stream, chunk_size=CHUNK_SIZE):
+    """
+    Read catalog records from a CSV stream with a header row, see
+    CSV_FIELDS. Empty cells count as missing.
+
+    Parameters:
+    stream (file): A text stream opened with newline="".
+    chunk_size (int): The most records per chunk.
+
+    Yields:
+    list: (line_number, record) tuples, up to chunk_size at a time.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [field.strip() for field in header]
+    chunk = []
+    for row in reader:
+        if not row:
+            continue
+        chunk.append((reader.line_num,
+                      {field: value for field, value in zip(header, row)
+                       if value != ""}))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_jsonl(stream, chunk_size=CHUNK_SIZE):
+    """
+    Read catalog records from a JSON Lines stream, one object per
+    line. Blank lines are skipped.
+
+    The lines of a chunk are decoded together, as one JSON array,
+    which is much faster than decoding them one at a time. If that
+    fails, the chunk is decoded line by line to find the bad lines.
+
+    Parameters:
+    stream (file): A text stream.
+    chunk_size (int): The most records per chunk.
+
+    Yields:
+    list: (line_number, record) tuples, up to chunk_size at a time.
+          record is None if the line is not valid JSON.
+    """
+    decode = json.JSONDecoder().decode
+    numbered_lines = ((line_number, line) for line_number, line
+                      in enumerate(stream, start=1) if not line.isspace())
+    while True:
+        chunk = list(islice(numbered_lines, chunk_size))
+        if not chunk:
+            return
+        try:
+            records = decode("[" + ",".join(line for _, line in chunk) + "]")
+        except ValueError:
+            records = None
+        if records is None or len(records) != len(chunk):
+            records = []
+            for _, line in chunk:
+                try:
+                    records.append(decode(line))
+                except ValueError:
+                    records.append(None)
+        yield [(line_number, record)
+               for (line_number, _), record in zip(chunk, records)]
+
+
+def _cents(value, field):
+    """
+    Convert a positive price from a record to cents, rounding like
+    money.to_cents. Prices with at most two decimal places, the common
+    case, are converted without going through Decimal.
+
+    Parameters:
+    value (str, int or float): The price.
+    field (str): The field name, for the error message.
+
+    Returns:
+    int: The price in cents.
+
+    Raises:
+    ValueError: If the price is not a positive number.
+    """
+    if type(value) is int:
+        cents = value * money.CENTS
+    elif type(value) is float:
+        cents = round(value * money.CENTS) if abs(value) < 1e12 else None
+        # A float is read through its shortest repr; if that has at
+        # most two decimals, it is exactly cents / 100.
+        if cents is None or cents / money.CENTS != value:
+            cents = money.to_cents(value)
+    elif type(value) is str:
+        whole, dot, fraction = value.strip().partition(".")
+        if (whole.isdigit() and whole.isascii() and
+                len(fraction) <= 2 and
+                (not fraction or (fraction.isdigit() and
+                                  fraction.isascii()))):
+            cents = int(whole) * money.CENTS + int(fraction.ljust(2, "0"))
+        else:
+            cents = money.to_cents(value)
+    else:
+        raise ValueError(f"{field} must be a number, got {value!r}")
+    if cents <= 0:
+        raise ValueError(f"{field} must be positive, got {value!r}")
+    return cents
+
+
+def _count(value, field, minimum):
+    """
+    Convert a whole number from a record.
+
+    Parameters:
+    value (str or int): The number.
+    field (str): The field name, for the error message.
+    minimum (int): The smallest allowed value.
+
+    Returns:
+    int: The number.
+
+    Raises:
+    ValueError: If the value is not a whole number of at least minimum.
+    """
+    if type(value) is str and value.strip().isdigit():
+        value = int(value)
+    if type(value) is not int or value < minimum:
+        raise ValueError(f"{field} must be a whole number of at least "
+                         f"{minimum}, got {value!r}")
+    return value
+
+
+def build_products(numbered_records, promotion_table, names, errors,
+                   price_cache=None):
+    """
+    Validate a chunk of records and build the products it defines.
+    Promotion records are added to promotion_table, so products later
+    in the catalog can use them.
+
+    Chunks of valid product records, the common case, are validated a
+    column at a time and built without running the checks of the
+    product constructors again, see products.from_fields. Any other
+    chunk is checked record by record, so every invalid record is
+    reported.
+
+    Parameters:
+    numbered_records (list): (line_number, record) tuples.
+    promotion_table (dict): Maps promotion names to promotions.
+    names (set): The product names seen so far. New names are added.
+    errors (list): Receives (line_number, message) for every invalid
+                   record.
+    price_cache (dict): Maps prices as written in the catalog to cents,
+                        shared between chunks.
+
+    Returns:
+    list: The products of the valid product records, or nothing once
+          an error was found.
+    """
+    if not errors:
+        built = _build_batch([record for _, record in numbered_records],
+                             promotion_table, names,
+                             {} if price_cache is None else price_cache)
+        if built is not None:
+            return built
+    return _build_records(numbered_records, promotion_table, names, errors)
+
+
+def _build_batch(records, promotion_table, names, price_cache):
+    """
+    Validate a chunk of product records column by column and build
+    their products. Accepts exactly the records _build_records accepts
+    without an error, and gives up at the first doubt.
+
+    Parameters:
+    records (list): The records.
+    promotion_table (dict): Maps promotion names to promotions.
+    names (set): The product names seen so far. New names are added
+                 if the chunk is valid.
+    price_cache (dict): Maps prices as written to cents.
+
+    Returns:
+    list: The products, or None if the chunk holds promotion records
+          or anything invalid.
+    """
+    classes = kinds.PRODUCT_CLASSES
+    default = kinds.PRODUCT
+    non_stocked = products.NonStockedProduct
+    limited = products.LimitedProduct
+    try:
+        types = [classes[record.get("kind", default)] for record in records]
+        new_names = [record["name"] for record in records]
+        prices = [record["price"] for record in records]
+        quantities = [record.get("quantity") for record in records]
+        limits = [record.get("max_per_order") for record in records]
+        promotion_names = [record.get("promotion") for record in records]
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+    if not all(type(name) is str and name for name in new_names):
+        return None
+    if (len(set(new_names)) != len(new_names) or
+            not names.isdisjoint(new_names)):
+        return None
+    if any(type(price) is bool for price in prices):
+        return None
+    if len(price_cache) > PRICE_CACHE_SIZE:
+        price_cache.clear()
+    try:
+        for price in set(prices).difference(price_cache):
+            price_cache[price] = _cents(price, "price")
+        cents = [price_cache[price] for price in prices]
+        promotion_list = [None if name is None else promotion_table[name]
+                          for name in promotion_names]
+    except (KeyError, TypeError, ValueError):
+        return None
+    quantities = [int(quantity) if type(quantity) is str and
+                  quantity.isdigit() else quantity
+                  for quantity in quantities]
+    limits = [int(limit) if type(limit) is str and limit.isdigit()
+              else limit for limit in limits]
+    for cls, quantity, limit in zip(types, quantities, limits):
+        if cls is non_stocked:
+            if quantity is not None and quantity != 0:
+                return None
+        elif type(quantity) is not int or quantity < 0:
+            return None
+        if cls is limited:
+            if type(limit) is not int or limit < 1:
+                return None
+        elif limit is not None:
+            return None
+
+    names.update(new_names)
+    from_fields = products.from_fields
+    return [from_fields(cls, name, price, 0 if cls is non_stocked
+                        else quantity, True, promotion, limit)
+            for cls, name, price, quantity, limit, promotion
+            in zip(types, new_names, cents, quantities, limits,
+                   promotion_list)]
+
+
+def _build_records(numbered_records, promotion_table, names, errors):
+    """
+    Validate records one at a time and build the products they
+    define, see build_products. Used for chunks that _build_batch
+    cannot handle, to find every invalid record.
+
+    Parameters:
+    numbered_records (list): (line_number, record) tuples.
+    promotion_table (dict): Maps promotion names to promotions.
+    names (set): The product names seen so far. New names are added.
+    errors (list): Receives (line_number, message) for every invalid
+                   record.
+
+    Returns:
+    list: The products of the valid product records, or nothing once
+          an error was found.
+    """
+    built = []
+    classes = kinds.PRODUCT_CLASSES
+    from_fields = products.from_fields
+    for line_number, record in numbered_records:
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("record must be a JSON object")
+            kind = record.get("kind", kinds.PRODUCT)
+            cls = classes.get(kind)
+            if cls is None:
+                if kind not in promotions.RECORD_KINDS:
+                    raise ValueError(f"unknown kind {kind!r}")
+                promotion = promotions.from_record(record)
+                promotion_table[promotion.name] = promotion
+                continue
+            name = record.get("name")
+            if not (isinstance(name, str) and name):
+                raise ValueError("product name expected")
+            if name in names:
+                raise ValueError(f"duplicate product name {name!r}")
+            price_cents = _cents(record.get("price"), "price")
+            limit = record.get("max_per_order")
+            if cls is products.NonStockedProduct:
+                quantity = record.get("quantity")
+                if quantity is not None and _count(quantity, "quantity", 0):
+                    raise ValueError("non-stocked products have no quantity")
+                quantity = 0
+            else:
+                quantity = _count(record.get("quantity"), "quantity", 0)
+            if cls is products.LimitedProduct:
+                limit = _count(limit, "max_per_order", 1)
+            elif limit is not None:
+                raise ValueError(f"max_per_order only applies to "
+                                 f"{kinds.LIMITED} products")
+            promotion = record.get("promotion")
+            if promotion is not None:
+                if promotion not in promotion_table:
+                    raise ValueError(f"unknown promotion {promotion!r}")
+                promotion = promotion_table[promotion]
+        except (ValueError, TypeError) as e:
+            errors.append((line_number, str(e)))
+            continue
+        names.add(name)
+        if not errors:
+            built.append(from_fields(cls, name, price_cents, quantity,
+                                     promotion=promotion,
+                                     max_quantity_per_order=limit))
+    return built
+
+
+def read_catalog(path, fmt=None, chunk_size=CHUNK_SIZE):
+    """
+    Open a catalog file and read its records lazily, in chunks.
+
+    Parameters:
+    path (str): The catalog file.
+    fmt (str): "csv" or "jsonl"; by default taken from the file
+               extension, with anything but .csv read as JSON Lines.
+    chunk_size (int): The most records per chunk.
+
+    Yields:
+    list: (line_number, record) tuples, up to chunk_size at a time.
+    """
+    if fmt is None:
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown catalog format: {fmt!r}")
+    with open(path, newline="" if fmt == "csv" else None,
+              encoding="utf-8") as stream:
+        if fmt == "csv":
+            yield from read_csv(stream, chunk_size)
+        else:
+            yield from read_jsonl(stream, chunk_size)
+
+
+def load_catalog(path, fmt=None, chunk_size=CHUNK_SIZE,
+                 store_class=None):
+    """
+    Load a catalog file into a new store.
+
+    A catalog is a CSV or JSON Lines file of records. Product records
+    have a kind (product, non_stocked or limited; product if left
+    out), name, price, quantity (not for non_stocked), max_per_order
+    (limited only) and optionally the name of a promotion. Promotion
+    records have a kind (percent, second_half_price, third_one_free or
+    rule), name, and percent or rule, and must come before the
+    products that use them.
+
+    The file is streamed in chunks of chunk_size records; each chunk
+    is validated and its products added with Store.add_products, so
+    memory beyond the store itself stays bounded. All records are
+    validated before the error is raised, so it lists every problem.
+
+    Parameters:
+    path (str): The catalog file.
+    fmt (str): "csv" or "jsonl", see read_catalog.
+    chunk_size (int): The number of records handled at a time.
+    store_class (type): The class of the store to build, such as
+                        columnar.ColumnarStore; store.Store if None.
+
+    Returns:
+    Store: The store holding the catalog.
+
+    Raises:
+    CatalogError: If any record is invalid.
+    OSError: If the file cannot be read.
+    """
+    store_inst = (store_class or store.Store)([])
+    promotion_table = {}
+    names = set()
+    errors = []
+    price_cache = {}
+    for chunk in read_catalog(path, fmt, chunk_size):
+        built = build_products(chunk, promotion_table, names, errors,
+                               price_cache)
+        if not errors:
+            store_inst.add_products(built)
+    if errors:
+        raise CatalogError(errors)
+    return store_inst
+
+
+def default_catalog_path():
+    """
+    Get the path of the catalog shipped with the store.
+
+    Returns:
+    str: The path of catalog.jsonl next to this module.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "catalog.jsonl")
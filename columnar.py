@@ -0,0 +1,197 @@
+import numpy as np
+
+import products
+import store
+
+PRODUCT = 0
+NON_STOCKED = 1
+LIMITED = 2
+REMOVED = -1
+
+_INITIAL_CAPACITY = 1024
+
+
+def type_code(product):
+    """
+    Get the product-type code stored in the type column for a product.
+
+    Parameters:
+    product (Product): The product to classify.
+
+    Returns:
+    int: NON_STOCKED, LIMITED or PRODUCT.
+    """
+    if isinstance(product, products.NonStockedProduct):
+        return NON_STOCKED
+    if isinstance(product, products.LimitedProduct):
+        return LIMITED
+    return PRODUCT
+
+
+class ColumnarStore(store.Store):
+    """
+    A store that mirrors the price in cents, quantity, active flag and
+    type of every product into NumPy columns, so catalog-wide
+    aggregates and filters run as vectorized operations instead of
+    Python loops.
+
+    Row i of every column belongs to the product with sequence number
+    i. The Product objects stay the source of truth; the store keeps
+    the columns in sync through the product listener hook. Rows of
+    removed products are marked REMOVED and zeroed.
+    """
+    def __init__(self, product_list, quote_cache_size=65536):
+        """
+        Initialize the columnar store with a list of products.
+
+        Parameters:
+        product_list (list): The initial list of products available
+                             in the store.
+        quote_cache_size (int): The number of line prices quote()
+                                keeps in its LRU cache.
+        """
+        capacity = max(_INITIAL_CAPACITY, len(product_list))
+        self.price_cents = np.zeros(capacity, dtype=np.int64)
+        self.quantities = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=np.bool_)
+        self.types = np.full(capacity, REMOVED, dtype=np.int8)
+        super().__init__(product_list, quote_cache_size)
+
+    def _grow(self, needed):
+        """
+        Grow every column so it can hold at least `needed` rows.
+
+        Parameters:
+        needed (int): The minimum number of rows.
+        """
+        capacity = len(self.types)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - len(self.types)
+        self.price_cents = np.concatenate(
+            [self.price_cents, np.zeros(extra, dtype=np.int64)])
+        self.quantities = np.concatenate(
+            [self.quantities, np.zeros(extra, dtype=np.int64)])
+        self.active = np.concatenate(
+            [self.active, np.zeros(extra, dtype=np.bool_)])
+        self.types = np.concatenate(
+            [self.types, np.full(extra, REMOVED, dtype=np.int8)])
+
+    def _write_row(self, seq, product):
+        """
+        Copy the state of a product into its row.
+
+        Parameters:
+        seq (int): The sequence number of the product.
+        product (Product): The product to copy.
+        """
+        self.price_cents[seq] = product.price_cents
+        self.quantities[seq] = product.quantity
+        self.active[seq] = product.active
+
+    def add_products(self, product_iter):
+        """
+        Add products to the store and to the columns. add_product
+        goes through here too.
+
+        Parameters:
+        product_iter (iterable): The products to add.
+        """
+        product_list = list(product_iter)
+        try:
+            super().add_products(product_list)
+        finally:
+            seqs = [self._seq_by_id.get(id(product))
+                    for product in product_list]
+            self._grow(max((seq for seq in seqs if seq is not None),
+                           default=-1) + 1)
+            for seq, product in zip(seqs, product_list):
+                if seq is not None:
+                    self.types[seq] = type_code(product)
+                    self._write_row(seq, product)
+
+    def remove_product(self, product):
+        """
+        Remove a product from the store and clear its row.
+
+        Parameters:
+        product (Product): The product to remove from the store.
+        """
+        seq = self._seq_by_id.get(id(product))
+        super().remove_product(product)
+        if seq is not None:
+            self.types[seq] = REMOVED
+            self.price_cents[seq] = 0
+            self.quantities[seq] = 0
+            self.active[seq] = False
+
+    def product_changed(self, product):
+        """
+        Update the row of a product after it changed.
+
+        Parameters:
+        product (Product): The product that changed.
+        """
+        seq = self._seq_by_id.get(id(product))
+        if seq is not None:
+            self._write_row(seq, product)
+        super().product_changed(product)
+
+    def get_total_quantity(self):
+        """
+        Get the total quantity of all stocked products in the store.
+
+        Returns:
+        int: The total quantity of items in the store.
+        """
+        rows = self._next_seq
+        return int(self.quantities[:rows].sum())
+
+    def get_quantity_by_type(self):
+        """
+        Get the total quantity for each product-type code.
+
+        Returns:
+        dict: A mapping of PRODUCT, NON_STOCKED and LIMITED to
+              their total quantity.
+        """
+        rows = self._next_seq
+        types = self.types[:rows]
+        present = types != REMOVED
+        totals = np.bincount(types[present],
+                             weights=self.quantities[:rows][present],
+                             minlength=3)
+        return {PRODUCT: int(totals[PRODUCT]),
+                NON_STOCKED: int(totals[NON_STOCKED]),
+                LIMITED: int(totals[LIMITED])}
+
+    def check_stock(self, shopping_list):
+        """
+        Check for every line of a shopping list whether the product is
+        active and has enough stock, without placing the order. Units
+        held for carts are not available, see Store.hold; holds do not
+        change the quantity column, so they are read from the products.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples.
+
+        Returns:
+        numpy.ndarray: A boolean array with one entry per line.
+        """
+        if not shopping_list:
+            return np.zeros(0, dtype=np.bool_)
+        seqs = np.fromiter(
+            (self._seq_by_id.get(id(product), -1)
+             for product, _ in shopping_list),
+            dtype=np.int64, count=len(shopping_list))
+        wanted = np.fromiter((quantity for _, quantity in shopping_list),
+                             dtype=np.int64, count=len(shopping_list))
+        held = np.fromiter((product.held for product, _ in shopping_list),
+                           dtype=np.int64, count=len(shopping_list))
+        known = seqs >= 0
+        rows = np.where(known, seqs, 0)
+        in_stock = ((self.types[rows] == NON_STOCKED) |
+                    (wanted <= self.quantities[rows] - held))
+        return known & self.active[rows] & in_stock & (wanted > 0)
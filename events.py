@@ -0,0 +1,293 @@
+import json
+import queue
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+PURCHASE = "purchase"
+PROMOTION_APPLIED = "promotion_applied"
+REJECTED = "rejected"
+DEACTIVATED = "deactivated"
+
+Event = namedtuple("Event", ["time", "kind", "product", "quantity", "data"])
+Event.__doc__ = """
+A structured store event.
+
+Attributes:
+time (float): The time.time() of the event.
+kind (str): PURCHASE, PROMOTION_APPLIED, REJECTED or DEACTIVATED.
+product (str): The name of the product.
+quantity (int): The quantity involved, or None.
+data (dict): Extra fields: price_cents for PURCHASE, promotion for
+             PROMOTION_APPLIED, reason and message for REJECTED.
+"""
+
+
+def to_dict(event):
+    """
+    Convert an event to a flat dict, for JSON output.
+
+    Parameters:
+    event (Event): The event.
+
+    Returns:
+    dict: time, kind, product, quantity and the data fields.
+    """
+    result = {"time": event.time, "kind": event.kind,
+              "product": event.product, "quantity": event.quantity}
+    result.update(event.data)
+    return result
+
+
+class NullSink:
+    """
+    A sink that drops every event.
+    """
+
+    def emit(self, event):
+        """
+        Drop an event.
+
+        Parameters:
+        event (Event): The event.
+        """
+
+    def close(self):
+        """
+        Nothing to release.
+        """
+
+
+class RingBufferSink:
+    """
+    A sink that keeps the most recent events in memory.
+
+    Attributes:
+    capacity (int): The number of events kept.
+    """
+
+    def __init__(self, capacity=10000):
+        """
+        Initialize an empty buffer.
+
+        Parameters:
+        capacity (int): The number of events kept; older ones are
+                        dropped.
+        """
+        self.capacity = capacity
+        self._events = deque(maxlen=capacity)
+
+    def emit(self, event):
+        """
+        Keep an event, dropping the oldest one if the buffer is full.
+
+        Parameters:
+        event (Event): The event.
+        """
+        self._events.append(event)
+
+    def events(self, kind=None):
+        """
+        Get the buffered events, oldest first.
+
+        Parameters:
+        kind (str): Only return events of this kind, if given.
+
+        Returns:
+        list: The events.
+        """
+        buffered = list(self._events)
+        if kind is None:
+            return buffered
+        return [event for event in buffered if event.kind == kind]
+
+    def clear(self):
+        """
+        Drop every buffered event.
+        """
+        self._events.clear()
+
+    def close(self):
+        """
+        Nothing to release.
+        """
+
+
+class FileSink:
+    """
+    A sink that writes events as JSON Lines from a background thread.
+
+    emit only puts the event on a queue, so the purchase path never
+    waits for the file. The writer thread takes up to batch_size
+    events at a time and writes them with one write call. If more than
+    max_pending events are waiting, new events are dropped and counted
+    in dropped rather than letting memory grow without bound. Events
+    emitted after close are dropped and counted too.
+
+    Attributes:
+    dropped (int): The number of events dropped because the queue was
+                   full or the sink was closed.
+    """
+
+    def __init__(self, path, batch_size=1000, flush_interval=0.1,
+                 max_pending=1_000_000):
+        """
+        Open the file and start the writer thread.
+
+        Parameters:
+        path (str): The file to append events to.
+        batch_size (int): The most events written in one batch.
+        flush_interval (float): The longest time in seconds an event
+                                waits before it is written.
+        max_pending (int): The most events waiting to be written.
+        """
+        self._file = open(path, "a", encoding="utf-8")
+        self._queue = queue.SimpleQueue()
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._closed = False
+        self.dropped = 0
+        # Guards dropped and closing, so no event is queued after the
+        # end marker.
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run,
+                                        name="event-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, event):
+        """
+        Queue an event for writing.
+
+        Parameters:
+        event (Event): The event.
+        """
+        with self._lock:
+            if self._closed or self._queue.qsize() >= self._max_pending:
+                self.dropped += 1
+                return
+            self._queue.put(event)
+
+    def _run(self):
+        """
+        Write queued events in batches until closed. A None on the
+        queue marks the end.
+        """
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self._flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = batch[-1] is None
+            if done:
+                batch.pop()
+            if batch:
+                self._file.write("".join(json.dumps(to_dict(event)) + "\n"
+                                         for event in batch))
+                self._file.flush()
+            if done:
+                return
+
+    def close(self):
+        """
+        Write the queued events, stop the writer thread and close the
+        file.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+
+class ConsoleSink:
+    """
+    A sink that prints promotion and rejection events the way the
+    interactive store always has, for the command line menu. It writes
+    synchronously, so it is not meant for servers.
+    """
+
+    def __init__(self, stream=None):
+        """
+        Initialize the sink.
+
+        Parameters:
+        stream (file): The stream to print to, sys.stdout by default.
+        """
+        self._stream = stream
+
+    def emit(self, event):
+        """
+        Print an event if the menu showed it before.
+
+        Parameters:
+        event (Event): The event.
+        """
+        stream = self._stream or sys.stdout
+        if event.kind == PROMOTION_APPLIED:
+            print(f"Applying promotion: {event.data['promotion']} to "
+                  f"{event.product}", file=stream)
+        elif event.kind == REJECTED:
+            print(f"Error: {event.data['message']}", file=stream)
+
+    def close(self):
+        """
+        Nothing to release.
+        """
+
+
+NULL = NullSink()
+
+# Call sites check this flag before building an event, so events cost
+# one global lookup per call while the null sink is installed.
+ENABLED = False
+_sink = NULL
+
+
+def set_sink(sink):
+    """
+    Install the sink that receives every event.
+
+    Parameters:
+    sink: An object with emit(event) and close() methods, or None for
+          the null sink.
+
+    Returns:
+    The previously installed sink.
+    """
+    global ENABLED, _sink
+    previous = _sink
+    _sink = NULL if sink is None else sink
+    ENABLED = _sink is not NULL
+    return previous
+
+
+def get_sink():
+    """
+    Get the installed sink.
+
+    Returns:
+    The installed sink.
+    """
+    return _sink
+
+
+def emit(kind, product, quantity=None, **data):
+    """
+    Send an event to the installed sink.
+
+    Parameters:
+    kind (str): The event kind.
+    product (str): The name of the product.
+    quantity (int): The quantity involved, if any.
+    data: Extra fields of the event.
+    """
+    _sink.emit(Event(time.time(), kind, product, quantity, data))
@@ -0,0 +1,33 @@
+import products
+
+PRODUCT = "product"
+NON_STOCKED = "non_stocked"
+LIMITED = "limited"
+
+# Every product kind, in the order of its code in a snapshot kind
+# column. New kinds go at the end so existing snapshots still read.
+KINDS = (PRODUCT, NON_STOCKED, LIMITED)
+
+PRODUCT_CLASSES = {
+    PRODUCT: products.Product,
+    NON_STOCKED: products.NonStockedProduct,
+    LIMITED: products.LimitedProduct,
+}
+
+
+def product_kind(product):
+    """
+    Get the kind of a product, as written to catalogs, snapshots and
+    the SQLite store.
+
+    Parameters:
+    product (Product): The product.
+
+    Returns:
+    str: NON_STOCKED, LIMITED or PRODUCT.
+    """
+    if isinstance(product, products.NonStockedProduct):
+        return NON_STOCKED
+    if isinstance(product, products.LimitedProduct):
+        return LIMITED
+    return PRODUCT
@@ -0,0 +1,436 @@
+import argparse
+import itertools
+import math
+import multiprocessing
+import random
+import threading
+from bisect import bisect_right
+from time import perf_counter
+
+import events
+import money
+import products
+import promotions
+import store
+
+CART_DISTRIBUTIONS = ("fixed", "uniform", "geometric")
+
+# Relative weights of buying 1, 2 or 3 of a product on a cart line.
+QUANTITY_WEIGHTS = (80, 15, 5)
+
+# Line rejections that mean the shopper found the product sold out: a
+# product that sells out is deactivated, so later lines for it are
+# rejected as inactive.
+STOCKOUT_REASONS = (products.INSUFFICIENT_STOCK, products.INACTIVE)
+
+PERCENTILES = (50, 90, 99)
+
+
+def make_catalog(count, seed=0, max_stock=100):
+    """
+    Build a synthetic catalog: 80% stocked products, 10% non-stocked
+    and 10% limited to one or two per order, with about a third of
+    them on one of the standard promotions. The same count, seed and
+    max_stock always give the same catalog.
+
+    Parameters:
+    count (int): The number of products.
+    seed (int): The random seed.
+    max_stock (int): The most units a stocked product starts with.
+
+    Returns:
+    list: The products.
+    """
+    rng = random.Random(f"catalog:{seed}")
+    promotion_list = [
+        promotions.PercentDiscount("30% off!", percent=30),
+        promotions.SecondHalfPrice("Second Half price!"),
+        promotions.ThirdOneFree("Third One Free!"),
+    ]
+    product_list = []
+    for i in range(count):
+        name = f"sku-{i:07d}"
+        price = round(rng.uniform(1, 500), 2)
+        kind = rng.random()
+        if kind < 0.1:
+            product = products.NonStockedProduct(name, price)
+        elif kind < 0.2:
+            product = products.LimitedProduct(
+                name, price, rng.randint(1, max_stock), rng.randint(1, 2))
+        else:
+            product = products.Product(name, price,
+                                       rng.randint(1, max_stock))
+        if rng.random() < 1 / 3:
+            product.set_promotion(rng.choice(promotion_list))
+        product_list.append(product)
+    return product_list
+
+
+def zipf_weights(count, exponent=1.0):
+    """
+    Get the cumulative Zipf popularity weights of count products, the
+    most popular first.
+
+    Parameters:
+    count (int): The number of products.
+    exponent (float): The skew; 0 makes every product equally popular.
+
+    Returns:
+    list: The cumulative weights.
+    """
+    return list(itertools.accumulate(1 / rank ** exponent
+                                     for rank in range(1, count + 1)))
+
+
+def draw_cart_size(rng, distribution, mean):
+    """
+    Draw the number of distinct products in a cart.
+
+    Parameters:
+    rng (Random): The random generator.
+    distribution (str): fixed (always mean), uniform (1 to 2 * mean -
+                        1) or geometric (1 or more, small carts most
+                        common).
+    mean (int): The mean cart size.
+
+    Returns:
+    int: The cart size, at least 1.
+    """
+    if distribution == "fixed":
+        return mean
+    if distribution == "uniform":
+        return rng.randint(1, 2 * mean - 1)
+    if mean == 1:
+        return 1
+    return 1 + int(math.log(1 - rng.random()) / math.log(1 - 1 / mean))
+
+
+def make_carts(product_list, ranking, cum_weights, shopper, orders, seed,
+               distribution, mean):
+    """
+    Generate the shopping lists of one shopper. Products are drawn by
+    popularity, each at most once per cart, and quantities stay within
+    per-order limits. The carts depend only on the arguments, not on
+    how the shoppers are spread over workers.
+
+    Parameters:
+    product_list (list): The products of the catalog.
+    ranking (list): Product indexes, the most popular first.
+    cum_weights (list): See zipf_weights.
+    shopper (int): The number of the shopper.
+    orders (int): The number of orders the shopper places.
+    seed (int): The random seed.
+    distribution (str): The cart size distribution, see draw_cart_size.
+    mean (int): The mean cart size.
+
+    Returns:
+    list: The shopping lists, each a list of (product, quantity).
+    """
+    rng = random.Random(f"shopper:{seed}:{shopper}")
+    total = cum_weights[-1]
+    carts = []
+    for _ in range(orders):
+        size = min(draw_cart_size(rng, distribution, mean),
+                   len(product_list))
+        picked = {}
+        while len(picked) < size:
+            rank = bisect_right(cum_weights, rng.random() * total)
+            index = ranking[min(rank, len(ranking) - 1)]
+            if index in picked:
+                continue
+            product = product_list[index]
+            quantity = rng.choices((1, 2, 3), QUANTITY_WEIGHTS)[0]
+            limit = getattr(product, "max_quantity_per_order", quantity)
+            picked[index] = min(quantity, limit)
+        carts.append([(product_list[index], quantity)
+                      for index, quantity in picked.items()])
+    return carts
+
+
+class RejectionCounter:
+    """
+    An event sink that counts rejected order lines by reason and drops
+    every other event.
+    """
+
+    def __init__(self):
+        """
+        Initialize the counts at zero.
+        """
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        """
+        Count an event if it is a rejection.
+
+        Parameters:
+        event (Event): The event.
+        """
+        if event.kind == events.REJECTED:
+            reason = event.data.get("reason")
+            with self._lock:
+                self.counts[reason] = self.counts.get(reason, 0) + 1
+
+    def close(self):
+        """
+        Nothing to release.
+        """
+
+
+def _shop(store_inst, carts, result):
+    """
+    Place the orders of some shoppers one after another and record how
+    they went.
+
+    Parameters:
+    store_inst (Store): The store.
+    carts (list): The shopping lists.
+    result (dict): Receives latencies (seconds per order), revenue
+                   (cents), lines and failed (orders that raised).
+    """
+    latencies = result["latencies"]
+    for shopping_list in carts:
+        start = perf_counter()
+        try:
+            total = store_inst.order(shopping_list)
+        except products.PurchaseError:
+            result["failed"] += 1
+        else:
+            result["revenue"] += money.to_cents(total)
+        latencies.append(perf_counter() - start)
+        result["lines"] += len(shopping_list)
+
+
+def _run_threads(options, shoppers):
+    """
+    Build the catalog and place the orders of some shoppers against
+    one store from a pool of threads.
+
+    Parameters:
+    options (dict): The arguments of run.
+    shoppers (list): The numbers of the shoppers to simulate.
+
+    Returns:
+    dict: The combined results, see _shop, plus rejected, the rejected
+          lines by reason, and seconds, the wall time of the orders.
+    """
+    product_list = make_catalog(options["product_count"], options["seed"],
+                                options["max_stock"])
+    store_inst = store.Store(product_list)
+    rng = random.Random(f"ranking:{options['seed']}")
+    ranking = list(range(len(product_list)))
+    rng.shuffle(ranking)
+    cum_weights = zipf_weights(len(product_list), options["zipf"])
+    workers = options["threads"]
+    carts = [[] for _ in range(workers)]
+    for position, shopper in enumerate(shoppers):
+        carts[position % workers].extend(make_carts(
+            product_list, ranking, cum_weights, shopper,
+            options["orders"], options["seed"], options["cart"],
+            options["cart_size"]))
+    results = [{"latencies": [], "revenue": 0, "lines": 0, "failed": 0}
+               for _ in range(workers)]
+    threads = [threading.Thread(target=_shop, args=(store_inst, part,
+                                                    result))
+               for part, result in zip(carts, results)]
+    counter = RejectionCounter()
+    previous = events.set_sink(counter)
+    try:
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = perf_counter() - start
+    finally:
+        events.set_sink(previous)
+    combined = {"latencies": [], "revenue": 0, "lines": 0, "failed": 0,
+                "rejected": counter.counts, "seconds": seconds}
+    for result in results:
+        combined["latencies"].extend(result["latencies"])
+        for key in ("revenue", "lines", "failed"):
+            combined[key] += result[key]
+    return combined
+
+
+def percentile(sorted_values, percent):
+    """
+    Get a percentile of sorted values by the nearest rank method.
+
+    Parameters:
+    sorted_values (list): The values, in ascending order.
+    percent (float): The percentile, 0 to 100.
+
+    Returns:
+    float: The value, or 0.0 if there are none.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def run(product_count=1000, shoppers=100, orders=10, threads=4, processes=1,
+        cart="geometric", cart_size=3, zipf=1.0, max_stock=100, seed=0):
+    """
+    Simulate shoppers ordering from a synthetic catalog and report how
+    the store held up.
+
+    Shoppers are numbered and each places its orders one after
+    another; shopper n always gets the same carts for the same seed.
+    Every worker thread places the orders of its share of the
+    shoppers back to back, with no think time, so the run measures the
+    most the store can take. With one thread and one process the whole
+    run, stockouts included, is reproducible; with more the carts are
+    the same but the order in which they hit the stock is not.
+
+    With several processes every process builds its own store from the
+    seed and serves its share of the shoppers from it, like
+    independent store instances behind a load balancer, and runs its
+    own threads.
+
+    Parameters:
+    product_count (int): The size of the catalog, see make_catalog.
+    shoppers (int): The number of shoppers.
+    orders (int): The orders each shopper places.
+    threads (int): Worker threads per process.
+    processes (int): Worker processes.
+    cart (str): The cart size distribution, see draw_cart_size.
+    cart_size (int): The mean number of products per cart.
+    zipf (float): The Zipf exponent of product popularity.
+    max_stock (int): The most units a stocked product starts with.
+    seed (int): The random seed.
+
+    Returns:
+    dict: orders, lines, seconds, orders_per_second, latency_ms (p50,
+          p90, p99 and max), stockout_lines, stockout_rate (of all
+          lines), failed_orders (orders that hit a per-order limit),
+          rejected (lines by reason) and revenue.
+
+    Raises:
+    ValueError: If an option is out of range.
+    """
+    if cart not in CART_DISTRIBUTIONS:
+        raise ValueError(f"Unknown cart size distribution {cart!r}")
+    if min(product_count, shoppers, orders, threads, processes, cart_size,
+           max_stock) < 1 or zipf < 0:
+        raise ValueError("Counts must be positive and zipf not negative")
+    options = {"product_count": product_count, "orders": orders,
+               "threads": threads, "cart": cart, "cart_size": cart_size,
+               "zipf": zipf, "max_stock": max_stock, "seed": seed}
+    parts = [list(range(shoppers))[index::processes]
+             for index in range(processes)]
+    if processes == 1:
+        results = [_run_threads(options, parts[0])]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(_run_threads,
+                                   [(options, part) for part in parts])
+
+    latencies = sorted(itertools.chain.from_iterable(
+        result["latencies"] for result in results))
+    rejected = {}
+    for result in results:
+        for reason, count in result["rejected"].items():
+            rejected[reason] = rejected.get(reason, 0) + count
+    lines = sum(result["lines"] for result in results)
+    stockouts = sum(rejected.get(reason, 0) for reason in STOCKOUT_REASONS)
+    seconds = max(result["seconds"] for result in results)
+    latency_ms = {f"p{percent}": percentile(latencies, percent) * 1e3
+                  for percent in PERCENTILES}
+    latency_ms["max"] = latencies[-1] * 1e3
+    return {
+        "orders": len(latencies),
+        "lines": lines,
+        "seconds": seconds,
+        "orders_per_second": len(latencies) / seconds if seconds else 0.0,
+        "latency_ms": latency_ms,
+        "stockout_lines": stockouts,
+        "stockout_rate": stockouts / lines,
+        "failed_orders": sum(result["failed"] for result in results),
+        "rejected": rejected,
+        "revenue": money.from_cents(sum(result["revenue"]
+                                        for result in results)),
+    }
+
+
+def format_report(report):
+    """
+    Format the report of run for printing.
+
+    Parameters:
+    report (dict): The report.
+
+    Returns:
+    str: The report, one figure per line.
+    """
+    latency = ", ".join(f"{key} {value:.3f}"
+                        for key, value in report["latency_ms"].items())
+    return "\n".join([
+        f"orders         {report['orders']:,} ({report['lines']:,} lines) "
+        f"in {report['seconds']:.2f} s",
+        f"throughput     {report['orders_per_second']:,.0f} orders/s",
+        f"latency ms     {latency}",
+        f"stockouts      {report['stockout_lines']:,} lines "
+        f"({report['stockout_rate']:.1%})",
+        f"failed orders  {report['failed_orders']:,}",
+        f"revenue        {report['revenue']:,.2f}",
+    ])
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments.
+
+    Parameters:
+    argv (list): The arguments to parse, or None for sys.argv.
+
+    Returns:
+    Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Simulate shoppers ordering from a synthetic catalog")
+    parser.add_argument("--products", type=int, default=1000,
+                        dest="product_count",
+                        help="products in the catalog")
+    parser.add_argument("--shoppers", type=int, default=100,
+                        help="number of shoppers")
+    parser.add_argument("--orders", type=int, default=10,
+                        help="orders per shopper")
+    parser.add_argument("--threads", type=int, default=4,
+                        help="worker threads per process")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="worker processes, each with its own store")
+    parser.add_argument("--cart", choices=CART_DISTRIBUTIONS,
+                        default="geometric",
+                        help="cart size distribution")
+    parser.add_argument("--cart-size", type=int, default=3,
+                        help="mean products per cart")
+    parser.add_argument("--zipf", type=float, default=1.0,
+                        help="Zipf exponent of product popularity "
+                             "(0 for uniform)")
+    parser.add_argument("--max-stock", type=int, default=100,
+                        help="most units a product starts with")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Run a simulation and print its report.
+
+    Parameters:
+    argv (list): The command line arguments, or None for sys.argv.
+    """
+    args = parse_args(argv)
+    try:
+        report = run(**vars(args))
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
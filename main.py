@@ -1,6 +1,19 @@
+import argparse
+
+import catalog
+import events
+import metrics
+import persistence
 import products
-import promotions
-import store
+import replay
+import server
+
+# The number of products listed before asking to show more.
+PAGE_SIZE = 20
+
+# Seconds the stock of a product added to an order stays held for the
+# shopper before it is released.
+HOLD_TTL = 15 * 60
 
 
 def show_menu():
@@ -11,7 +24,8 @@ def show_menu():
         "1. List all products in store",
         "2. Show total amount in store",
         "3. Make an order",
-        "4. Quit"
+        "4. Search products",
+        "5. Quit"
     ]
     print("\n   Store Menu")
     print("   ----------")
@@ -19,17 +33,27 @@ def show_menu():
         print(option)
 
 
-def list_store_products(store_inst):
+def list_store_products(store_inst, page_size=PAGE_SIZE):
     """
-    List all products available in the store.
+    List the products available in the store, one page at a time.
+    After each full page the user can ask for the next one.
 
     Parameters:
     store_inst (Store): The store instance containing products.
+    page_size (int): The number of products per page.
     """
-    products_in_store = store_inst.get_all_products()
+    offset = 0
     print("------")
-    for num, product in enumerate(products_in_store):
-        print(f"{num + 1}. {product.show()}")
+    while True:
+        page = list(store_inst.iter_products(offset, page_size + 1))
+        for num, (_, text) in enumerate(page[:page_size], offset):
+            print(f"{num + 1}. {text}")
+        if len(page) <= page_size:
+            break
+        if input("Press enter for more products, "
+                 "or any other key to stop: ") != "":
+            break
+        offset += page_size
     print("------")
 
 
@@ -44,12 +68,39 @@ def show_total_amount(store_inst):
     print(f"Total of {total_amount} items in store")
 
 
-def get_valid_product_choice(products_in_store):
+def search_products(store_inst):
+    """
+    Prompt user for a product name and list the active products that
+    match it, by exact name, name prefix or similar name. Any of them
+    can then be ordered by name, see make_order.
+
+    Parameters:
+    store_inst (Store): The store instance containing products.
+    """
+    query = input("Search for: ").strip()
+    if not query:
+        return
+    found = store_inst.search(query)
+    if not found:
+        print(f"No products found for '{query}'")
+        return
+    print("------")
+    for product in found:
+        print(product.show())
+    print("------")
+    print("To order one, make an order and enter its name.")
+
+
+def get_valid_product_choice(products_in_store, store_inst=None):
     """
     Prompt user for a valid product choice from available products.
+    With a store, the product can also be chosen by name, ignoring
+    case; a name that does not match suggests similar products.
 
     Parameters:
     products_in_store (list): List of products in the store.
+    store_inst (Store): The store to look names up in, or None to
+                        accept product numbers only.
 
     Returns:
     Product: The chosen product, or None if user exits.
@@ -65,7 +116,20 @@ def get_valid_product_choice(products_in_store):
             else:
                 print("Invalid product number, please try again.")
         except ValueError:
-            print("Invalid input, please enter a number.")
+            if store_inst is None:
+                print("Invalid input, please enter a number.")
+                continue
+            product = store_inst.find(product_order)
+            if product is not None:
+                return product
+            similar = store_inst.search(product_order, limit=3)
+            if similar:
+                names = ", ".join(f"'{p.name}'" for p in similar)
+                print(f"No product named '{product_order}'. "
+                      f"Did you mean {names}?")
+            else:
+                print("Invalid input, please enter a number or "
+                      "a product name.")
 
 
 def get_valid_quantity(product):
@@ -138,19 +202,22 @@ def get_valid_quantity_unlimited(product):
 def make_order(store_inst):
     """
     Prompt user to create an order by selecting products and
-    quantities. Display total payable amount.
+    quantities. Display total payable amount. The stock of each
+    product is held as soon as it is added, so it cannot sell out
+    before the order is placed.
 
     Parameters:
     store_inst (Store): The store instance containing products.
     """
     products_in_store = store_inst.get_all_products()
-    shopping_list = []
+    holds = []
 
     list_store_products(store_inst)
-    print("When you want to finish order, enter empty text.")
+    print("Enter a product number or name. When you want to finish "
+          "order, enter empty text.")
 
     while True:
-        product = get_valid_product_choice(products_in_store)
+        product = get_valid_product_choice(products_in_store, store_inst)
         if product is None:
             break
 
@@ -160,17 +227,22 @@ def make_order(store_inst):
         else:
             order_amount = get_valid_quantity(product)
 
-        shopping_list.append((product, order_amount))
+        try:
+            holds.append(store_inst.hold(product, order_amount, HOLD_TTL))
+        except (products.PurchaseError, ValueError) as e:
+            # ValueError: the product was removed from the store after
+            # the list was shown.
+            print(f"Could not add '{product.name}': {e}")
+            continue
         print("Product added to list!\n")
 
-    if shopping_list:
+    if holds:
         try:
-            total_payment = store_inst.order(shopping_list)
+            total_payment = store_inst.order_holds(holds)
             print("********")
             print(f"Order made! Total payment: ${total_payment:.2f}")
-        except ValueError:
-            print("Error while making order! Quantity larger "
-                  "than what exists")
+        except (products.PurchaseError, ValueError) as e:
+            print(f"Error while making order! {e}")
 
 
 def start(store_inst):
@@ -184,7 +256,8 @@ def start(store_inst):
         "1": list_store_products,
         "2": show_total_amount,
         "3": make_order,
-        "4": exit
+        "4": search_products,
+        "5": exit
     }
 
     while True:
@@ -198,35 +271,94 @@ def start(store_inst):
             print("Invalid choice, please try again.")
 
 
-def main():
+def parse_args(argv=None):
     """
-    Main function to initialize products, promotions, and
-    start the store application.
-    """
-    # setup initial stock of inventory
-    product_list = [
-        products.Product("MacBook Air M2", price=1450, quantity=100),
-        products.Product("Bose QuietComfort Earbuds", price=250,
-                         quantity=500),
-        products.Product("Google Pixel 7", price=500, quantity=250),
-        products.NonStockedProduct("Windows License", price=125),
-        products.LimitedProduct("Shipping", price=10, quantity=250,
-                                max_quantity_per_order=1)
-    ]
+    Parse the command line arguments.
 
-    # Create promotion catalog
-    second_half_price = promotions.SecondHalfPrice("Second Half price!")
-    third_one_free = promotions.ThirdOneFree("Third One Free!")
-    thirty_percent = promotions.PercentDiscount("30% off!",
-                                                percent=30)
+    Parameters:
+    argv (list): The arguments to parse, or None for sys.argv.
 
-    # Add promotions to products
-    product_list[0].set_promotion(second_half_price)
-    product_list[1].set_promotion(third_one_free)
-    product_list[3].set_promotion(thirty_percent)
+    Returns:
+    Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Best Buy store")
+    parser.add_argument("--catalog", default=catalog.default_catalog_path(),
+                        help="CSV or JSON Lines catalog to stock the "
+                             "store with (default: the shipped "
+                             "catalog.jsonl)")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve the store over a local socket "
+                             "instead of the interactive menu")
+    parser.add_argument("--host", default=server.DEFAULT_HOST,
+                        help="address to serve on")
+    parser.add_argument("--port", type=int, default=server.DEFAULT_PORT,
+                        help="port to serve on")
+    parser.add_argument("--data-dir",
+                        help="directory to persist stock changes in; "
+                             "stock is recovered from it on start")
+    parser.add_argument("--metrics", action="store_true",
+                        help="collect order, buy and promotion metrics")
+    parser.add_argument("--events", metavar="FILE",
+                        help="append purchase, promotion, rejection and "
+                             "deactivation events to FILE as JSON Lines")
+    parser.add_argument("--replay", metavar="ORDERS",
+                        help="replay a JSON Lines file of orders "
+                             "(- for stdin) instead of the interactive "
+                             "menu")
+    parser.add_argument("--output", default="-",
+                        help="where to write replay results "
+                             "(default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="orders per batch in replay mode")
+    parser.add_argument("--buffer-size", type=int, default=1 << 20,
+                        help="file buffer size in bytes in replay mode")
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    return args
+
+
+def main(argv=None):
+    """
+    Main function to load the catalog and start the store
+    application.
 
-    best_buy = store.Store(product_list)
-    start(best_buy)
+    Parameters:
+    argv (list): The command line arguments, or None for sys.argv.
+    """
+    args = parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+
+    try:
+        best_buy = catalog.load_catalog(args.catalog)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Cannot load catalog {args.catalog}: {e}")
+    # The menu prints promotions and rejected lines as they happen;
+    # replay and the server stay quiet unless an event file is given.
+    sink = None
+    if args.events:
+        sink = events.FileSink(args.events)
+    elif not (args.replay or args.serve):
+        sink = events.ConsoleSink()
+    events.set_sink(sink)
+    log = None
+    if args.data_dir:
+        log = persistence.open_log(args.data_dir, best_buy)
+    try:
+        if args.replay:
+            replay.replay_files(best_buy, args.replay, args.output,
+                                args.batch_size, args.buffer_size)
+        elif args.serve:
+            server.serve(best_buy, args.host, args.port)
+        else:
+            start(best_buy)
+    finally:
+        if log is not None:
+            log.close()
+        events.set_sink(None)
+        if sink is not None:
+            sink.close()
 
 
 if __name__ == "__main__":
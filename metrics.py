@@ -0,0 +1,312 @@
+import threading
+from bisect import bisect_left
+
+# Instrumented code checks this flag before doing any work, so
+# metrics cost one global lookup per call while they are disabled.
+ENABLED = False
+
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4,
+                   5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25,
+                   0.5, 1.0)
+
+
+def enable():
+    """
+    Start collecting metrics.
+    """
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    """
+    Stop collecting metrics. Collected values are kept.
+    """
+    global ENABLED
+    ENABLED = False
+
+
+def _format_labels(label_name, label, le=None):
+    """
+    Format an optional label, and the bucket bound of a histogram, for
+    the Prometheus text format.
+
+    Parameters:
+    label_name (str): The label name, or None.
+    label (str): The label value.
+    le (str): The le label of a histogram bucket, or None.
+
+    Returns:
+    str: The label set including braces, or an empty string.
+    """
+    pairs = []
+    if label_name is not None:
+        escaped = (str(label).replace("\\", "\\\\").replace('"', '\\"')
+                   .replace("\n", "\\n"))
+        pairs.append(f'{label_name}="{escaped}"')
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    if not pairs:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """
+    A monotonically increasing count, optionally split by one label.
+
+    Attributes:
+    name (str): The metric name.
+    help (str): A description of the metric.
+    label_name (str): The name of the label, or None.
+    """
+
+    def __init__(self, name, help, label_name=None):
+        """
+        Initialize the counter at zero.
+
+        Parameters:
+        name (str): The metric name.
+        help (str): A description of the metric.
+        label_name (str): The name of the label, or None.
+        """
+        self.name = name
+        self.help = help
+        self.label_name = label_name
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label=None, amount=1):
+        """
+        Increase the counter.
+
+        Parameters:
+        label (str): The label value, if the counter has a label.
+        amount (int): How much to add.
+        """
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def snapshot(self):
+        """
+        Get the current values.
+
+        Returns:
+        dict: The count per label value, or {None: count}.
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def to_prometheus(self):
+        """
+        Render the counter in the Prometheus text format.
+
+        Returns:
+        list: The lines of the rendering.
+        """
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} counter"]
+        for label, value in sorted(self.snapshot().items(),
+                                   key=lambda item: str(item[0])):
+            lines.append(f"{self.name}"
+                         f"{_format_labels(self.label_name, label)} {value}")
+        return lines
+
+    def reset(self):
+        """
+        Set the counter back to zero.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """
+    A distribution of observed values in fixed buckets, optionally
+    split by one label. Used for latencies in seconds.
+
+    Attributes:
+    name (str): The metric name.
+    help (str): A description of the metric.
+    label_name (str): The name of the label, or None.
+    buckets (tuple): The sorted upper bounds of the buckets.
+    """
+
+    def __init__(self, name, help, label_name=None,
+                 buckets=DEFAULT_BUCKETS):
+        """
+        Initialize an empty histogram.
+
+        Parameters:
+        name (str): The metric name.
+        help (str): A description of the metric.
+        label_name (str): The name of the label, or None.
+        buckets (tuple): The sorted upper bounds of the buckets.
+        """
+        self.name = name
+        self.help = help
+        self.label_name = label_name
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label=None):
+        """
+        Record one value.
+
+        Parameters:
+        value (float): The observed value.
+        label (str): The label value, if the histogram has a label.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [
+                    [0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def snapshot(self):
+        """
+        Get the current distribution.
+
+        Returns:
+        dict: Per label value, a dict with "buckets" (cumulative
+              counts per upper bound, the last one being +Inf),
+              "count" and "sum".
+        """
+        result = {}
+        with self._lock:
+            for label, (counts, count, total) in self._series.items():
+                cumulative = []
+                running = 0
+                for bucket_count in counts:
+                    running += bucket_count
+                    cumulative.append(running)
+                result[label] = {
+                    "buckets": dict(zip(self.buckets + (float('inf'),),
+                                        cumulative)),
+                    "count": count,
+                    "sum": total}
+        return result
+
+    def to_prometheus(self):
+        """
+        Render the histogram in the Prometheus text format.
+
+        Returns:
+        list: The lines of the rendering.
+        """
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} histogram"]
+        for label, series in sorted(self.snapshot().items(),
+                                    key=lambda item: str(item[0])):
+            for bound, count in series["buckets"].items():
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                bucket_labels = _format_labels(self.label_name, label, le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            labels = _format_labels(self.label_name, label)
+            lines.append(f"{self.name}_sum{labels} {series['sum']}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+    def reset(self):
+        """
+        Drop every observed value.
+        """
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    """
+    A named collection of metrics.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self._metrics = {}
+
+    def register(self, metric):
+        """
+        Add a metric to the registry.
+
+        Parameters:
+        metric (Counter or Histogram): The metric to add.
+
+        Returns:
+        Counter or Histogram: The metric, for chaining.
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        """
+        Get the current value of every metric.
+
+        Returns:
+        dict: The snapshot of each metric, keyed by metric name.
+        """
+        return {name: metric.snapshot()
+                for name, metric in self._metrics.items()}
+
+    def to_prometheus(self):
+        """
+        Render every metric in the Prometheus text format.
+
+        Returns:
+        str: The exposition text.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.to_prometheus())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """
+        Reset every metric.
+        """
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+ORDERS = REGISTRY.register(Counter(
+    "bestbuy_orders_total", "Orders placed through Store.order"))
+ORDER_SECONDS = REGISTRY.register(Histogram(
+    "bestbuy_order_seconds", "Latency of Store.order"))
+BUYS = REGISTRY.register(Counter(
+    "bestbuy_buys_total", "Successful Product.buy calls"))
+BUY_SECONDS = REGISTRY.register(Histogram(
+    "bestbuy_buy_seconds", "Latency of Product.buy"))
+PROMOTION_SECONDS = REGISTRY.register(Histogram(
+    "bestbuy_promotion_seconds", "Latency of Promotion.apply_promotion",
+    label_name="promotion"))
+REJECTED_LINES = REGISTRY.register(Counter(
+    "bestbuy_rejected_lines_total", "Order lines rejected, by reason",
+    label_name="reason"))
+
+
+def snapshot():
+    """
+    Get the current value of every built-in metric.
+
+    Returns:
+    dict: See Registry.snapshot.
+    """
+    return REGISTRY.snapshot()
+
+
+def to_prometheus():
+    """
+    Render every built-in metric in the Prometheus text format.
+
+    Returns:
+    str: The exposition text.
+    """
+    return REGISTRY.to_prometheus()
@@ -0,0 +1,92 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Money is kept as an int number of cents. Amounts only become floats
+# at the edges (Product.price, order totals), by one division of an
+# exact int, so sums of many lines never drift.
+CENTS = 100
+
+# Percentages are kept in basis points, hundredths of a percent.
+BASIS_POINTS = 10000
+
+
+def to_cents(amount):
+    """
+    Convert an amount in currency units to int cents, rounding half
+    up to the nearest cent. Floats are read through their shortest
+    repr, so 19.99 becomes 1999 cents, not 1998.
+
+    Parameters:
+    amount (int, float, str or Decimal): The amount.
+
+    Returns:
+    int: The amount in cents.
+
+    Raises:
+    ValueError: If the amount is not a finite number.
+    """
+    if isinstance(amount, int) and not isinstance(amount, bool):
+        return amount * CENTS
+    try:
+        if isinstance(amount, float):
+            amount = repr(amount)
+        return int(Decimal(amount).scaleb(2).quantize(1, ROUND_HALF_UP))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f"Amount must be a finite number, got {amount!r}")
+
+
+def to_basis_points(percent):
+    """
+    Convert a percentage to basis points, rounding half up to the
+    nearest hundredth of a percent.
+
+    Parameters:
+    percent (int or float): The percentage, 30 meaning 30%.
+
+    Returns:
+    int: The percentage in basis points.
+    """
+    return to_cents(percent)
+
+
+def from_cents(cents):
+    """
+    Convert int cents to a float amount in currency units.
+
+    Parameters:
+    cents (int): The amount in cents.
+
+    Returns:
+    float: The amount, the closest float to the exact value.
+    """
+    return cents / CENTS
+
+
+def discount(cents, basis_points):
+    """
+    Compute a percentage of a non-negative amount, rounded half up to
+    a whole cent. Every percentage deal uses this rule: 50% of 9.99 is
+    5.00, so the discounted price is 4.99.
+
+    Parameters:
+    cents (int): The amount in cents.
+    basis_points (int): The percentage in basis points.
+
+    Returns:
+    int: The discount in cents.
+    """
+    return (cents * basis_points + BASIS_POINTS // 2) // BASIS_POINTS
+
+
+def format_cents(cents):
+    """
+    Format int cents with exactly two decimals.
+
+    Parameters:
+    cents (int): The amount in cents.
+
+    Returns:
+    str: The amount, like "1450.00" or "-0.05".
+    """
+    sign = "-" if cents < 0 else ""
+    units, rest = divmod(abs(cents), CENTS)
+    return f"{sign}{units}.{rest:02d}"
@@ -0,0 +1,430 @@
+import os
+import struct
+import threading
+import zlib
+
+import products
+import snapshot
+
+# Journal record: crc32, sequence number, quantity, active flag and
+# name length, followed by the UTF-8 encoded product name. The CRC
+# covers everything after itself, so a torn write at the end of the
+# journal is detected and ignored on recovery.
+_RECORD = struct.Struct("<IQqBH")
+_RECORD_BODY = struct.Struct("<QqBH")
+
+# Snapshot: magic, last journal sequence number included and product
+# count, followed by one quantity, active flag and name per product.
+_SNAPSHOT_MAGIC = b"BBSNAP01"
+_SNAPSHOT_HEADER = struct.Struct("<8sQI")
+_SNAPSHOT_ENTRY = struct.Struct("<qBH")
+
+SNAPSHOT_FILE = "snapshot.bin"
+_JOURNAL_PREFIX = "journal-"
+_JOURNAL_SUFFIX = ".log"
+
+
+def _encode_record(seq, product):
+    """
+    Encode the current state of a product as a journal record.
+
+    Parameters:
+    seq (int): The sequence number of the record.
+    product (Product): The product to record.
+
+    Returns:
+    bytes: The encoded record.
+    """
+    name = product.name.encode()
+    quantity = (0 if isinstance(product, products.NonStockedProduct)
+                else product.quantity)
+    body = _RECORD_BODY.pack(seq, quantity, product.active, len(name))
+    body += name
+    return struct.pack("<I", zlib.crc32(body)) + body
+
+
+def read_journal(path):
+    """
+    Read the valid records of a journal file. Reading stops at the
+    first truncated or corrupt record.
+
+    Parameters:
+    path (str): The journal file.
+
+    Yields:
+    tuple: (seq, name, quantity, active) for every record.
+    """
+    with open(path, "rb") as journal_file:
+        data = journal_file.read()
+    offset = 0
+    while offset + _RECORD.size <= len(data):
+        crc, seq, quantity, active, name_len = _RECORD.unpack_from(
+            data, offset)
+        end = offset + _RECORD.size + name_len
+        if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+            return
+        name = data[offset + _RECORD.size:end].decode()
+        yield seq, name, quantity, bool(active)
+        offset = end
+
+
+def write_snapshot(path, seq, product_list):
+    """
+    Atomically write a snapshot of the state of every product.
+
+    Parameters:
+    path (str): The snapshot file.
+    seq (int): The last journal sequence number the snapshot covers.
+    product_list (list): The products to save.
+    """
+    parts = [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, seq,
+                                   len(product_list))]
+    for product in product_list:
+        name = product.name.encode()
+        quantity = (0 if isinstance(product, products.NonStockedProduct)
+                    else product.quantity)
+        parts.append(_SNAPSHOT_ENTRY.pack(quantity, product.active,
+                                          len(name)))
+        parts.append(name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as snapshot_file:
+        snapshot_file.write(b"".join(parts))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(tmp_path, path)
+    snapshot.fsync_directory(os.path.dirname(path) or os.curdir)
+
+
+def read_snapshot(path):
+    """
+    Read a snapshot written by write_snapshot.
+
+    Parameters:
+    path (str): The snapshot file.
+
+    Returns:
+    tuple: (seq, entries) where entries is a list of
+           (name, quantity, active) tuples.
+
+    Raises:
+    ValueError: If the file is not a snapshot.
+    """
+    with open(path, "rb") as snapshot_file:
+        data = snapshot_file.read()
+    magic, seq, count = _SNAPSHOT_HEADER.unpack_from(data)
+    if magic != _SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a store snapshot")
+    offset = _SNAPSHOT_HEADER.size
+    entries = []
+    for _ in range(count):
+        quantity, active, name_len = _SNAPSHOT_ENTRY.unpack_from(
+            data, offset)
+        offset += _SNAPSHOT_ENTRY.size
+        name = data[offset:offset + name_len].decode()
+        offset += name_len
+        entries.append((name, quantity, bool(active)))
+    return seq, entries
+
+
+def apply_state(product, quantity, active):
+    """
+    Restore the quantity and active flag of a product.
+
+    Parameters:
+    product (Product): The product to restore.
+    quantity (int): The saved quantity (ignored for non-stocked
+                    products).
+    active (bool): The saved active flag.
+    """
+    if not isinstance(product, products.NonStockedProduct):
+        product.set_quantity(quantity)
+    if active and not product.is_active():
+        product.activate()
+    elif not active and product.is_active():
+        product.deactivate()
+
+
+class InventoryLog:
+    """
+    Persists the stock of a store as an append-only journal plus
+    periodic snapshots.
+
+    Every product change is appended to an in-memory buffer as a record
+    holding the product's new absolute quantity and active flag. A
+    background thread takes the buffer and then writes and fsyncs it
+    once per batch (group commit) without holding the buffer lock, so
+    buying a product never waits on the disk.
+    Because records hold absolute state, replaying them is idempotent,
+    and snapshots can be taken without stopping the store. If a write
+    fails, the thread stops and the error is raised to every
+    wait_durable and close call from then on.
+
+    After snapshot_every records, the journal is rotated to a new
+    segment file, a snapshot is written, and segments covered by the
+    snapshot are deleted.
+
+    Attributes:
+    directory (str): The directory holding the journal and snapshots.
+    """
+
+    def __init__(self, directory, flush_interval=0.05, batch_size=1024,
+                 snapshot_every=100000):
+        """
+        Initialize the log. Call recover() and then attach() to use it.
+
+        Parameters:
+        directory (str): The directory holding the journal and
+                         snapshots. It is created if missing.
+        flush_interval (float): The longest time in seconds a record
+                                waits in memory before it is written.
+        batch_size (int): Write as soon as this many records wait.
+        snapshot_every (int): Take a snapshot after this many records.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._snapshot_every = snapshot_every
+        self._buffer = []
+        self._last_seq = 0
+        self._durable_seq = 0
+        self._since_snapshot = 0
+        self._store = None
+        self._journal_file = None
+        self._closed = False
+        self._error = None
+        # Guards the buffer and sequence numbers; never held across
+        # disk I/O. The I/O lock orders writes, rotation and closing.
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._durable = threading.Condition(self._lock)
+        self._thread = None
+
+    def _segments(self):
+        """
+        List the journal segment files, oldest first.
+
+        Returns:
+        list: (first_seq, path) tuples.
+        """
+        segments = []
+        for file_name in os.listdir(self.directory):
+            if (file_name.startswith(_JOURNAL_PREFIX) and
+                    file_name.endswith(_JOURNAL_SUFFIX)):
+                first_seq = int(file_name[len(_JOURNAL_PREFIX):
+                                          -len(_JOURNAL_SUFFIX)])
+                segments.append(
+                    (first_seq, os.path.join(self.directory, file_name)))
+        return sorted(segments)
+
+    def _open_segment(self, first_seq):
+        """
+        Start a new journal segment file.
+
+        Parameters:
+        first_seq (int): The sequence number of its first record.
+        """
+        if self._journal_file is not None:
+            self._journal_file.close()
+        path = os.path.join(self.directory,
+                            f"{_JOURNAL_PREFIX}{first_seq:020d}"
+                            f"{_JOURNAL_SUFFIX}")
+        self._journal_file = open(path, "ab")
+
+    def recover(self, store_inst):
+        """
+        Restore the stock of a store from the latest snapshot and the
+        journal records written after it. Products that are not in the
+        store are skipped.
+
+        Parameters:
+        store_inst (Store): The store to restore. Its catalog must
+                            already be loaded.
+
+        Returns:
+        int: The number of journal records replayed.
+        """
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        snapshot_seq = 0
+        if os.path.exists(snapshot_path):
+            snapshot_seq, entries = read_snapshot(snapshot_path)
+            for name, quantity, active in entries:
+                product = store_inst.get_product(name)
+                if product is not None:
+                    apply_state(product, quantity, active)
+        self._last_seq = snapshot_seq
+        replayed = 0
+        for _, path in self._segments():
+            for seq, name, quantity, active in read_journal(path):
+                if seq <= snapshot_seq:
+                    continue
+                product = store_inst.get_product(name)
+                if product is not None:
+                    apply_state(product, quantity, active)
+                self._last_seq = max(self._last_seq, seq)
+                replayed += 1
+        self._durable_seq = self._last_seq
+        self._since_snapshot = replayed
+        return replayed
+
+    def attach(self, store_inst):
+        """
+        Start journaling every product change of a store.
+
+        Parameters:
+        store_inst (Store): The store to journal, normally the store
+                            passed to recover().
+        """
+        self._store = store_inst
+        self._open_segment(self._last_seq + 1)
+        self._thread = threading.Thread(target=self._run,
+                                        name="inventory-log",
+                                        daemon=True)
+        self._thread.start()
+        store_inst.add_listener(self)
+
+    def product_changed(self, product):
+        """
+        Append the new state of a product to the journal buffer.
+
+        Parameters:
+        product (Product): The product that changed.
+        """
+        with self._lock:
+            if self._error is not None:
+                return
+            self._last_seq += 1
+            self._buffer.append(_encode_record(self._last_seq, product))
+            if len(self._buffer) >= self._batch_size:
+                self._wakeup.notify()
+
+    def wait_durable(self, timeout=None):
+        """
+        Wait until every record appended so far is on disk.
+
+        Parameters:
+        timeout (float): The longest time to wait in seconds, or None
+                         to wait forever.
+
+        Returns:
+        bool: True if the records are durable, False on timeout.
+
+        Raises:
+        OSError: If the background thread failed to write them.
+        """
+        with self._lock:
+            target = self._last_seq
+            self._wakeup.notify()
+            durable = self._durable.wait_for(
+                lambda: (self._durable_seq >= target or
+                         self._error is not None), timeout)
+            if self._durable_seq < target and self._error is not None:
+                raise self._error
+            return durable
+
+    def _run(self):
+        """
+        Write buffered records in batches until the log is closed or a
+        write fails. The error of a failed write is kept for
+        wait_durable and close to raise, and their waiters are woken.
+        """
+        try:
+            while True:
+                with self._lock:
+                    if not self._buffer and not self._closed:
+                        self._wakeup.wait(self._flush_interval)
+                    if self._closed and not self._buffer:
+                        return
+                with self._io_lock:
+                    self._write_batch()
+                with self._lock:
+                    snapshot_due = (self._since_snapshot >=
+                                    self._snapshot_every)
+                if snapshot_due:
+                    self.snapshot()
+        except Exception as error:
+            with self._lock:
+                self._error = error
+                self._buffer = []
+                self._durable.notify_all()
+
+    def _write_batch(self):
+        """
+        Write and fsync the buffered records. The buffer is swapped out
+        under the log lock and written after releasing it, so product
+        changes keep being buffered while the disk is busy. The caller
+        must hold the I/O lock and not the log lock.
+
+        Returns:
+        int: The sequence number of the last record now on disk.
+        """
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            seq = self._last_seq
+        if not batch:
+            return seq
+        self._journal_file.write(b"".join(batch))
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+        with self._lock:
+            self._since_snapshot += len(batch)
+            self._durable_seq = max(self._durable_seq, seq)
+            self._durable.notify_all()
+        return seq
+
+    def snapshot(self):
+        """
+        Write a snapshot of the attached store and delete the journal
+        segments it covers.
+        """
+        with self._io_lock:
+            seq = self._write_batch()
+            self._open_segment(seq + 1)
+            with self._lock:
+                self._since_snapshot = 0
+        write_snapshot(os.path.join(self.directory, SNAPSHOT_FILE), seq,
+                       self._store.product_list)
+        for first_seq, path in self._segments():
+            if first_seq <= seq:
+                os.remove(path)
+
+    def close(self):
+        """
+        Write the remaining records, stop the background thread and
+        stop journaling the store.
+
+        Raises:
+        OSError: If the background thread failed to write records.
+        """
+        if self._store is not None:
+            self._store.remove_listener(self)
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+        with self._io_lock:
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None
+        if self._error is not None:
+            raise self._error
+
+
+def open_log(directory, store_inst, **options):
+    """
+    Recover a store from a directory and start journaling it.
+
+    Parameters:
+    directory (str): The directory holding the journal and snapshots.
+    store_inst (Store): The store with its catalog loaded.
+    **options: Passed to InventoryLog.
+
+    Returns:
+    InventoryLog: The attached log. Close it on shutdown.
+    """
+    log = InventoryLog(directory, **options)
+    log.recover(store_inst)
+    log.attach(store_inst)
+    return log
@@ -1,14 +1,101 @@
+import threading
+from time import perf_counter
+
+import events
+import metrics
+import money
+import promotions
+
+INACTIVE = "inactive"
+INSUFFICIENT_STOCK = "insufficient_stock"
+ORDER_LIMIT = "order_limit"
+INVALID_QUANTITY = "invalid_quantity"
+
+# Guards the lazy creation of product locks.
+_LOCK_INIT = threading.Lock()
+
+
+def _price_to_cents(price):
+    """
+    Validate a price and convert it to cents.
+
+    Parameters:
+    price (float): The price in currency units.
+
+    Returns:
+    int: The price in cents.
+
+    Raises:
+    ValueError: If the price is not a number or not positive once
+                rounded to cents.
+    """
+    if (isinstance(price, bool) or not isinstance(price, (int, float)) or
+            not price > 0):
+        raise ValueError("Positive price expected, can't be negative")
+    cents = money.to_cents(price)
+    if cents <= 0:
+        raise ValueError("Positive price expected, can't be negative")
+    return cents
+
+
+class PurchaseError(Exception):
+    """
+    Base class for errors raised when a product cannot be bought.
+
+    Attributes:
+    reason (str): A machine-readable reason, one of INACTIVE,
+                  INSUFFICIENT_STOCK or ORDER_LIMIT.
+    """
+    reason = None
+
+
+class InactiveProductError(PurchaseError):
+    """
+    Raised when buying a product that is not active.
+    """
+    reason = INACTIVE
+
+
+class InsufficientStockError(PurchaseError):
+    """
+    Raised when buying more than the available stock.
+    """
+    reason = INSUFFICIENT_STOCK
+
+
+class OrderLimitError(PurchaseError):
+    """
+    Raised when buying more than the maximum allowed in one order.
+    """
+    reason = ORDER_LIMIT
+
+
 class Product:
     """
     A class to represent a product in the store.
 
     Attributes:
     name (str): The name of the product.
-    price (float): The price of the product.
-    quantity (int): The available quantity of the product.
+    price_cents (int): The price of the product in cents.
+    price (float): The price of the product, read-only, see set_price.
+    quantity (int): The quantity of the product in stock.
+    held (int): The part of the stock held for shoppers' carts, which
+                cannot be bought by anyone else, see Store.hold.
     active (bool): Indicates if the product is active.
     promotion (Promotion): The promotion applied to the product.
+    lock (RLock): Guards the stock check and update in buy. A store
+                  takes the locks of all products of a shopping list,
+                  see Store.lock_products.
+
+    Prices are kept as int cents and every purchase is priced in
+    cents, see money; buy converts the result to a float once.
+
+    Products use __slots__ instead of a per-instance __dict__, keep
+    their listeners in a shared empty tuple until one is added, and
+    create their lock on first use, so large catalogs stay compact.
     """
+    __slots__ = ("name", "price_cents", "quantity", "held", "active",
+                 "promotion", "_listeners", "_lock")
 
     def __init__(self, name, price, quantity):
         """
@@ -18,6 +105,7 @@ class Product:
         Parameters:
         name (str): The name of the product.
         price (float): The price of the product (must be positive).
+                       It is rounded to whole cents.
         quantity (int): The initial quantity of the product
                        (must be non-negative).
 
@@ -28,25 +116,125 @@ class Product:
         if not (isinstance(name, str) and name):
             raise ValueError("Name expected, string can't be empty")
         self.name = name
-        if not (isinstance(price, (int, float)) and price > 0):
-            raise ValueError(
-                "Positive price expected, can't be negative")
-        self.price = price
+        self.price_cents = _price_to_cents(price)
         if not (isinstance(quantity, int) and quantity >= 0):
             raise ValueError(
                 "Quantity needs to be a non-negative number")
         self.quantity = quantity
+        self.held = 0
         self.active = True
         self.promotion = None
+        self._listeners = ()
+        self._lock = None
+
+    def __getstate__(self):
+        """
+        Get the state to pickle: every slot except the listeners and
+        the lock, which belong to this process.
+
+        Returns:
+        dict: The slot values.
+        """
+        state = {}
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, "__slots__", ()):
+                if slot not in ("_listeners", "_lock"):
+                    state[slot] = getattr(self, slot)
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore a pickled product, without listeners and with its
+        promotion interned.
+
+        Parameters:
+        state (dict): The slot values from __getstate__.
+        """
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        if self.promotion is not None:
+            self.promotion = promotions.intern(self.promotion)
+        self._listeners = ()
+        self._lock = None
+
+    @property
+    def price(self):
+        """
+        Get the price of the product.
+
+        Returns:
+        float: The price in currency units.
+        """
+        return self.price_cents / money.CENTS
+
+    @price.setter
+    def price(self, price):
+        """
+        Set the price of the product, like set_price.
+
+        Parameters:
+        price (float): The new price (must be positive).
+
+        Raises:
+        ValueError: If price is not positive.
+        """
+        self.set_price(price)
+
+    @property
+    def lock(self):
+        """
+        Get the lock of the product, creating it on first use.
+
+        Returns:
+        RLock: The lock of the product.
+        """
+        lock = self._lock
+        if lock is None:
+            with _LOCK_INIT:
+                if self._lock is None:
+                    self._lock = threading.RLock()
+                lock = self._lock
+        return lock
+
+    def add_listener(self, listener):
+        """
+        Register a listener that is notified whenever the quantity,
+        activation or promotion of the product changes.
+
+        Parameters:
+        listener: An object with a product_changed(product) method,
+                  such as a Store holding this product.
+        """
+        if listener not in self._listeners:
+            self._listeners = self._listeners + (listener,)
+
+    def remove_listener(self, listener):
+        """
+        Unregister a listener added with add_listener.
+
+        Parameters:
+        listener: The listener to remove.
+        """
+        if listener in self._listeners:
+            self._listeners = tuple(
+                other for other in self._listeners if other is not listener)
+
+    def _notify(self):
+        """
+        Notify all registered listeners that the product changed.
+        """
+        for listener in self._listeners:
+            listener.product_changed(self)
 
     def get_quantity(self):
         """
-        Get the quantity of the product.
+        Get the quantity of the product that can be bought: the stock
+        less the units held for carts.
 
         Returns:
         int: The available quantity of the product.
         """
-        return self.quantity
+        return self.quantity - self.held
 
     def set_quantity(self, quantity):
         """
@@ -59,6 +247,22 @@ class Product:
         self.quantity = quantity
         if self.quantity == 0:
             self.deactivate()
+        else:
+            self._notify()
+
+    def set_price(self, price):
+        """
+        Set the price of the product.
+
+        Parameters:
+        price (float): The new price (must be positive). It is
+                       rounded to whole cents.
+
+        Raises:
+        ValueError: If price is not positive.
+        """
+        self.price_cents = _price_to_cents(price)
+        self._notify()
 
     def is_active(self):
         """
@@ -74,21 +278,29 @@ class Product:
         Activate the product.
         """
         self.active = True
+        self._notify()
 
     def deactivate(self):
         """
         Deactivate the product.
         """
+        was_active = self.active
         self.active = False
+        self._notify()
+        if was_active and events.ENABLED:
+            events.emit(events.DEACTIVATED, self.name)
 
     def set_promotion(self, promotion):
         """
-        Set a promotion for the product.
+        Set a promotion for the product. Promotions are interned, so
+        products given equal promotions share one promotion object.
 
         Parameters:
         promotion (Promotion): The promotion to apply to the product.
         """
-        self.promotion = promotion
+        self.promotion = (None if promotion is None
+                          else promotions.intern(promotion))
+        self._notify()
 
     def get_promotion(self):
         """
@@ -108,7 +320,8 @@ class Product:
         """
         promo_text = f", Promotion: {self.promotion.name}" if (
             self.promotion) else ""
-        return (f"{self.name}, Price: {self.price}, Quantity: "
+        return (f"{self.name}, Price: "
+                f"{money.format_cents(self.price_cents)}, Quantity: "
                 f"{self.quantity}{promo_text}")
 
     def buy(self, quantity):
@@ -122,27 +335,75 @@ class Product:
         float: The total price for the purchased quantity.
 
         Raises:
-        Exception: If the product is not active or if the requested
-                   quantity exceeds the available stock.
+        InactiveProductError: If the product is not active.
+        InsufficientStockError: If the requested quantity exceeds the
+                                available stock.
+        OrderLimitError: If a LimitedProduct's limit is exceeded.
         ValueError: If quantity is non-positive.
         """
-        if not self.active:
-            raise Exception("Product is not active")
-        if quantity <= 0:
-            raise ValueError(
-                "Quantity to buy must be a positive number")
-        if quantity > self.quantity:
-            raise Exception("Quantity larger than available stock")
-
-        if self.promotion:
-            print(
-                f"Applying promotion: {self.promotion.name} to {self.name}")
-            total_price = self.promotion.apply_promotion(self,
-                                                         quantity)
-        else:
-            total_price = self.price * quantity
+        return self.buy_cents(quantity) / money.CENTS
 
-        self.set_quantity(self.quantity - quantity)
+    def buy_cents(self, quantity):
+        """
+        Purchase a given quantity of the product, see buy.
+
+        Parameters:
+        quantity (int): The quantity to purchase (must be positive).
+
+        Returns:
+        int: The total price in cents for the purchased quantity.
+
+        Raises:
+        InactiveProductError: If the product is not active.
+        InsufficientStockError: If the requested quantity exceeds the
+                                available stock.
+        ValueError: If quantity is non-positive.
+        """
+        timed = metrics.ENABLED
+        if timed:
+            start = perf_counter()
+        with self.lock:
+            if not self.active:
+                raise InactiveProductError("Product is not active")
+            if quantity <= 0:
+                raise ValueError(
+                    "Quantity to buy must be a positive number")
+            if quantity > self.quantity - self.held:
+                raise InsufficientStockError(
+                    "Quantity larger than available stock")
+
+            total_price = self._price_for(quantity)
+            if events.ENABLED:
+                events.emit(events.PURCHASE, self.name, quantity,
+                            price_cents=total_price)
+            self.set_quantity(self.quantity - quantity)
+        if timed:
+            metrics.BUYS.inc()
+            metrics.BUY_SECONDS.observe(perf_counter() - start)
+        return total_price
+
+    def _price_for(self, quantity):
+        """
+        Compute the price of a quantity of the product, applying its
+        promotion if it has one.
+
+        Parameters:
+        quantity (int): The quantity being purchased.
+
+        Returns:
+        int: The total price in cents for the quantity.
+        """
+        if not self.promotion:
+            return self.price_cents * quantity
+        if events.ENABLED:
+            events.emit(events.PROMOTION_APPLIED, self.name, quantity,
+                        promotion=self.promotion.name)
+        if not metrics.ENABLED:
+            return self.promotion.apply_promotion_cents(self, quantity)
+        start = perf_counter()
+        total_price = self.promotion.apply_promotion_cents(self, quantity)
+        metrics.PROMOTION_SECONDS.observe(perf_counter() - start,
+                                          type(self.promotion).__name__)
         return total_price
 
 
@@ -150,6 +411,7 @@ class NonStockedProduct(Product):
     """
     A class to represent a non-stocked product, such as a digital item.
     """
+    __slots__ = ()
 
     def __init__(self, name, price):
         """
@@ -181,7 +443,7 @@ class NonStockedProduct(Product):
         """
         return float('inf')
 
-    def buy(self, quantity):
+    def buy_cents(self, quantity):
         """
         Buy a given quantity of the non-stocked product.
 
@@ -189,26 +451,28 @@ class NonStockedProduct(Product):
         quantity (int): The quantity to buy (must be positive).
 
         Returns:
-        float: The total price for the purchased quantity.
+        int: The total price in cents for the purchased quantity.
 
         Raises:
-        Exception: If the product is not active.
+        InactiveProductError: If the product is not active.
         ValueError: If quantity is non-positive.
         """
+        timed = metrics.ENABLED
+        if timed:
+            start = perf_counter()
         if not self.is_active():
-            raise Exception("Product is not active")
+            raise InactiveProductError("Product is not active")
         if quantity <= 0:
             raise ValueError(
                 "Quantity to buy must be a positive number")
 
-        if self.promotion:
-            print(
-                f"Applying promotion: {self.promotion.name} to {self.name}")
-            total_price = self.promotion.apply_promotion(self,
-                                                         quantity)
-        else:
-            total_price = self.price * quantity
-
+        total_price = self._price_for(quantity)
+        if events.ENABLED:
+            events.emit(events.PURCHASE, self.name, quantity,
+                        price_cents=total_price)
+        if timed:
+            metrics.BUYS.inc()
+            metrics.BUY_SECONDS.observe(perf_counter() - start)
         return total_price
 
     def show(self):
@@ -221,7 +485,8 @@ class NonStockedProduct(Product):
         promo_text = f", Promotion: {self.promotion.name}" if (
             self.promotion) else ""
         return (
-            f"{self.name}, Price: {self.price}, Available: Unlimited"
+            f"{self.name}, Price: {money.format_cents(self.price_cents)}, "
+            f"Available: Unlimited"
             f"{promo_text}")
 
 
@@ -230,6 +495,7 @@ class LimitedProduct(Product):
     A class to represent a limited product that can only be purchased
     a limited number of times per order.
     """
+    __slots__ = ("max_quantity_per_order",)
 
     def __init__(self, name, price, quantity,
                  max_quantity_per_order):
@@ -252,7 +518,7 @@ class LimitedProduct(Product):
                 "Max quantity per order must be a positive integer")
         self.max_quantity_per_order = max_quantity_per_order
 
-    def buy(self, quantity):
+    def buy_cents(self, quantity):
         """
         Purchase a given quantity of the limited product.
 
@@ -261,16 +527,16 @@ class LimitedProduct(Product):
                        max per order).
 
         Returns:
-        float: The total price for the purchased quantity.
+        int: The total price in cents for the purchased quantity.
 
         Raises:
-        Exception: If quantity exceeds the max allowed per order.
+        OrderLimitError: If quantity exceeds the max allowed per order.
         """
         if quantity > self.max_quantity_per_order:
-            raise Exception(
+            raise OrderLimitError(
                 f"Cannot buy more than {self.max_quantity_per_order} "
                 f"of this item in one order")
-        return super().buy(quantity)
+        return super().buy_cents(quantity)
 
     def show(self):
         """
@@ -282,3 +548,37 @@ class LimitedProduct(Product):
         """
         base_show = super().show()
         return f"{base_show}, Max per order: {self.max_quantity_per_order}"
+
+
+def from_fields(cls, name, price_cents, quantity, active=True,
+                promotion=None, max_quantity_per_order=None):
+    """
+    Create a product from values that were already validated, without
+    running the checks of __init__ again. Bulk loaders validate whole
+    batches of rows and then build products through here.
+
+    Parameters:
+    cls (type): Product, NonStockedProduct or LimitedProduct.
+    name (str): The name of the product.
+    price_cents (int): The price in cents.
+    quantity (int): The quantity; 0 for a non-stocked product.
+    active (bool): Whether the product is active.
+    promotion (Promotion): The promotion of the product, or None.
+    max_quantity_per_order (int): The per-order limit of a limited
+                                  product.
+
+    Returns:
+    Product: The product.
+    """
+    product = cls.__new__(cls)
+    product.name = name
+    product.price_cents = price_cents
+    product.quantity = quantity
+    product.held = 0
+    product.active = active
+    product.promotion = promotion
+    product._listeners = ()
+    product._lock = None
+    if max_quantity_per_order is not None:
+        product.max_quantity_per_order = max_quantity_per_order
+    return product
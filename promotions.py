@@ -1,4 +1,33 @@
+import json
+import weakref
 from abc import ABC, abstractmethod
+from bisect import bisect_right
+
+import money
+
+# Interned promotions by intern key. Entries go away with the last
+# product using the promotion, so a long-running store does not keep
+# every promotion it ever loaded.
+_interned = weakref.WeakValueDictionary()
+
+
+def intern(promotion):
+    """
+    Get the shared instance of a promotion. Promotions with the same
+    type and parameters are interchangeable, so a catalog can hold one
+    object per distinct promotion instead of one per product.
+
+    Parameters:
+    promotion (Promotion): The promotion to intern.
+
+    Returns:
+    Promotion: The first interned promotion equal to this one, or the
+               promotion itself if it cannot be interned.
+    """
+    key = promotion.intern_key()
+    if key is None:
+        return promotion
+    return _interned.setdefault(key, promotion)
 
 
 class Promotion(ABC):
@@ -32,79 +61,426 @@ class Promotion(ABC):
         """
         pass
 
+    def apply_promotion_cents(self, product, quantity):
+        """
+        Apply the promotion and get the price in cents. Subclasses that
+        price in cents natively override this; the default rounds the
+        result of apply_promotion to the nearest cent.
+
+        Parameters:
+        product (Product): The product the promotion is applied to.
+        quantity (int): The quantity of the product to apply the promotion.
+
+        Returns:
+        int: The price in cents after applying the promotion.
+        """
+        return money.to_cents(self.apply_promotion(product, quantity))
+
+    def intern_key(self):
+        """
+        Get the key identifying equal promotions, see intern().
+        Subclasses with parameters must include them in the key.
 
-class PercentDiscount(Promotion):
+        Returns:
+        tuple: The key, or None if the promotion is never shared.
+        """
+        return None
+
+    def apply_promotion_many(self, product, quantities):
+        """
+        Apply the promotion to several purchases of the same product.
+
+        Parameters:
+        product (Product): The product the promotion is applied to.
+        quantities (list): The quantity of each purchase.
+
+        Returns:
+        list: The price of each purchase after applying the promotion.
+        """
+        return [self.apply_promotion(product, quantity)
+                for quantity in quantities]
+
+    def apply_promotion_many_cents(self, product, quantities):
+        """
+        Apply the promotion to several purchases of the same product
+        and get the prices in cents.
+
+        Parameters:
+        product (Product): The product the promotion is applied to.
+        quantities (list): The quantity of each purchase.
+
+        Returns:
+        list: The price in cents of each purchase.
+        """
+        return [self.apply_promotion_cents(product, quantity)
+                for quantity in quantities]
+
+
+def _number(rule, field, minimum=0, maximum=None, integer=False):
     """
-    Class representing a percentage discount promotion.
+    Read a numeric field of a rule and check its range.
+
+    Parameters:
+    rule (dict): The rule.
+    field (str): The field name.
+    minimum (float): The smallest allowed value.
+    maximum (float): The largest allowed value, or None.
+    integer (bool): Whether the value must be an integer.
+
+    Returns:
+    float: The value.
+
+    Raises:
+    ValueError: If the field is missing or out of range.
+    """
+    value = rule.get(field)
+    kinds = int if integer else (int, float)
+    if (isinstance(value, bool) or not isinstance(value, kinds) or
+            value < minimum or (maximum is not None and value > maximum)):
+        upper = "" if maximum is None else f" and at most {maximum}"
+        raise ValueError(f"Rule field '{field}' must be a number of at "
+                         f"least {minimum}{upper}")
+    return value
+
+
+# The pricing functions below inline money.discount, the percentage
+# of a cent amount rounded half up, as (cents * bp + 5000) // 10000.
+
+def _compile_percent(rule):
+    """
+    Compile a percent rule, see compile_rule.
+    """
+    bp = money.to_basis_points(_number(rule, "percent", maximum=100))
+    # Discounted unit prices by list price. A catalog has few distinct
+    # prices, and a lookup is cheaper than the integer division.
+    units = {}
+
+    def price_percent(product, quantity):
+        try:
+            return units[product.price_cents] * quantity
+        except KeyError:
+            price = product.price_cents
+            unit = units[price] = price - (price * bp + 5000) // 10000
+            return unit * quantity
+    return price_percent
+
+
+def _compile_buy_x_get_y(rule):
+    """
+    Compile a buy X get Y rule, see compile_rule.
+    """
+    buy = _number(rule, "buy", minimum=1, integer=True)
+    get = _number(rule, "get", minimum=1, integer=True)
+    bp = money.to_basis_points(_number(rule, "percent_off", maximum=100))
+    free = bp == money.BASIS_POINTS
+    group = buy + get
+
+    # With a single discounted unit per group, a partial group never
+    # reaches it, so the count of discounted units is one division.
+    if get == 1 and free:
+        def price_buy_x_get_one_free(product, quantity):
+            return (quantity - quantity // group) * product.price_cents
+        return price_buy_x_get_one_free
+
+    # Discounted unit prices by list price, see _compile_percent.
+    units = {}
+
+    if get == 1:
+        def price_buy_x_get_one(product, quantity):
+            price = product.price_cents
+            discounted = quantity // group
+            try:
+                unit = units[price]
+            except KeyError:
+                unit = units[price] = price - (price * bp + 5000) // 10000
+            return (quantity - discounted) * price + discounted * unit
+        return price_buy_x_get_one
+
+    if free:
+        def price_buy_x_get_free(product, quantity):
+            discounted = quantity // group * get
+            extra = quantity % group - buy
+            if extra > 0:
+                discounted += extra
+            return (quantity - discounted) * product.price_cents
+        return price_buy_x_get_free
+
+    def price_buy_x_get_y(product, quantity):
+        price = product.price_cents
+        discounted = quantity // group * get
+        extra = quantity % group - buy
+        if extra > 0:
+            discounted += extra
+        try:
+            unit = units[price]
+        except KeyError:
+            unit = units[price] = price - (price * bp + 5000) // 10000
+        return (quantity - discounted) * price + discounted * unit
+    return price_buy_x_get_y
+
+
+def _compile_tiered_percent(rule):
+    """
+    Compile a tiered percent rule, see compile_rule.
+    """
+    tiers = rule.get("tiers")
+    if (not isinstance(tiers, (list, tuple)) or not tiers or
+            not all(isinstance(tier, (list, tuple)) and len(tier) == 2
+                    for tier in tiers)):
+        raise ValueError("Rule field 'tiers' must list "
+                         "[min_quantity, percent] pairs")
+    parsed = sorted(
+        (_number({"min_quantity": tier[0]}, "min_quantity", minimum=1,
+                 integer=True),
+         _number({"percent": tier[1]}, "percent", maximum=100))
+        for tier in tiers)
+    thresholds = [min_quantity for min_quantity, _ in parsed]
+    bps = [0] + [money.to_basis_points(percent) for _, percent in parsed]
+
+    def price_tiered_percent(product, quantity):
+        price = product.price_cents
+        bp = bps[bisect_right(thresholds, quantity)]
+        return (price - (price * bp + 5000) // 10000) * quantity
+    return price_tiered_percent
+
+
+def _compile_bundle(rule):
+    """
+    Compile a fixed-price bundle rule, see compile_rule.
+    """
+    size = _number(rule, "size", minimum=1, integer=True)
+    bundle_price = money.to_cents(_number(rule, "price"))
+
+    def price_bundle(product, quantity):
+        return ((quantity // size) * bundle_price +
+                (quantity % size) * product.price_cents)
+    return price_bundle
+
+
+def _compile_spend_threshold(rule):
+    """
+    Compile a spend threshold rule, see compile_rule.
+    """
+    threshold = money.to_cents(_number(rule, "threshold"))
+    bp = money.to_basis_points(_number(rule, "percent", maximum=100))
+
+    def price_spend_threshold(product, quantity):
+        subtotal = product.price_cents * quantity
+        if subtotal < threshold:
+            return subtotal
+        return subtotal - (subtotal * bp + 5000) // 10000
+    return price_spend_threshold
+
+
+RULE_COMPILERS = {
+    "percent": _compile_percent,
+    "buy_x_get_y": _compile_buy_x_get_y,
+    "tiered_percent": _compile_tiered_percent,
+    "bundle": _compile_bundle,
+    "spend_threshold": _compile_spend_threshold,
+}
+
+
+def compile_rule(rule):
+    """
+    Compile a declarative promotion rule into a pricing function.
+
+    Supported rules:
+    - {"type": "percent", "percent": 30}: percent off every unit.
+    - {"type": "buy_x_get_y", "buy": 2, "get": 1, "percent_off": 100}:
+      in every group of buy + get units, the last get units are
+      percent_off cheaper (100 means free).
+    - {"type": "tiered_percent", "tiers": [[10, 5], [50, 10]]}: the
+      percent of the highest tier whose minimum quantity is reached
+      applies to every unit.
+    - {"type": "bundle", "size": 3, "price": 100}: every full group of
+      size units costs price, the rest list price.
+    - {"type": "spend_threshold", "threshold": 1000, "percent": 10}:
+      percent off the line once its list price reaches threshold.
+
+    Every pricing function runs in constant time in the quantity and
+    works in int cents. Prices in rules are rounded to whole cents and
+    percentages to hundredths of a percent. Percentages of a price are
+    rounded half up to a whole cent (see money.discount): per unit for
+    percent, tiered_percent and buy_x_get_y, so a line always costs a
+    whole number of discounted unit prices, and on the line subtotal
+    for spend_threshold. 50% off 9.99 is therefore 4.99.
+
+    Parameters:
+    rule (dict): The rule.
+
+    Returns:
+    callable: A function (product, quantity) -> total price in cents.
+
+    Raises:
+    ValueError: If the rule is unknown or malformed.
+    """
+    if not isinstance(rule, dict):
+        raise ValueError("Promotion rule must be a dict")
+    compiler = RULE_COMPILERS.get(rule.get("type"))
+    if compiler is None:
+        raise ValueError(f"Unknown promotion rule type: "
+                         f"{rule.get('type')!r}")
+    return compiler(rule)
+
+
+class RulePromotion(Promotion):
+    """
+    Class representing a promotion defined by a declarative rule, see
+    compile_rule. The rule is compiled once, when the promotion is
+    created, and every pricing method calls the compiled function.
 
     Attributes:
     name (str): The name of the promotion.
-    percent (float): The percentage discount to be applied.
+    rule (dict): The rule defining the promotion.
     """
 
-    def __init__(self, name, percent):
+    def __init__(self, name, rule):
         """
-        Initialize the percentage discount promotion.
+        Initialize the promotion and compile its rule.
 
         Parameters:
         name (str): The name of the promotion.
-        percent (float): The percentage discount to apply.
+        rule (dict): The rule defining the promotion.
+
+        Raises:
+        ValueError: If the rule is unknown or malformed.
         """
         super().__init__(name)
-        self.percent = percent
+        self.rule = dict(rule)
+        self._price_cents = compile_rule(self.rule)
+
+    def __reduce__(self):
+        """
+        Pickle the promotion by its rule; the compiled function is
+        rebuilt when it is unpickled.
+
+        Returns:
+        tuple: How to rebuild the promotion, see _restore_rule.
+        """
+        return _restore_rule, (type(self), self.name, self.rule,
+                               self._extra_state())
+
+    def _extra_state(self):
+        """
+        Get the instance attributes set by subclasses, besides the
+        name and the rule.
+
+        Returns:
+        dict: The attributes by name.
+        """
+        return {key: value for key, value in self.__dict__.items()
+                if key not in ("name", "rule", "_price_cents")}
+
+    def intern_key(self):
+        """
+        Get the key identifying equal rule promotions.
+
+        Returns:
+        tuple: The type, name, rule and any subclass attributes, or
+               None if those attributes cannot be written as JSON.
+        """
+        try:
+            extra = json.dumps(self._extra_state(), sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        return (type(self), self.name,
+                json.dumps(self.rule, sort_keys=True), extra)
 
     def apply_promotion(self, product, quantity):
         """
-        Apply the percentage discount to the product.
+        Apply the rule to the product.
 
         Parameters:
-        product (Product): The product to apply the discount to.
+        product (Product): The product to apply the rule to.
         quantity (int): The quantity of the product being purchased.
 
         Returns:
-        float: The total price after applying the percentage discount.
+        float: The total price after applying the rule.
         """
-        discount = (self.percent / 100) * product.price
-        return (product.price - discount) * quantity
+        return self._price_cents(product, quantity) / money.CENTS
 
+    def apply_promotion_cents(self, product, quantity):
+        """
+        Apply the rule to the product.
+
+        Parameters:
+        product (Product): The product to apply the rule to.
+        quantity (int): The quantity of the product being purchased.
+
+        Returns:
+        int: The total price in cents after applying the rule.
+        """
+        return self._price_cents(product, quantity)
 
-class SecondHalfPrice(Promotion):
+    def apply_promotion_many_cents(self, product, quantities):
+        """
+        Apply the rule to several purchases at once.
+
+        Parameters:
+        product (Product): The product to apply the rule to.
+        quantities (list): The quantity of each purchase.
+
+        Returns:
+        list: The price in cents of each purchase.
+        """
+        price_cents = self._price_cents
+        return [price_cents(product, quantity) for quantity in quantities]
+
+
+def _restore_rule(cls, name, rule, extra):
     """
-    Class representing a second item at half price promotion.
+    Rebuild a pickled RulePromotion or subclass of it.
+
+    Parameters:
+    cls (type): The class of the promotion.
+    name (str): The name of the promotion.
+    rule (dict): The rule of the promotion.
+    extra (dict): Other instance attributes set by subclasses.
+
+    Returns:
+    RulePromotion: The promotion.
+    """
+    promotion = cls.__new__(cls)
+    RulePromotion.__init__(promotion, name, rule)
+    promotion.__dict__.update(extra)
+    return promotion
+
+
+class PercentDiscount(RulePromotion):
+    """
+    Class representing a percentage discount promotion.
 
     Attributes:
     name (str): The name of the promotion.
+    percent (float): The percentage discount to be applied, read from
+                     the rule.
     """
 
-    def __init__(self, name):
+    def __init__(self, name, percent):
         """
-        Initialize the second item at half price promotion.
+        Initialize the percentage discount promotion.
 
         Parameters:
         name (str): The name of the promotion.
+        percent (float): The percentage discount to apply.
         """
-        super().__init__(name)
+        super().__init__(name, {"type": "percent", "percent": percent})
 
-    def apply_promotion(self, product, quantity):
+    @property
+    def percent(self):
         """
-        Apply the second item at half price promotion to the product.
-
-        Parameters:
-        product (Product): The product to apply the promotion to.
-        quantity (int): The quantity of the product being purchased.
+        Get the percentage discount of the promotion.
 
         Returns:
-        float: The total price after applying the promotion.
+        float: The percentage discount.
         """
-        full_price_count = quantity // 2 + quantity % 2
-        half_price_count = quantity // 2
-        return (full_price_count * product.price) + (
-                half_price_count * product.price * 0.5)
+        return self.rule["percent"]
 
 
-class ThirdOneFree(Promotion):
+class SecondHalfPrice(RulePromotion):
     """
-    Class representing a buy two, get one free promotion.
+    Class representing a second item at half price promotion.
 
     Attributes:
     name (str): The name of the promotion.
@@ -112,24 +488,104 @@ class ThirdOneFree(Promotion):
 
     def __init__(self, name):
         """
-        Initialize the buy two, get one free promotion.
+        Initialize the second item at half price promotion.
 
         Parameters:
         name (str): The name of the promotion.
         """
-        super().__init__(name)
+        super().__init__(name, {"type": "buy_x_get_y", "buy": 1,
+                                "get": 1, "percent_off": 50})
 
-    def apply_promotion(self, product, quantity):
+
+class ThirdOneFree(RulePromotion):
+    """
+    Class representing a buy two, get one free promotion.
+
+    Attributes:
+    name (str): The name of the promotion.
+    """
+
+    def __init__(self, name):
         """
-        Apply the buy two, get one free promotion to the product.
+        Initialize the buy two, get one free promotion.
 
         Parameters:
-        product (Product): The product to apply the promotion to.
-        quantity (int): The quantity of the product being purchased.
-
-        Returns:
-        float: The total price after applying the promotion.
+        name (str): The name of the promotion.
         """
-        free_count = quantity // 3
-        payable_count = quantity - free_count
-        return payable_count * product.price
+        super().__init__(name, {"type": "buy_x_get_y", "buy": 2,
+                                "get": 1, "percent_off": 100})
+
+
+# The kinds of promotion records, see from_record.
+RECORD_KINDS = ("percent", "second_half_price", "third_one_free", "rule")
+
+
+def from_record(record):
+    """
+    Build a promotion from a promotion record, as written to catalogs,
+    snapshots and the SQLite store.
+
+    Parameters:
+    record (dict): kind and name, plus percent for percent promotions
+                   and rule, a dict or its JSON text, for rule
+                   promotions.
+
+    Returns:
+    Promotion: The interned promotion.
+
+    Raises:
+    ValueError: If the record is invalid.
+    """
+    kind = record["kind"]
+    name = record.get("name")
+    if not (isinstance(name, str) and name):
+        raise ValueError("promotion name expected")
+    if kind == "percent":
+        try:
+            percent = float(record.get("percent"))
+        except (TypeError, ValueError):
+            raise ValueError(f"percent must be a number, got "
+                             f"{record.get('percent')!r}")
+        # Whole percentages come back as int, so a percent read as
+        # 30.0 interns like the 30 that was written.
+        if percent.is_integer():
+            percent = int(percent)
+        promotion = PercentDiscount(name, percent=percent)
+    elif kind == "second_half_price":
+        promotion = SecondHalfPrice(name)
+    elif kind == "third_one_free":
+        promotion = ThirdOneFree(name)
+    else:
+        rule = record.get("rule")
+        if isinstance(rule, str):
+            rule = json.loads(rule)
+        promotion = RulePromotion(name, rule)
+    return intern(promotion)
+
+
+def to_record(promotion):
+    """
+    Convert a promotion to a promotion record, the inverse of
+    from_record.
+
+    Parameters:
+    promotion (Promotion): The promotion.
+
+    Returns:
+    dict: The record.
+
+    Raises:
+    ValueError: If the promotion type cannot be written as a record.
+    """
+    if isinstance(promotion, PercentDiscount):
+        return {"kind": "percent", "name": promotion.name,
+                "percent": promotion.percent}
+    if isinstance(promotion, SecondHalfPrice):
+        return {"kind": "second_half_price", "name": promotion.name}
+    if isinstance(promotion, ThirdOneFree):
+        return {"kind": "third_one_free", "name": promotion.name}
+    if isinstance(promotion, RulePromotion):
+        return {"kind": "rule", "name": promotion.name,
+                "rule": promotion.rule}
+    raise ValueError(
+        f"Cannot write promotion of type {type(promotion).__name__}")
@@ -0,0 +1,189 @@
+import json
+import sys
+from itertools import islice
+
+
+def read_records(stream):
+    """
+    Read order records from a JSON Lines stream, one at a time.
+
+    Each record looks like
+    {"id": "A-1", "lines": [{"product": "Google Pixel 7", "quantity": 1}]}
+    Blank lines are skipped.
+
+    Parameters:
+    stream (file): A text stream to read from.
+
+    Yields:
+    tuple: (line_number, record) for every record. record is None if
+           the line is not valid JSON.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+def resolve(store_inst, numbered_records):
+    """
+    Resolve the product names of order records to store products.
+
+    Parameters:
+    store_inst (Store): The store holding the products.
+    numbered_records (iterable): (line_number, record) tuples from
+                                 read_records.
+
+    Yields:
+    tuple: (line_number, record_id, shopping_list, errors). Lines that
+           cannot be resolved are left out of the shopping list and
+           reported in errors. record_id is None if the record has no
+           id, and shopping_list is None if the record is not a JSON
+           object, with the reason in errors.
+    """
+    for line_number, record in numbered_records:
+        if not isinstance(record, dict):
+            yield line_number, None, None, ["Record is not a JSON object"]
+            continue
+        record_id = record.get("id")
+        shopping_list = []
+        errors = []
+        lines = record.get("lines")
+        if lines is None:
+            lines = []
+        elif not isinstance(lines, list):
+            errors.append("Order lines must be a JSON array")
+            lines = []
+        for line in lines:
+            if not isinstance(line, dict):
+                errors.append("Order line is not a JSON object")
+                continue
+            name = line.get("product")
+            product = (store_inst.get_product(name)
+                       if isinstance(name, str) else None)
+            quantity = line.get("quantity")
+            if product is None:
+                errors.append(f"Unknown product: {name!r}")
+            elif isinstance(quantity, bool) or not isinstance(quantity, int):
+                errors.append(f"Invalid quantity for '{product.name}'")
+            else:
+                shopping_list.append((product, quantity))
+        yield line_number, record_id, shopping_list, errors
+
+
+def batched(iterable, size):
+    """
+    Group an iterable into lists of at most size items.
+
+    Parameters:
+    iterable (iterable): The items to group.
+    size (int): The largest batch size.
+
+    Yields:
+    list: The next batch.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def place_orders(store_inst, resolved, batch_size=1000):
+    """
+    Place resolved orders in batches with Store.order_many.
+
+    Parameters:
+    store_inst (Store): The store to order from.
+    resolved (iterable): (line_number, record_id, shopping_list,
+                         errors) tuples from resolve.
+    batch_size (int): The number of orders per order_many call, at
+                      least 1.
+
+    Yields:
+    dict: One result per record, in input order. An order gives
+          {"id", "total", "errors"}, or {"line", "total", "errors"} if
+          the record has no id. A record that is not an order gives
+          {"line", "error"}, so it never looks like an order's result.
+
+    Raises:
+    ValueError: If batch_size is less than 1.
+    """
+    if batch_size < 1:
+        raise ValueError("Batch size must be at least 1")
+    for batch in batched(resolved, batch_size):
+        results = iter(store_inst.order_many(
+            [shopping_list for _, _, shopping_list, _ in batch
+             if shopping_list is not None]))
+        for line_number, record_id, shopping_list, errors in batch:
+            if shopping_list is None:
+                yield {"line": line_number, "error": errors[0]}
+                continue
+            total, order_errors = next(results)
+            if record_id is None:
+                result = {"line": line_number}
+            else:
+                result = {"id": record_id}
+            result["total"] = total
+            result["errors"] = errors + order_errors
+            yield result
+
+
+def replay(store_inst, input_stream, output_stream, batch_size=1000):
+    """
+    Stream order records from input_stream through the store and write
+    one JSON result line per order to output_stream. Memory use is
+    bounded by the batch size, not by the number of records.
+
+    Parameters:
+    store_inst (Store): The store to order from.
+    input_stream (file): A text stream of order records.
+    output_stream (file): A text stream for the results.
+    batch_size (int): The number of orders per order_many call.
+
+    Returns:
+    int: The number of records replayed, orders or not.
+    """
+    count = 0
+    results = place_orders(store_inst,
+                           resolve(store_inst, read_records(input_stream)),
+                           batch_size)
+    for result in results:
+        output_stream.write(json.dumps(result))
+        output_stream.write("\n")
+        count += 1
+    output_stream.flush()
+    return count
+
+
+def replay_files(store_inst, input_path, output_path, batch_size=1000,
+                 buffer_size=1 << 20):
+    """
+    Replay order records between files. "-" stands for stdin or stdout.
+
+    Parameters:
+    store_inst (Store): The store to order from.
+    input_path (str): The order records file, or "-".
+    output_path (str): The results file, or "-".
+    batch_size (int): The number of orders per order_many call.
+    buffer_size (int): The size in bytes of the file buffers.
+
+    Returns:
+    int: The number of records replayed, orders or not.
+    """
+    input_stream = (sys.stdin if input_path == "-" else
+                    open(input_path, encoding="utf-8",
+                         buffering=buffer_size))
+    output_stream = (sys.stdout if output_path == "-" else
+                     open(output_path, "w", encoding="utf-8",
+                          buffering=buffer_size))
+    try:
+        return replay(store_inst, input_stream, output_stream, batch_size)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
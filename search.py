@@ -0,0 +1,355 @@
+import math
+from bisect import bisect_left
+from collections import Counter
+from heapq import nlargest, nsmallest
+
+# The similarity thresholds fuzzy() tries before the one it was given.
+FUZZY_THRESHOLDS = (0.9, 0.75)
+# The most postings fuzzy() reads to find candidates in one pass.
+FUZZY_BUDGET = 2_000
+
+_EMPTY = frozenset()
+
+
+def normalize(name):
+    """
+    Normalize a product name for searching: case-insensitive, with
+    runs of whitespace collapsed.
+
+    Parameters:
+    name (str): The name.
+
+    Returns:
+    str: The normalized name.
+    """
+    return " ".join(name.casefold().split())
+
+
+def trigrams(text):
+    """
+    Get the trigrams of a normalized string, padded so that the start
+    and end of the string count too.
+
+    Parameters:
+    text (str): The normalized string.
+
+    Returns:
+    set: The distinct trigrams.
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    An index of names supporting exact, prefix and fuzzy lookups.
+
+    Entries are (key, name) pairs, where the key is any sortable value
+    the caller uses to find the item again, such as a sequence number.
+
+    - Exact lookups use a dict from normalized name to keys.
+    - Prefix lookups bisect a sorted array of normalized names.
+    - Fuzzy lookups use an inverted index from trigrams to keys. A
+      name shares at least min_shared trigrams with the query only if
+      it appears in one of the (query trigrams - min_shared + 1)
+      rarest posting lists, so only those lists are scanned for
+      candidates and the others are probed with set lookups.
+
+    Adding and removing one entry costs O(length of the name) for the
+    dict and trigrams, plus a memmove of the sorted array.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self._names = {}
+        self._exact = {}
+        self._sorted_names = []
+        self._sorted_keys = []
+        self._postings = {}
+        self._sizes = {}
+
+    def __len__(self):
+        """
+        Get the number of entries.
+
+        Returns:
+        int: The number of entries.
+        """
+        return len(self._names)
+
+    def __contains__(self, key):
+        """
+        Check whether a key is in the index.
+
+        Returns:
+        bool: True if the key is indexed.
+        """
+        return key in self._names
+
+    def add(self, key, name):
+        """
+        Add an entry. Adding a key that is already indexed has no
+        effect.
+
+        Parameters:
+        key: The key of the entry.
+        name (str): The name to index.
+        """
+        if key in self._names:
+            return
+        text = normalize(name)
+        self._names[key] = text
+        self._exact.setdefault(text, []).append(key)
+        index = bisect_left(self._sorted_names, text)
+        while (index < len(self._sorted_names) and
+               self._sorted_names[index] == text and
+               self._sorted_keys[index] < key):
+            index += 1
+        self._sorted_names.insert(index, text)
+        self._sorted_keys.insert(index, key)
+        grams = trigrams(text)
+        self._sizes[key] = len(grams)
+        for trigram in grams:
+            self._postings.setdefault(trigram, set()).add(key)
+
+    def add_many(self, entries):
+        """
+        Add many entries at once. The sorted array is rebuilt with one
+        sort instead of one insertion per entry, which is much faster
+        for large batches such as the initial build.
+
+        Parameters:
+        entries (iterable): (key, name) tuples. Keys that are already
+                            indexed are skipped.
+        """
+        names = self._names
+        exact = self._exact
+        postings = self._postings
+        sizes = self._sizes
+        added = []
+        for key, name in entries:
+            if key in names:
+                continue
+            text = normalize(name)
+            names[key] = text
+            exact.setdefault(text, []).append(key)
+            grams = trigrams(text)
+            sizes[key] = len(grams)
+            for trigram in grams:
+                posting = postings.get(trigram)
+                if posting is None:
+                    posting = postings[trigram] = set()
+                posting.add(key)
+            added.append((text, key))
+        if not added:
+            return
+        merged = sorted([*zip(self._sorted_names, self._sorted_keys),
+                         *added])
+        self._sorted_names = [text for text, _ in merged]
+        self._sorted_keys = [key for _, key in merged]
+
+    def remove(self, key):
+        """
+        Remove an entry. Removing a key that is not indexed has no
+        effect.
+
+        Parameters:
+        key: The key of the entry.
+        """
+        text = self._names.pop(key, None)
+        if text is None:
+            return
+        keys = self._exact[text]
+        keys.remove(key)
+        if not keys:
+            del self._exact[text]
+        index = bisect_left(self._sorted_names, text)
+        while self._sorted_keys[index] != key:
+            index += 1
+        del self._sorted_names[index]
+        del self._sorted_keys[index]
+        del self._sizes[key]
+        for trigram in trigrams(text):
+            posting = self._postings[trigram]
+            posting.discard(key)
+            if not posting:
+                del self._postings[trigram]
+
+    def exact(self, name):
+        """
+        Find the entries whose name equals name, ignoring case.
+
+        Parameters:
+        name (str): The name to look for.
+
+        Returns:
+        list: The matching keys, in key order.
+        """
+        return sorted(self._exact.get(normalize(name), ()))
+
+    def prefix(self, prefix, limit=10):
+        """
+        Find the entries whose name starts with prefix, ignoring case.
+
+        Parameters:
+        prefix (str): The prefix.
+        limit (int): The most keys to return.
+
+        Returns:
+        list: The matching keys, in name order.
+        """
+        text = normalize(prefix)
+        names = self._sorted_names
+        index = bisect_left(names, text)
+        end = min(index + limit, len(names))
+        found = []
+        while index < end and names[index].startswith(text):
+            found.append(self._sorted_keys[index])
+            index += 1
+        return found
+
+    def fuzzy(self, query, limit=10, similarity=0.5, budget=FUZZY_BUDGET):
+        """
+        Find the entries whose name is most similar to query, by the
+        Jaccard similarity of their trigram sets.
+
+        The search starts with a high similarity threshold, which only
+        needs the rarest posting lists, and lowers it towards
+        similarity until limit entries are found. The Jaccard
+        similarity never exceeds the share of the query's trigrams a
+        name contains, so once limit entries reach a threshold no entry
+        below it can rank higher and the result is the same as a search
+        at the lowest threshold.
+
+        Candidates are read from the rarest posting lists until budget
+        postings were read. Below that the result is exact; above it,
+        names that share only very common trigrams with the query, such
+        as a brand, can be missed, which keeps the cost of a query
+        bounded on large catalogs.
+
+        Parameters:
+        query (str): The text to look for.
+        limit (int): The most keys to return.
+        similarity (float): The share of the query's trigrams a name
+                            must contain, between 0 and 1.
+        budget (int): The most postings read to find candidates in
+                      one pass.
+
+        Returns:
+        list: (key, score) tuples, best first; ties in key order.
+        """
+        wanted = trigrams(normalize(query))
+        if not wanted or limit <= 0:
+            return []
+        postings = sorted((self._postings.get(trigram, _EMPTY)
+                           for trigram in wanted), key=len)
+        count = len(postings)
+        thresholds = [threshold for threshold in FUZZY_THRESHOLDS
+                      if threshold > similarity]
+        sizes = self._sizes
+        scanned = 0
+        for threshold in (*thresholds, similarity):
+            min_shared = max(1, math.ceil(count * threshold))
+            short = self._short(postings, count - min_shared + 1, budget)
+            # Passes that read the same lists find the same candidates,
+            # so only the first of them counts.
+            if short != scanned:
+                scanned = short
+                counts = self._count(postings, scanned, min_shared, limit)
+            scored = [(-shared / (count + sizes[key] - shared), key)
+                      for key, shared in counts.items()
+                      if shared >= min_shared]
+            if sum(-score >= threshold for score, _ in scored) >= limit:
+                break
+        return [(key, -score)
+                for score, key in nsmallest(limit, scored)]
+
+    @staticmethod
+    def _short(postings, short, budget):
+        """
+        Count the short posting lists read to find candidates.
+
+        Parameters:
+        postings (list): The posting list of every query trigram,
+                         shortest first.
+        short (int): The most lists to read.
+        budget (int): The most postings to read.
+
+        Returns:
+        int: The number of lists to read, at least one.
+        """
+        read = 0
+        for scanned, posting in enumerate(postings[:short]):
+            if scanned and read + len(posting) > budget:
+                return scanned
+            read += len(posting)
+        return min(short, len(postings))
+
+    def _count(self, postings, scanned, min_shared, limit):
+        """
+        Count the query trigrams shared by the candidates found in the
+        first scanned posting lists that can still rank in the top
+        limit.
+
+        Every entry with enough shared trigrams is in a short list, so
+        the other lists only need intersecting with the candidates.
+        Before each intersection, the candidates whose best possible
+        score falls below the limit-th best score already certain are
+        dropped, which keeps the intersections small without changing
+        the result.
+
+        Parameters:
+        postings (list): The posting list of every query trigram,
+                         shortest first.
+        scanned (int): The number of lists the candidates come from.
+        min_shared (int): The fewest trigrams a result must share.
+        limit (int): The number of results wanted.
+
+        Returns:
+        Counter: The shared trigram count of every remaining candidate.
+        """
+        count = len(postings)
+        sizes = self._sizes
+        counts = Counter()
+        for posting in postings[:scanned]:
+            counts.update(posting)
+        remaining = count - scanned
+        for posting in postings[scanned:]:
+            if len(counts) > limit:
+                counts = self._prune(counts, remaining, min_shared, limit,
+                                     count, sizes)
+            counts.update(counts.keys() & posting)
+            remaining -= 1
+        return counts
+
+    @staticmethod
+    def _prune(counts, remaining, min_shared, limit, count, sizes):
+        """
+        Drop the candidates that can no longer rank in the top limit.
+
+        Parameters:
+        counts (Counter): The trigrams shared so far by each candidate.
+        remaining (int): The posting lists not intersected yet.
+        min_shared (int): The fewest trigrams a result must share.
+        limit (int): The number of results wanted.
+        count (int): The number of query trigrams.
+        sizes (dict): The number of trigrams of every entry.
+
+        Returns:
+        Counter: The candidates that can still rank.
+        """
+        certain = [shared / (count + sizes[key] - shared)
+                   for key, shared in counts.items()
+                   if shared >= min_shared]
+        floor = nlargest(limit, certain)[-1] if len(certain) >= limit else 0
+        kept = Counter()
+        for key, shared in counts.items():
+            size = sizes[key]
+            best = shared + remaining
+            if best > size:
+                best = size
+            if best >= min_shared and best / (count + size - best) >= floor:
+                kept[key] = shared
+        return kept
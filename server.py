@@ -0,0 +1,321 @@
+import asyncio
+import json
+
+import metrics
+import products
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# The longest request line the server reads, in bytes. Longer lines
+# are skipped and answered with an error.
+MAX_LINE = 2 ** 16
+
+
+class RequestError(ValueError):
+    """
+    Raised when a client request is malformed or refers to unknown
+    products.
+    """
+
+
+def _count_field(request, field, default):
+    """
+    Read an optional non-negative integer field of a request.
+
+    Parameters:
+    request (dict): The request.
+    field (str): The field name.
+    default: The value if the field is missing or null.
+
+    Returns:
+    int: The value, or default.
+
+    Raises:
+    RequestError: If the value is not a non-negative integer.
+    """
+    value = request.get(field)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise RequestError(f"Field '{field}' must be a non-negative "
+                           f"integer")
+    return value
+
+
+class OrderServer:
+    """
+    An asyncio server that exposes a store over a local TCP socket.
+
+    The protocol is JSON Lines: every request is one JSON object on one
+    line, and the server answers each one with one JSON object on one
+    line. Requests have an "op" field:
+
+    - {"op": "list", "offset": 0, "limit": 100}: list active products;
+      offset and limit are optional non-negative integers.
+    - {"op": "total"}: the total quantity in the store.
+    - {"op": "quote", "lines": [...]}: price a cart without buying.
+    - {"op": "order", "lines": [...]}: place an order.
+    - {"op": "metrics"}: the metrics in the Prometheus text format.
+
+    Lines are objects like {"product": "MacBook Air M2", "quantity": 2}.
+    Responses are {"ok": true, "result": ...} or
+    {"ok": false, "error": "..."}. Request lines longer than MAX_LINE
+    bytes get an error response too.
+
+    All requests run on the event loop thread, one at a time, so each
+    order is applied atomically with respect to the other clients.
+
+    Attributes:
+    store (Store): The store served to all clients.
+    """
+
+    def __init__(self, store_inst):
+        """
+        Initialize the server for a store.
+
+        Parameters:
+        store_inst (Store): The store to serve.
+        """
+        self.store = store_inst
+        self._server = None
+        self._handlers = {
+            "list": self._list,
+            "total": self._total,
+            "quote": self._quote,
+            "order": self._order,
+            "metrics": self._metrics,
+        }
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        Start listening for clients.
+
+        Parameters:
+        host (str): The address to bind to.
+        port (int): The port to bind to, or 0 for any free port.
+
+        Returns:
+        int: The port the server listens on.
+        """
+        self._server = await asyncio.start_server(self._serve_client,
+                                                  host, port, limit=MAX_LINE)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """
+        Serve clients until the server is closed.
+        """
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """
+        Stop accepting clients and wait for the server to close.
+        """
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve_client(self, reader, writer):
+        """
+        Answer the requests of one client until it disconnects.
+
+        Parameters:
+        reader (StreamReader): The client's input stream.
+        writer (StreamWriter): The client's output stream.
+        """
+        try:
+            while True:
+                try:
+                    line = await self._read_line(reader)
+                except RequestError as e:
+                    response = {"ok": False, "error": str(e)}
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                writer.write(self.handle_line(line))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_line(reader):
+        """
+        Read one request line.
+
+        Parameters:
+        reader (StreamReader): The client's input stream.
+
+        Returns:
+        bytes: The line, or an empty string once the client is done.
+
+        Raises:
+        RequestError: If the line is longer than the reader's limit.
+                      The whole line is skipped, so the next read
+                      starts with the next request.
+        """
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        while True:
+            try:
+                await reader.readexactly(consumed)
+                await reader.readuntil(b"\n")
+                break
+            except asyncio.IncompleteReadError:
+                break
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+        raise RequestError("Request line is too long")
+
+    def handle_line(self, line):
+        """
+        Answer one request line.
+
+        Parameters:
+        line (bytes): The JSON encoded request.
+
+        Returns:
+        bytes: The JSON encoded response, ending with a newline.
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("Request must be a JSON object")
+            handler = self._handlers.get(request.get("op"))
+            if handler is None:
+                raise RequestError(f"Unknown op: {request.get('op')!r}")
+            response = {"ok": True, "result": handler(request)}
+        except (ValueError, TypeError) as e:
+            response = {"ok": False, "error": str(e)}
+        return json.dumps(response).encode() + b"\n"
+
+    def _shopping_list(self, request):
+        """
+        Resolve the lines of a request to a shopping list.
+
+        Parameters:
+        request (dict): The request with a "lines" field.
+
+        Returns:
+        list: A list of (product, quantity) tuples.
+
+        Raises:
+        RequestError: If a line is malformed or names an unknown
+                      product.
+        """
+        shopping_list = []
+        for line in request.get("lines", []):
+            if not isinstance(line, dict):
+                raise RequestError("Order lines must be JSON objects")
+            product = self.store.get_product(line.get("product"))
+            if product is None:
+                raise RequestError(
+                    f"Unknown product: {line.get('product')!r}")
+            quantity = line.get("quantity")
+            if not isinstance(quantity, int):
+                raise RequestError("Quantity must be an integer")
+            shopping_list.append((product, quantity))
+        return shopping_list
+
+    def _list(self, request):
+        """
+        List active products.
+
+        Parameters:
+        request (dict): May hold "offset" and "limit".
+
+        Returns:
+        list: One object per product.
+
+        Raises:
+        RequestError: If offset or limit is not a non-negative integer.
+        """
+        offset = _count_field(request, "offset", 0)
+        limit = _count_field(request, "limit", None)
+        return [{"name": product.name,
+                 "price": product.price,
+                 "quantity": product.get_quantity()
+                 if not isinstance(product, products.NonStockedProduct)
+                 else None,
+                 "promotion": product.promotion.name
+                 if product.promotion else None}
+                for product, _ in self.store.iter_products(offset, limit)]
+
+    def _total(self, request):
+        """
+        Get the total quantity in the store.
+
+        Parameters:
+        request (dict): Unused.
+
+        Returns:
+        int: The total quantity.
+        """
+        return self.store.get_total_quantity()
+
+    def _quote(self, request):
+        """
+        Price a cart without changing stock.
+
+        Parameters:
+        request (dict): The request with a "lines" field.
+
+        Returns:
+        dict: The total and the errors of the lines that failed.
+        """
+        total_price, errors = self.store.quote(self._shopping_list(request))
+        return {"total": total_price, "errors": errors}
+
+    def _metrics(self, request):
+        """
+        Export the metrics.
+
+        Parameters:
+        request (dict): Unused.
+
+        Returns:
+        str: The metrics in the Prometheus text format.
+        """
+        return metrics.to_prometheus()
+
+    def _order(self, request):
+        """
+        Place an order.
+
+        Parameters:
+        request (dict): The request with a "lines" field.
+
+        Returns:
+        dict: The total and the errors of the lines that failed.
+        """
+        total_price, errors = self.store.order_many(
+            [self._shopping_list(request)])[0]
+        return {"total": total_price, "errors": errors}
+
+
+def serve(store_inst, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Serve a store until interrupted.
+
+    Parameters:
+    store_inst (Store): The store to serve.
+    host (str): The address to bind to.
+    port (int): The port to bind to.
+    """
+    async def run():
+        server = OrderServer(store_inst)
+        bound_port = await server.start(host, port)
+        print(f"Serving store on {host}:{bound_port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
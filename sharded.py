@@ -0,0 +1,531 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import zlib
+from contextlib import ExitStack
+
+import money
+import store
+
+
+def shard_for(name, shards):
+    """
+    Get the shard that owns a product. Uses CRC32 rather than hash(),
+    which is salted per process, so every process agrees.
+
+    Parameters:
+    name (str): The name of the product.
+    shards (int): The number of shards.
+
+    Returns:
+    int: The shard index.
+    """
+    return zlib.crc32(name.encode("utf-8")) % shards
+
+
+def _line_errors(line_errors):
+    """
+    Convert LineErrors to plain tuples that can be sent between
+    processes.
+
+    Parameters:
+    line_errors (list): The LineErrors.
+
+    Returns:
+    list: (index, reason, message) tuples.
+    """
+    return [(line_error.index, line_error.reason, line_error.message)
+            for line_error in line_errors]
+
+
+def _resolve(shard, lines):
+    """
+    Look up the products of (name, quantity) lines in a shard.
+
+    Parameters:
+    shard (Store): The store of the shard.
+    lines (list): (name, quantity) tuples.
+
+    Returns:
+    list: (product, quantity) tuples.
+    """
+    return [(shard.get_product(name), quantity) for name, quantity in lines]
+
+
+def _handle_order_many(shard, prepared, orders):
+    """
+    Place the sub-orders of a shard, see Store.order_many_cents.
+
+    Returns:
+    list: (total_cents, errors) per order, errors as from _line_errors.
+    """
+    orders = [_resolve(shard, lines) for lines in orders]
+    return [(total_cents, _line_errors(line_errors))
+            for total_cents, line_errors in shard.order_many_cents(orders)]
+
+
+def _handle_prepare(shard, prepared, request):
+    """
+    First phase of an atomic order: take the stock of the shard's
+    lines, see Store.order_atomic_cents, remembering how to undo it
+    until commit or abort.
+
+    Returns:
+    tuple: (True, total_cents) if the lines were taken, or
+           (False, errors) if any line failed and nothing changed.
+    """
+    txid, lines = request
+    try:
+        total_cents, previous = shard.order_atomic_cents(
+            _resolve(shard, lines))
+    except store.OrderError as e:
+        return False, _line_errors(e.line_errors)
+    if txid is not None:
+        prepared[txid] = previous
+    return True, total_cents
+
+
+def _handle_commit(shard, prepared, txid):
+    """
+    Second phase of an atomic order: forget how to undo it.
+    """
+    prepared.pop(txid, None)
+    return True
+
+
+def _handle_abort(shard, prepared, txid):
+    """
+    Undo a prepared atomic order because another shard rejected it.
+    """
+    shard.restore_stock(prepared.pop(txid, ()))
+    return True
+
+
+def _handle_total(shard, prepared, _):
+    """
+    Get the stocked quantity of the shard.
+    """
+    return shard.get_total_quantity()
+
+
+def _handle_product(shard, prepared, name):
+    """
+    Get a product of the shard, or None.
+    """
+    return shard.get_product(name)
+
+
+def _handle_products(shard, prepared, _):
+    """
+    Get the active products of the shard.
+    """
+    return shard.get_all_products()
+
+
+_HANDLERS = {
+    "order_many": _handle_order_many,
+    "prepare": _handle_prepare,
+    "commit": _handle_commit,
+    "abort": _handle_abort,
+    "total": _handle_total,
+    "product": _handle_product,
+    "products": _handle_products,
+}
+
+
+def _serve_shard(connection, product_list):
+    """
+    Run one shard: a Store of its products that answers commands from
+    the router, one at a time, until told to stop.
+
+    Parameters:
+    connection (Connection): The shard's end of the pipe.
+    product_list (list): The products the shard owns.
+    """
+    shard = store.Store(product_list)
+    prepared = {}
+    while True:
+        command, argument = connection.recv()
+        if command == "stop":
+            connection.close()
+            return
+        try:
+            result = _HANDLERS[command](shard, prepared, argument)
+        except Exception as e:
+            connection.send((False, e))
+        else:
+            connection.send((True, result))
+
+
+class ShardedStore:
+    """
+    A store whose catalog is partitioned across worker processes by
+    product name, so orders use several cores instead of one.
+
+    Each shard is a process running a store.Store of the products it
+    owns, see shard_for. The router in the calling process splits
+    every shopping list into one sub-order per shard, sends all of
+    them before waiting for any reply, and combines the totals in
+    cents.
+
+    Atomic orders that span shards use two-phase commit: every shard
+    first takes the stock of its lines and keeps an undo record; if
+    any shard rejects its lines, the others undo theirs, otherwise all
+    commit. While an order is between the phases the router holds the
+    shards involved, so no other request sees the intermediate state.
+
+    The products passed in are copied into the shards and are not
+    updated afterwards; read them back with get_product. Shopping list
+    lines can name products either by Product or by name.
+    """
+
+    def __init__(self, product_list, shards=None, context=None):
+        """
+        Start the shard processes.
+
+        Parameters:
+        product_list (list): The products of the store.
+        shards (int): The number of shards, os.cpu_count() by default.
+        context (str): The multiprocessing start method, or None for
+                       the platform default.
+
+        Raises:
+        ValueError: If two products share a name.
+        """
+        shards = shards or os.cpu_count() or 1
+        self._shard_of = {}
+        self._position = {}
+        parts = [[] for _ in range(shards)]
+        for product in product_list:
+            if product.name in self._shard_of:
+                raise ValueError(f"A product named '{product.name}' is "
+                                 f"already in the store")
+            index = shard_for(product.name, shards)
+            self._shard_of[product.name] = index
+            self._position[product.name] = len(self._position)
+            parts[index].append(product)
+        mp_context = multiprocessing.get_context(context)
+        self._connections = []
+        self._processes = []
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._txids = itertools.count()
+        for part in parts:
+            parent_end, child_end = mp_context.Pipe()
+            process = mp_context.Process(target=_serve_shard,
+                                         args=(child_end, part),
+                                         daemon=True)
+            process.start()
+            child_end.close()
+            self._connections.append(parent_end)
+            self._processes.append(process)
+
+    @property
+    def shards(self):
+        """
+        Get the number of shards.
+
+        Returns:
+        int: The number of shards.
+        """
+        return len(self._connections)
+
+    def __len__(self):
+        """
+        Get the number of products in the store.
+
+        Returns:
+        int: The number of products.
+        """
+        return len(self._shard_of)
+
+    def __contains__(self, product):
+        """
+        Check whether a product, or a product name, is in the store.
+
+        Returns:
+        bool: True if the store holds it.
+        """
+        return getattr(product, "name", product) in self._shard_of
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stop the shard processes.
+        """
+        for connection, process in zip(self._connections, self._processes):
+            try:
+                connection.send(("stop", None))
+            except OSError:
+                pass
+            connection.close()
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def _shard_index(self, item):
+        """
+        Get the shard owning a shopping list item.
+
+        Parameters:
+        item (Product or str): The product or its name.
+
+        Returns:
+        tuple: (name, shard index).
+
+        Raises:
+        ValueError: If the store has no such product.
+        """
+        name = getattr(item, "name", item)
+        index = self._shard_of.get(name)
+        if index is None:
+            raise ValueError(f"Unknown product: {name!r}")
+        return name, index
+
+    def _hold(self, shard_indexes):
+        """
+        Take the router locks of some shards, in index order so that
+        concurrent callers cannot deadlock.
+
+        Parameters:
+        shard_indexes (iterable): The shard indexes.
+
+        Returns:
+        ExitStack: Releases the locks when exited.
+        """
+        stack = ExitStack()
+        for index in sorted(set(shard_indexes)):
+            stack.enter_context(self._locks[index])
+        return stack
+
+    def _send(self, index, command, argument):
+        """
+        Send a command to a shard. The caller must hold its lock.
+        """
+        self._connections[index].send((command, argument))
+
+    def _receive(self, index):
+        """
+        Wait for the reply of a shard. The caller must hold its lock.
+
+        Returns:
+        The result of the command.
+
+        Raises:
+        Exception: The error the shard raised, if any.
+        """
+        ok, result = self._connections[index].recv()
+        if not ok:
+            raise result
+        return result
+
+    def _receive_all(self, indexes):
+        """
+        Wait for the reply of every shard in indexes, including after
+        one of them failed, so no reply is left in a pipe for the next
+        command to read. The caller must hold their locks.
+
+        Parameters:
+        indexes (iterable): The shards that were sent a command.
+
+        Returns:
+        dict: (ok, result) by shard index, where result is the error
+              the shard raised if ok is False.
+        """
+        return {index: self._connections[index].recv() for index in indexes}
+
+    @staticmethod
+    def _raise_first(replies):
+        """
+        Raise the first error among shard replies, if any.
+
+        Parameters:
+        replies (dict): The replies of _receive_all.
+
+        Returns:
+        dict: The results by shard index, if no shard failed.
+        """
+        for ok, result in replies.values():
+            if not ok:
+                raise result
+        return {index: result for index, (_, result) in replies.items()}
+
+    def _broadcast(self, command, argument=None):
+        """
+        Send a command to every shard and collect the replies.
+
+        Returns:
+        list: The result of every shard, by shard index.
+        """
+        indexes = range(self.shards)
+        with self._hold(indexes):
+            for index in indexes:
+                self._send(index, command, argument)
+            results = self._raise_first(self._receive_all(indexes))
+        return [results[index] for index in indexes]
+
+    def order_many(self, orders):
+        """
+        Place many orders, each shard placing its share of every order
+        in parallel with the others. Per shard the result is the same
+        as Store.order_many; an order that hits a per-order limit only
+        stops at that line within the limited product's shard.
+
+        Parameters:
+        orders (list): A list of shopping lists, each a list of
+                       (product or name, quantity) tuples.
+
+        Returns:
+        list: One (total_price, errors) tuple per order, where errors
+              is a list of error messages in line order.
+
+        Raises:
+        ValueError: If a line names a product the store does not have.
+                    Nothing is ordered then.
+        """
+        split = {}
+        for order_index, shopping_list in enumerate(orders):
+            for line_index, (item, quantity) in enumerate(shopping_list):
+                name, index = self._shard_index(item)
+                sub_orders = split.get(index)
+                if sub_orders is None:
+                    sub_orders = split[index] = ([[] for _ in orders],
+                                                 [[] for _ in orders])
+                sub_orders[0][order_index].append((name, quantity))
+                sub_orders[1][order_index].append(line_index)
+
+        totals = [0] * len(orders)
+        errors = [[] for _ in orders]
+        with self._hold(split):
+            for index, (lines, _) in split.items():
+                self._send(index, "order_many", lines)
+            replies = self._raise_first(self._receive_all(split))
+            for index, (_, line_indexes) in split.items():
+                results = replies[index]
+                for order_index, (total_cents, line_errors) in enumerate(
+                        results):
+                    totals[order_index] += total_cents
+                    for sub_index, _, message in line_errors:
+                        errors[order_index].append(
+                            (line_indexes[order_index][sub_index], message))
+        return [(total_cents / money.CENTS,
+                 [message for _, message in sorted(order_errors)])
+                for total_cents, order_errors in zip(totals, errors)]
+
+    def order(self, shopping_list):
+        """
+        Place one order, skipping lines that cannot be fulfilled, see
+        order_many.
+
+        Parameters:
+        shopping_list (list): (product or name, quantity) tuples.
+
+        Returns:
+        float: The total price of the order.
+        """
+        return self.order_many([shopping_list])[0][0]
+
+    def order_atomic(self, shopping_list):
+        """
+        Place an order that is applied completely or not at all, even
+        when its lines live on several shards, see Store.order_atomic.
+
+        Parameters:
+        shopping_list (list): (product or name, quantity) tuples.
+
+        Returns:
+        float: The total price of the order.
+
+        Raises:
+        OrderError: If any line cannot be ordered. The product of each
+                    LineError is the item given in the shopping list.
+        ValueError: If a line names a product the store does not have.
+        """
+        split = {}
+        for line_index, (item, quantity) in enumerate(shopping_list):
+            name, index = self._shard_index(item)
+            lines, line_indexes = split.setdefault(index, ([], []))
+            lines.append((name, quantity))
+            line_indexes.append(line_index)
+
+        # A single shard needs no second phase.
+        txid = next(self._txids) if len(split) > 1 else None
+        with self._hold(split):
+            for index, (lines, _) in split.items():
+                self._send(index, "prepare", (txid, lines))
+            received = self._receive_all(split)
+            # A shard that raised instead of voting counts as a no: the
+            # shards that prepared are aborted before the error is
+            # raised, so their reservations do not leak.
+            failed = [index for index, (ok, _) in received.items()
+                      if not ok]
+            prepared = [index for index, (ok, reply) in received.items()
+                        if ok and reply[0]]
+            rejected = [index for index, (ok, reply) in received.items()
+                        if ok and not reply[0]]
+            command = "abort" if failed or rejected else "commit"
+            finished = {}
+            if txid is not None:
+                for index in prepared:
+                    self._send(index, command, txid)
+                finished = self._receive_all(prepared)
+            self._raise_first(received)
+            self._raise_first(finished)
+            replies = {index: reply for index, (_, reply) in received.items()}
+        if rejected:
+            line_errors = []
+            for index in rejected:
+                line_indexes = split[index][1]
+                for sub_index, reason, message in replies[index][1]:
+                    line_index = line_indexes[sub_index]
+                    item, quantity = shopping_list[line_index]
+                    line_errors.append(store.LineError(
+                        line_index, item, quantity, reason, message))
+            line_errors.sort(key=lambda line_error: line_error.index)
+            raise store.OrderError(line_errors)
+        return sum(total_cents for _, total_cents in replies.values()) / (
+            money.CENTS)
+
+    def get_total_quantity(self):
+        """
+        Get the total quantity of all stocked products in the store.
+
+        Returns:
+        int: The total quantity of items in the store.
+        """
+        return sum(self._broadcast("total"))
+
+    def get_product(self, name):
+        """
+        Get a copy of a product as its shard currently has it.
+
+        Parameters:
+        name (str): The name of the product.
+
+        Returns:
+        Product: A detached copy of the product, or None.
+        """
+        index = self._shard_of.get(name)
+        if index is None:
+            return None
+        with self._hold([index]):
+            self._send(index, "product", name)
+            return self._receive(index)
+
+    def get_all_products(self):
+        """
+        Get copies of all active products, in the order they were
+        given to the store.
+
+        Returns:
+        list: Detached copies of the active products.
+        """
+        found = [product for shard_products in self._broadcast("products")
+                 for product in shard_products]
+        found.sort(key=lambda product: self._position[product.name])
+        return found
@@ -0,0 +1,469 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from collections.abc import MutableMapping
+from itertools import accumulate, compress
+
+import kinds
+import products
+import promotions
+import store
+
+# A snapshot file starts with MAGIC, the format version, the number of
+# products and the length of the JSON metadata that follows. The
+# metadata holds the promotion table, the inventory totals and the
+# offset and length of every column; columns start on 8-byte
+# boundaries so they can be cast in place.
+MAGIC = b"BBSNAPSH"
+VERSION = 1
+_HEADER = struct.Struct("<8sIQI")
+
+# Column name, array typecode. Each column has one entry per product,
+# except name_offsets, which has one more.
+_COLUMNS = (
+    ("price_cents", "q"),
+    ("quantity", "q"),
+    ("max_per_order", "i"),
+    ("promotion", "i"),
+    ("name_order", "i"),
+    ("name_offsets", "q"),
+    ("active", "B"),
+    ("kind", "B"),
+    ("names", "B"),
+)
+
+
+def save(store_inst, path):
+    """
+    Write a store to a snapshot file. Products are written in the
+    order they were added, active or not.
+
+    The products' fields are read without taking their locks, so save
+    a store while no orders are placed to get a consistent snapshot.
+    The file is replaced atomically, so saving over the snapshot a
+    store was lazily loaded from is safe.
+
+    Parameters:
+    store_inst (Store): The store.
+    path (str): The file to write.
+
+    Raises:
+    ValueError: If a promotion cannot be written, see
+                promotions.to_record.
+    """
+    product_list = store_inst.product_list
+    promotion_ids = {}
+    promotion_records = []
+    for product in product_list:
+        promotion = product.promotion
+        if promotion is not None and id(promotion) not in promotion_ids:
+            promotion_ids[id(promotion)] = len(promotion_records)
+            promotion_records.append(promotions.to_record(promotion))
+    kind_codes = {kind: code for code, kind in enumerate(kinds.KINDS)}
+    names = [product.name.encode("utf-8") for product in product_list]
+    columns = {
+        "price_cents": array("q", [product.price_cents
+                                   for product in product_list]),
+        "quantity": array("q", [product.quantity
+                                for product in product_list]),
+        "max_per_order": array("i", [
+            getattr(product, "max_quantity_per_order", 0)
+            for product in product_list]),
+        "promotion": array("i", [
+            -1 if product.promotion is None
+            else promotion_ids[id(product.promotion)]
+            for product in product_list]),
+        "name_order": array("i", sorted(range(len(names)),
+                                        key=names.__getitem__)),
+        "name_offsets": array("q", accumulate(map(len, names),
+                                              initial=0)),
+        "active": array("B", [product.active for product in product_list]),
+        "kind": array("B", [kind_codes[kinds.product_kind(product)]
+                            for product in product_list]),
+        "names": array("B", b"".join(names)),
+    }
+
+    sections = {}
+    offset = 0
+    for name, _ in _COLUMNS:
+        length = len(columns[name]) * columns[name].itemsize
+        sections[name] = [offset, length]
+        offset += (length + 7) // 8 * 8
+    summary = store_inst.get_inventory_summary()
+    metadata = json.dumps({
+        "byteorder": sys.byteorder,
+        "promotions": promotion_records,
+        "totals": {"total_quantity": summary["total_quantity"],
+                   "stock_value_cents": summary["stock_value_cents"],
+                   "by_type": summary["by_type"]},
+        "sections": sections,
+    }).encode("utf-8")
+    start = (_HEADER.size + len(metadata) + 7) // 8 * 8
+    # Write a new file and rename it over the old one, so a crash never
+    # leaves a torn snapshot, and a store still mapping the old file
+    # keeps reading it instead of a truncated one.
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(descriptor, "wb") as stream:
+            stream.write(_HEADER.pack(MAGIC, VERSION, len(product_list),
+                                      len(metadata)))
+            stream.write(metadata)
+            stream.write(bytes(start - _HEADER.size - len(metadata)))
+            for name, _ in _COLUMNS:
+                data = columns[name].tobytes()
+                stream.write(data)
+                stream.write(bytes((len(data) + 7) // 8 * 8 - len(data)))
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    fsync_directory(directory)
+
+
+def fsync_directory(directory):
+    """
+    Flush a directory entry change, such as a rename, to disk. Does
+    nothing where directories cannot be opened, as on Windows.
+
+    Parameters:
+    directory (str): The directory.
+    """
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+class _Rows:
+    """
+    The columns of a memory-mapped snapshot, and the products built
+    from them so far.
+
+    Attributes:
+    count (int): The number of products in the snapshot.
+    """
+    def __init__(self, path):
+        """
+        Map a snapshot file and check its header.
+
+        Parameters:
+        path (str): The snapshot file.
+
+        Raises:
+        ValueError: If the file is not a snapshot this version can
+                    read.
+        """
+        with open(path, "rb") as stream:
+            self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{path} is not a store snapshot")
+        magic, version, count, meta_length = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a store snapshot")
+        if version != VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        metadata = json.loads(
+            self._map[_HEADER.size:_HEADER.size + meta_length])
+        if metadata["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a "
+                             f"{metadata['byteorder']}-endian machine")
+        self.count = count
+        self.metadata = metadata
+        self.promotions = [promotions.from_record(record)
+                           for record in metadata["promotions"]]
+        start = (_HEADER.size + meta_length + 7) // 8 * 8
+        view = memoryview(self._map)
+        for name, typecode in _COLUMNS:
+            offset, length = metadata["sections"][name]
+            offset += start
+            setattr(self, name, view[offset:offset + length].cast(typecode))
+
+    def name(self, seq):
+        """
+        Get the name of a product.
+
+        Parameters:
+        seq (int): The row of the product.
+
+        Returns:
+        str: The name.
+        """
+        return str(self.names[self.name_offsets[seq]:
+                              self.name_offsets[seq + 1]], "utf-8")
+
+    def find(self, name):
+        """
+        Find the row of a product by name, with a binary search of the
+        name order column.
+
+        Parameters:
+        name (str): The name.
+
+        Returns:
+        int: The row, or None if no product has that name.
+        """
+        key = name.encode("utf-8")
+        order = self.name_order
+        offsets = self.name_offsets
+        names = self.names
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            seq = order[middle]
+            if bytes(names[offsets[seq]:offsets[seq + 1]]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            seq = order[low]
+            if bytes(names[offsets[seq]:offsets[seq + 1]]) == key:
+                return seq
+        return None
+
+    def build(self, seq):
+        """
+        Build the product of a row.
+
+        Parameters:
+        seq (int): The row.
+
+        Returns:
+        Product: The product.
+        """
+        kind = kinds.KINDS[self.kind[seq]]
+        promotion = self.promotion[seq]
+        return products.from_fields(
+            kinds.PRODUCT_CLASSES[kind], self.name(seq),
+            self.price_cents[seq], self.quantity[seq],
+            bool(self.active[seq]),
+            None if promotion < 0 else self.promotions[promotion],
+            self.max_per_order[seq] if kind == kinds.LIMITED else None)
+
+    def tally(self, seq):
+        """
+        Get what the product of a row adds to the inventory totals,
+        like Store._tally.
+
+        Parameters:
+        seq (int): The row.
+
+        Returns:
+        tuple: (type name, stocked quantity, stock value in cents,
+               1 if active else 0).
+        """
+        cls = kinds.PRODUCT_CLASSES[kinds.KINDS[self.kind[seq]]]
+        quantity = (0 if cls is products.NonStockedProduct
+                    else self.quantity[seq])
+        return (cls.__name__, quantity, quantity * self.price_cents[seq],
+                self.active[seq])
+
+
+class _LazyProducts(MutableMapping):
+    """
+    The sequence number to product index of a lazily loaded store.
+    Products of the snapshot are built on first access and then kept;
+    products added later are stored as usual.
+    """
+    def __init__(self, rows):
+        """
+        Initialize the index.
+
+        Parameters:
+        rows (_Rows): The snapshot.
+        """
+        self._rows = rows
+        self._adopt = None
+        self._built = {}
+        self._removed = set()
+        self._added = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, seq):
+        if seq >= self._rows.count:
+            return self._added[seq]
+        product = self._built.get(seq)
+        if product is not None:
+            return product
+        if seq < 0 or seq in self._removed:
+            raise KeyError(seq)
+        with self._lock:
+            product = self._built.get(seq)
+            if product is None:
+                product = self._rows.build(seq)
+                self._adopt(seq, product)
+                self._built[seq] = product
+        return product
+
+    def bind(self, adopt):
+        """
+        Set the callback every product built is passed to, see
+        Store.from_index.
+
+        Parameters:
+        adopt (callable): Takes the sequence number and the product.
+        """
+        self._adopt = adopt
+
+    def __setitem__(self, seq, product):
+        if seq < self._rows.count:
+            raise KeyError(f"Row {seq} belongs to the snapshot")
+        self._added[seq] = product
+
+    def __delitem__(self, seq):
+        if seq >= self._rows.count:
+            del self._added[seq]
+        else:
+            self[seq]
+            del self._built[seq]
+            self._removed.add(seq)
+
+    def __contains__(self, seq):
+        if seq in self._added:
+            return True
+        return (isinstance(seq, int) and 0 <= seq < self._rows.count and
+                seq not in self._removed)
+
+    def __iter__(self):
+        removed = self._removed
+        for seq in range(self._rows.count):
+            if seq not in removed:
+                yield seq
+        yield from list(self._added)
+
+    def __len__(self):
+        return self._rows.count - len(self._removed) + len(self._added)
+
+
+class _LazyNames(MutableMapping):
+    """
+    The name to product index of a lazily loaded store. Names of the
+    snapshot are found with a binary search of the file the first time
+    they are looked up.
+    """
+    def __init__(self, rows, by_seq):
+        """
+        Initialize the index.
+
+        Parameters:
+        rows (_Rows): The snapshot.
+        by_seq (_LazyProducts): The products of the store.
+        """
+        self._rows = rows
+        self._by_seq = by_seq
+        self._known = {}
+
+    def __getitem__(self, name):
+        product = self._known.get(name)
+        if product is not None:
+            return product
+        seq = self._rows.find(name) if isinstance(name, str) else None
+        if seq is None or seq not in self._by_seq:
+            raise KeyError(name)
+        product = self._known[name] = self._by_seq[seq]
+        return product
+
+    def __setitem__(self, name, product):
+        self._known[name] = product
+
+    def __delitem__(self, name):
+        # A name of the snapshot disappears with its row of the product
+        # index, which Store.remove_product deletes first.
+        self._known.pop(name, None)
+
+    def __iter__(self):
+        for product in self._by_seq.values():
+            yield product.name
+
+    def __len__(self):
+        return len(self._by_seq)
+
+
+class _LazyTallies(dict):
+    """
+    The per product inventory tallies of a lazily loaded store. Rows
+    of the snapshot that did not change since loading are tallied from
+    the file when asked for.
+    """
+    def __init__(self, rows):
+        """
+        Initialize the tallies.
+
+        Parameters:
+        rows (_Rows): The snapshot.
+        """
+        super().__init__()
+        self._rows = rows
+        self._dropped = set()
+
+    def get(self, seq, default=None):
+        tally = super().get(seq)
+        if tally is not None:
+            return tally
+        if 0 <= seq < self._rows.count and seq not in self._dropped:
+            return self._rows.tally(seq)
+        return default
+
+    def pop(self, seq, default=None):
+        tally = self.get(seq, default)
+        super().pop(seq, None)
+        if seq < self._rows.count:
+            self._dropped.add(seq)
+        return tally
+
+
+def load(path, lazy=True, store_class=None):
+    """
+    Load a store from a snapshot file.
+
+    A lazy load maps the file into memory and reads only the header,
+    the promotion table and the active column, so it takes about the
+    same time for any size of catalog. Products are built from the
+    mapped columns the first time they are looked up, listed or
+    ordered, and name lookups binary search the file. The file must
+    not be modified in place while the store uses it; save replaces
+    it with a new file, which is safe.
+
+    Parameters:
+    path (str): The snapshot file.
+    lazy (bool): Build products on first use instead of all at once.
+    store_class (type): The class of the store; store.Store if None.
+                        Subclasses that keep their own copy of every
+                        product, such as columnar.ColumnarStore, need
+                        lazy=False.
+
+    Returns:
+    Store: The store.
+
+    Raises:
+    ValueError: If the file is not a snapshot this version can read,
+                or a lazy load was asked for a store class that
+                overrides add_products.
+    OSError: If the file cannot be read.
+    """
+    store_class = store_class or store.Store
+    rows = _Rows(path)
+    if not lazy:
+        return store_class([rows.build(seq) for seq in range(rows.count)])
+    by_seq = _LazyProducts(rows)
+    return store_class.from_index(
+        by_seq, _LazyNames(rows, by_seq), _LazyTallies(rows),
+        list(compress(range(rows.count), rows.active)),
+        rows.metadata["totals"])
@@ -0,0 +1,467 @@
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import events
+import kinds
+import money
+import products
+import promotions
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS promotions (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    percent REAL,
+    rule TEXT
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    price_cents INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    active INTEGER NOT NULL,
+    max_per_order INTEGER,
+    promotion_id INTEGER REFERENCES promotions(id)
+);
+CREATE INDEX IF NOT EXISTS products_active ON products(active, id);
+"""
+
+
+class ConnectionPool:
+    """
+    A fixed-size pool of SQLite connections that threads borrow one at
+    a time.
+    """
+
+    def __init__(self, database, size):
+        """
+        Open the connections of the pool.
+
+        Parameters:
+        database (str): The database file, or a SQLite URI.
+        size (int): The number of connections.
+        """
+        self._connections = queue.Queue()
+        for _ in range(size):
+            connection = sqlite3.connect(database, uri=True,
+                                         check_same_thread=False,
+                                         isolation_level=None,
+                                         timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._connections.put(connection)
+        self._size = size
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block.
+
+        Yields:
+        sqlite3.Connection: The borrowed connection.
+        """
+        connection = self._connections.get()
+        try:
+            yield connection
+        finally:
+            self._connections.put(connection)
+
+    def close(self):
+        """
+        Close every connection of the pool.
+        """
+        for _ in range(self._size):
+            self._connections.get().close()
+
+
+def _promotion_row(promotion):
+    """
+    Convert a promotion to its (kind, name, percent, rule) row, the
+    columns of its promotion record, see promotions.to_record.
+
+    Parameters:
+    promotion (Promotion): The promotion to convert.
+
+    Returns:
+    tuple: The row values.
+
+    Raises:
+    ValueError: If the promotion type cannot be stored.
+    """
+    record = promotions.to_record(promotion)
+    rule = record.get("rule")
+    return (record["kind"], record["name"], record.get("percent"),
+            None if rule is None else json.dumps(rule))
+
+
+def _promotion_from_row(kind, name, percent, rule):
+    """
+    Build a promotion from its row, see promotions.from_record. The
+    promotion is interned, so it is the same object as an equal
+    promotion set on a product.
+
+    Parameters:
+    kind (str): The promotion kind.
+    name (str): The promotion name.
+    percent (float): The discount of a percent promotion.
+    rule (str): The JSON encoded rule of a rule promotion.
+
+    Returns:
+    Promotion: The promotion.
+    """
+    return promotions.from_record({"kind": kind, "name": name,
+                                   "percent": percent, "rule": rule})
+
+
+def _rejection(reason, message):
+    """
+    Make the ValueError for an order line that cannot be bought.
+
+    Parameters:
+    reason (str): The reason, one of the reasons in products.
+    message (str): The error message.
+
+    Returns:
+    ValueError: The error, with the reason as its reason attribute.
+    """
+    error = ValueError(message)
+    error.reason = reason
+    return error
+
+
+class SQLiteStore:
+    """
+    A store that keeps products, stock and promotions in SQLite, with
+    the same public API as store.Store.
+
+    Products returned by get_all_products and get_product are detached
+    copies of the rows: buy products through order(), not through
+    Product.buy, so the database stays the source of truth.
+
+    Orders run as one transaction. Each line decrements stock with a
+    conditional UPDATE that only matches while the product is active
+    and has enough stock, so concurrent orders from several threads
+    cannot oversell.
+    """
+
+    def __init__(self, product_list, database=":memory:", pool_size=4):
+        """
+        Initialize the store, creating the tables if needed.
+
+        Parameters:
+        product_list (list): The products to add to the store.
+        database (str): The database file. ":memory:" uses a private
+                        in-memory database, which only one connection
+                        can see, so the pool size is 1 then.
+        pool_size (int): The number of pooled connections.
+        """
+        if database == ":memory:":
+            pool_size = 1
+        self._pool = ConnectionPool(database, pool_size)
+        self._promotion_ids = {}
+        self._promotions = {}
+        self._promotion_lock = threading.Lock()
+        with self._pool.connection() as connection:
+            connection.executescript(_SCHEMA)
+            for row in connection.execute(
+                    "SELECT id, kind, name, percent, rule "
+                    "FROM promotions ORDER BY id"):
+                promotion = _promotion_from_row(*row[1:])
+                self._promotions[row[0]] = promotion
+                # Products saved again with a loaded promotion reuse
+                # its row instead of inserting a copy.
+                self._promotion_ids.setdefault(id(promotion), row[0])
+        self.add_products(product_list)
+
+    def close(self):
+        """
+        Close the database connections.
+        """
+        self._pool.close()
+
+    def _promotion_id(self, connection, promotion, inserted):
+        """
+        Get the row id of a promotion, inserting it on first use. Rows
+        inserted here only become known to the store once the caller
+        committed them, see _publish_promotions.
+
+        Parameters:
+        connection (sqlite3.Connection): The connection to use, inside
+                                         a transaction.
+        promotion (Promotion): The promotion, or None.
+        inserted (dict): Promotion object ids to (row id, promotion)
+                         for the rows inserted in this transaction;
+                         updated here.
+
+        Returns:
+        int: The row id, or None if there is no promotion.
+        """
+        if promotion is None:
+            return None
+        with self._promotion_lock:
+            promotion_id = self._promotion_ids.get(id(promotion))
+        if promotion_id is None:
+            entry = inserted.get(id(promotion))
+            if entry is not None:
+                return entry[0]
+            cursor = connection.execute(
+                "INSERT INTO promotions (kind, name, percent, rule) "
+                "VALUES (?, ?, ?, ?)", _promotion_row(promotion))
+            promotion_id = cursor.lastrowid
+            inserted[id(promotion)] = promotion_id, promotion
+        return promotion_id
+
+    def _publish_promotions(self, inserted):
+        """
+        Record the promotion rows of a committed transaction.
+
+        Parameters:
+        inserted (dict): The rows collected by _promotion_id.
+        """
+        with self._promotion_lock:
+            for key, (promotion_id, promotion) in inserted.items():
+                self._promotions[promotion_id] = promotion
+                self._promotion_ids.setdefault(key, promotion_id)
+
+    def add_products(self, product_list):
+        """
+        Add many products with a single bulk insert.
+
+        Parameters:
+        product_list (list): The products to add.
+        """
+        inserted = {}
+        with self._pool.connection() as connection:
+            connection.execute("BEGIN")
+            try:
+                rows = [(product.name, kinds.product_kind(product),
+                         product.price_cents,
+                         0 if isinstance(product,
+                                         products.NonStockedProduct)
+                         else product.quantity,
+                         int(product.is_active()),
+                         getattr(product, "max_quantity_per_order", None),
+                         self._promotion_id(connection, product.promotion,
+                                            inserted))
+                        for product in product_list]
+                connection.executemany(
+                    "INSERT INTO products (name, kind, price_cents, quantity, "
+                    "active, max_per_order, promotion_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        self._publish_promotions(inserted)
+
+    def add_product(self, product):
+        """
+        Add a product to the store.
+
+        Parameters:
+        product (Product): The product to add to the store.
+        """
+        self.add_products([product])
+
+    def remove_product(self, product):
+        """
+        Remove a product from the store.
+
+        Parameters:
+        product (Product): The product to remove from the store.
+        """
+        with self._pool.connection() as connection:
+            connection.execute("DELETE FROM products WHERE name = ?",
+                               (product.name,))
+
+    def _product_from_row(self, row, connection=None):
+        """
+        Build a detached product from a products row. Rows were
+        validated when the products were added, so the product is
+        built without checking them again, see products.from_fields.
+
+        Parameters:
+        row (tuple): name, kind, price_cents, quantity, active,
+                     max_per_order and promotion_id.
+        connection (sqlite3.Connection): The connection the caller
+                                         holds, if any, see _promotion.
+
+        Returns:
+        Product: The product.
+        """
+        name, kind, cents, quantity, active, max_per_order, promo_id = row
+        return products.from_fields(
+            kinds.PRODUCT_CLASSES[kind], name, cents, quantity, bool(active),
+            None if promo_id is None else self._promotion(promo_id,
+                                                          connection),
+            max_per_order if kind == kinds.LIMITED else None)
+
+    def _promotion(self, promotion_id, connection=None):
+        """
+        Get a promotion by its row id. A row committed by another
+        thread that has not recorded it yet is read from the database.
+
+        Parameters:
+        promotion_id (int): The row id.
+        connection (sqlite3.Connection): The connection to read with,
+                                         or None to borrow one.
+
+        Returns:
+        Promotion: The promotion.
+        """
+        promotion = self._promotions.get(promotion_id)
+        if promotion is None:
+            query = ("SELECT kind, name, percent, rule FROM promotions "
+                     "WHERE id = ?")
+            if connection is None:
+                with self._pool.connection() as borrowed:
+                    row = borrowed.execute(query,
+                                           (promotion_id,)).fetchone()
+            else:
+                row = connection.execute(query, (promotion_id,)).fetchone()
+            promotion = _promotion_from_row(*row)
+            with self._promotion_lock:
+                promotion = self._promotions.setdefault(promotion_id,
+                                                        promotion)
+        return promotion
+
+    def get_product(self, name):
+        """
+        Get a product by its name.
+
+        Parameters:
+        name (str): The name of the product.
+
+        Returns:
+        Product: A detached copy of the product, or None.
+        """
+        with self._pool.connection() as connection:
+            row = connection.execute(
+                "SELECT name, kind, price_cents, quantity, active, "
+                "max_per_order, promotion_id FROM products "
+                "WHERE name = ?", (name,)).fetchone()
+        return None if row is None else self._product_from_row(row)
+
+    def get_total_quantity(self):
+        """
+        Get the total quantity of all stocked products in the store.
+
+        Returns:
+        int: The total quantity of items in the store.
+        """
+        with self._pool.connection() as connection:
+            (total,) = connection.execute(
+                "SELECT COALESCE(SUM(quantity), 0) FROM products "
+                "WHERE kind != ?", (kinds.NON_STOCKED,)).fetchone()
+        return total
+
+    def get_all_products(self):
+        """
+        Get a list of all active products in the store.
+
+        Returns:
+        list: Detached copies of the active products, in the order
+              they were added.
+        """
+        with self._pool.connection() as connection:
+            rows = connection.execute(
+                "SELECT name, kind, price_cents, quantity, active, "
+                "max_per_order, promotion_id FROM products "
+                "WHERE active = 1 ORDER BY id").fetchall()
+        return [self._product_from_row(row) for row in rows]
+
+    def order(self, shopping_list):
+        """
+        Place an order for a list of products and return the total
+        price. Lines that cannot be fulfilled are reported and skipped,
+        like in Store.order.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples. The
+                              products are matched by name.
+
+        Returns:
+        float: The total price of the order.
+
+        Raises:
+        OrderLimitError: If a line exceeds the per-order limit of a
+                         limited product. Nothing is ordered then.
+        """
+        total_cents = 0
+        with self._pool.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for product, quantity in shopping_list:
+                    try:
+                        total_cents += self._order_line(connection,
+                                                        product.name,
+                                                        quantity)
+                    except ValueError as e:
+                        if events.ENABLED:
+                            events.emit(events.REJECTED, product.name,
+                                        quantity, reason=e.reason,
+                                        message=str(e))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return total_cents / money.CENTS
+
+    def _order_line(self, connection, name, quantity):
+        """
+        Take one order line out of stock inside the open transaction.
+
+        Parameters:
+        connection (sqlite3.Connection): The connection in use.
+        name (str): The product name.
+        quantity (int): The quantity to buy.
+
+        Returns:
+        int: The price of the line in cents.
+
+        Raises:
+        ValueError: If the product is unknown or inactive, the
+                    quantity is not positive or the stock is too low.
+        OrderLimitError: If the per-order limit is exceeded.
+        """
+        row = connection.execute(
+            "SELECT name, kind, price_cents, quantity, active, "
+            "max_per_order, promotion_id FROM products WHERE name = ?",
+            (name,)).fetchone()
+        if row is None or not row[4]:
+            raise _rejection(products.INACTIVE,
+                             f"Product '{name}' is not active and "
+                             f"cannot be ordered.")
+        kind, available, max_per_order = row[1], row[3], row[5]
+        if kind != kinds.NON_STOCKED and quantity > available:
+            raise _rejection(products.INSUFFICIENT_STOCK,
+                             f"Not enough quantity available for "
+                             f"'{name}'. Available: {available}, "
+                             f"Requested: {quantity}")
+        if max_per_order is not None and quantity > max_per_order:
+            raise products.OrderLimitError(
+                f"Cannot buy more than {max_per_order} of this item in "
+                f"one order")
+        if quantity <= 0:
+            raise _rejection(products.INVALID_QUANTITY,
+                             "Quantity to buy must be a positive number")
+        if kind != kinds.NON_STOCKED:
+            cursor = connection.execute(
+                "UPDATE products SET quantity = quantity - ?1, "
+                "active = CASE WHEN quantity = ?1 THEN 0 ELSE active END "
+                "WHERE name = ?2 AND active = 1 AND quantity >= ?1",
+                (quantity, name))
+            if cursor.rowcount != 1:
+                raise _rejection(products.INSUFFICIENT_STOCK,
+                                 f"Not enough quantity available for "
+                                 f"'{name}'")
+        product = self._product_from_row(row, connection)
+        if product.promotion:
+            return product.promotion.apply_promotion_cents(product,
+                                                           quantity)
+        return product.price_cents * quantity
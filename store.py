@@ -1,4 +1,136 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from contextlib import ExitStack
+from heapq import heapify, heappop, heappush
+from itertools import count
+from time import monotonic, perf_counter
+
+import events
+import metrics
+import money
 import products
+import search
+
+# The number of products iter_products takes from the index at a time.
+LIST_CHUNK = 256
+
+# The per product type totals of get_inventory_summary.
+_TYPE_FIELDS = ("products", "active", "quantity", "stock_value_cents")
+
+# The hold expiry heap is rebuilt without released holds once it has
+# more than this many of them, and they make up over half of it.
+_HOLD_COMPACT_MIN = 1024
+
+
+class LineError:
+    """
+    Describes why one line of a shopping list could not be ordered.
+
+    Attributes:
+    index (int): The position of the line in the shopping list.
+    product (Product): The product of the line, as given in the
+                       shopping list.
+    quantity (int): The requested quantity.
+    reason (str): A machine-readable reason, one of the reason
+                  constants in the products module.
+    message (str): A human-readable description.
+    """
+    def __init__(self, index, product, quantity, reason, message):
+        """
+        Initialize the line error.
+
+        Parameters:
+        index (int): The position of the line in the shopping list.
+        product (Product): The product of the line.
+        quantity (int): The requested quantity.
+        reason (str): A machine-readable reason.
+        message (str): A human-readable description.
+        """
+        self.index = index
+        self.product = product
+        self.quantity = quantity
+        self.reason = reason
+        self.message = message
+
+    def __repr__(self):
+        name = getattr(self.product, "name", self.product)
+        return (f"LineError(index={self.index}, "
+                f"product={name!r}, reason={self.reason!r})")
+
+
+class Hold:
+    """
+    Stock set aside for a shopper's cart by Store.hold.
+
+    Attributes:
+    product (Product): The product held.
+    quantity (int): The number of units held.
+    expires_at (float): The time.monotonic() at which the hold expires.
+    active (bool): False once the hold was released, expired or
+                   ordered.
+    """
+    __slots__ = ("product", "quantity", "expires_at", "active")
+
+    def __init__(self, product, quantity, expires_at):
+        """
+        Initialize an active hold.
+
+        Parameters:
+        product (Product): The product held.
+        quantity (int): The number of units held.
+        expires_at (float): The time.monotonic() at which the hold
+                            expires.
+        """
+        self.product = product
+        self.quantity = quantity
+        self.expires_at = expires_at
+        self.active = True
+
+    def __repr__(self):
+        return (f"Hold(product={self.product.name!r}, "
+                f"quantity={self.quantity}, active={self.active})")
+
+
+class OrderError(ValueError):
+    """
+    Raised when an atomic order is rejected. No stock was changed.
+
+    Attributes:
+    line_errors (list): The LineError of every line that failed.
+    """
+    def __init__(self, line_errors):
+        """
+        Initialize the error with the failed lines.
+
+        Parameters:
+        line_errors (list): The LineError of every line that failed.
+        """
+        super().__init__("; ".join(error.message
+                                   for error in line_errors))
+        self.line_errors = line_errors
+
+
+class ProductList(list):
+    """
+    A read-only list of the products of a store, as returned by
+    Store.product_list. It is a copy taken when it was requested, so
+    changing it could never change the store; every method that would
+    change it raises TypeError instead of silently doing nothing.
+    """
+    def _read_only(self, *args, **kwargs):
+        """
+        Refuse a change to the list.
+
+        Raises:
+        TypeError: Always.
+        """
+        raise TypeError("Store.product_list is read-only, use "
+                        "add_product and remove_product instead")
+
+    append = extend = insert = remove = pop = clear = _read_only
+    sort = reverse = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
 
 
 class Store:
@@ -6,27 +138,277 @@ class Store:
     A class to represent a store that contains a list of products
     and allows various operations on them.
 
+    Products are indexed by insertion sequence number and by name, so
+    lookups are O(1). Names are unique within a store: adding a
+    product whose name is taken raises ValueError, so get_product
+    always finds exactly one product. Active products can also be
+    found by case-insensitive name, prefix or similar name through a
+    search index that is built on the first search. The store
+    registers itself as a listener on each product to keep a sorted
+    list of active products up to date when a product is activated,
+    deactivated or sold out; removing a product from it is a binary
+    search and a shift of the later entries, O(n) in the worst case.
+
+    Orders are safe to place from several threads: order() holds the
+    lock of every product in the shopping list while it checks and
+    updates stock, so orders for unrelated products never contend.
+
     Attributes:
-    product_list (list): A list of products available in the store.
+    product_list (ProductList): A read-only copy of the products
+                                available in the store.
     """
-    def __init__(self, product_list):
+    def __init__(self, product_list, quote_cache_size=65536):
         """
         Initialize the Store with a list of products.
 
         Parameters:
         product_list (list): The initial list of products available
                              in the store.
+        quote_cache_size (int): The number of line prices quote()
+                                keeps in its LRU cache.
         """
-        self.product_list = product_list
+        self._products = {}
+        self._seq_by_id = {}
+        self._by_name = {}
+        self._active_seqs = []
+        self._next_seq = 0
+        self._index_lock = threading.Lock()
+        self._listeners = []
+        self._search_index = None
+        self._search_pending = None
+        self._search_lock = threading.Lock()
+        self._shown = {}
+        self._tallies = {}
+        self._total_quantity = 0
+        self._stock_value_cents = 0
+        self._type_totals = {}
+        self._quote_cache = OrderedDict()
+        self._quote_cache_size = quote_cache_size
+        self._quote_keys = {}
+        self._quote_state = {}
+        self._quote_lock = threading.Lock()
+        self._quote_hits = 0
+        self._quote_misses = 0
+        self._holds = []
+        self._hold_ids = count()
+        self._hold_lock = threading.Lock()
+        self._hold_count = 0
+        self._released_holds = 0
+        self.add_products(product_list)
+
+    @property
+    def product_list(self):
+        """
+        Get all products in the store, active or not, in the order
+        they were added. Add and remove products with add_product and
+        remove_product; the list returned cannot be changed.
+
+        Returns:
+        ProductList: A read-only list of all products in the store.
+        """
+        return ProductList(self._products.values())
+
+    def __len__(self):
+        """
+        Get the number of products in the store.
+
+        Returns:
+        int: The number of products, active or not.
+        """
+        return len(self._products)
+
+    def __contains__(self, product):
+        """
+        Check if a product is in the store.
+
+        Parameters:
+        product (Product): The product to look for.
+
+        Returns:
+        bool: True if the product is in the store, False otherwise.
+        """
+        return id(product) in self._seq_by_id
+
+    def save(self, path):
+        """
+        Save the store to a binary snapshot file, see snapshot.save.
+
+        Parameters:
+        path (str): The file to write.
+        """
+        # snapshot imports this module for Store, so it is imported
+        # here rather than at the top, where it would make a cycle.
+        import snapshot
+        snapshot.save(self, path)
+
+    @classmethod
+    def load(cls, path, lazy=True):
+        """
+        Load a store saved with save(). A lazy load memory-maps the
+        file and builds products only when they are first used, so
+        startup takes about the same time for any size of catalog, see
+        snapshot.load.
+
+        Parameters:
+        path (str): The snapshot file.
+        lazy (bool): Build products on first use instead of all at
+                     once.
+
+        Returns:
+        Store: The store.
+
+        Raises:
+        ValueError: If the file is not a store snapshot, or lazy is
+                    True for a class that cannot be loaded lazily, see
+                    from_index.
+        """
+        import snapshot
+        return snapshot.load(path, lazy, cls)
+
+    @classmethod
+    def from_index(cls, by_seq, by_name, tallies, active_seqs, totals):
+        """
+        Create a store over product indexes built elsewhere, such as
+        the lazily built indexes of a memory-mapped snapshot, see
+        snapshot.load. The indexes must agree with each other and with
+        totals; from then on the store keeps them up to date as usual.
+
+        Parameters:
+        by_seq (MutableMapping): Sequence numbers 0 to len - 1 to
+                                 products. If it has a bind method, it
+                                 is passed a callback that must be
+                                 called with (seq, product) for every
+                                 product it creates later, before the
+                                 product is handed out.
+        by_name (MutableMapping): Names to the same products.
+        tallies (dict): Sequence numbers to _tally tuples; get and pop
+                        may compute them on demand.
+        active_seqs (list): The sorted sequence numbers of the active
+                            products.
+        totals (dict): total_quantity, stock_value_cents and by_type,
+                       as returned by get_inventory_summary.
+
+        Returns:
+        Store: The store.
+
+        Raises:
+        ValueError: If the class overrides add_products, which means it
+                    keeps its own copy of every product and cannot work
+                    over indexes it did not fill.
+        """
+        if cls.add_products is not Store.add_products:
+            raise ValueError(f"{cls.__name__} cannot be built over an "
+                             f"external index")
+        store_inst = cls([])
+        store_inst._products = by_seq
+        store_inst._by_name = by_name
+        store_inst._tallies = tallies
+        store_inst._active_seqs = active_seqs
+        store_inst._next_seq = len(by_seq)
+        store_inst._total_quantity = totals["total_quantity"]
+        store_inst._stock_value_cents = totals["stock_value_cents"]
+        store_inst._type_totals = {
+            name: [fields[field] for field in _TYPE_FIELDS]
+            for name, fields in totals["by_type"].items()}
+        bind = getattr(by_seq, "bind", None)
+        if bind is not None:
+            bind(store_inst._adopt)
+        return store_inst
+
+    def _adopt(self, seq, product):
+        """
+        Register a product that an external index created under a
+        sequence number it already holds, see from_index.
+
+        Parameters:
+        seq (int): The sequence number of the product.
+        product (Product): The product.
+        """
+        self._seq_by_id[id(product)] = seq
+        product.add_listener(self)
 
     def add_product(self, product):
         """
-        Add a product to the store.
+        Add a product to the store. Adding a product that is already
+        in the store has no effect.
 
         Parameters:
         product (Product): The product to add to the store.
+
+        Raises:
+        ValueError: If another product with the same name is already
+                    in the store.
+        """
+        self.add_products((product,))
+
+    def add_products(self, product_iter):
+        """
+        Add many products to the store, like add_product does for
+        each, but taking the index lock once and adding up the
+        inventory totals once, which makes building a large store much
+        faster.
+
+        Parameters:
+        product_iter (iterable): The products to add.
+
+        Raises:
+        ValueError: If another product with the same name is already
+                    in the store. The products before it stay added.
+        """
+        by_seq = self._products
+        seq_by_id = self._seq_by_id
+        by_name = self._by_name
+        active_seqs = self._active_seqs
+        tallies = self._tallies
+        non_stocked = products.NonStockedProduct
+        added = []
+        with self._index_lock:
+            try:
+                for product in product_iter:
+                    if id(product) in seq_by_id:
+                        continue
+                    if product.name in by_name:
+                        raise ValueError(
+                            f"A product named '{product.name}' is already "
+                            f"in the store")
+                    seq = self._next_seq
+                    self._next_seq = seq + 1
+                    by_seq[seq] = product
+                    seq_by_id[id(product)] = seq
+                    by_name[product.name] = product
+                    if product.active:
+                        active_seqs.append(seq)
+                        self._update_search(seq, product.name)
+                    # Inlined _tally.
+                    quantity = (0 if isinstance(product, non_stocked)
+                                else product.quantity)
+                    tallies[seq] = entry = (
+                        type(product).__name__, quantity,
+                        quantity * product.price_cents, int(product.active))
+                    added.append(entry)
+                    product.add_listener(self)
+            finally:
+                self._add_tallies(added)
+
+    def _add_tallies(self, added):
+        """
+        Add the tallies of new products to the inventory totals. The
+        caller must hold the index lock.
+
+        Parameters:
+        added (list): The _tally of every new product.
         """
-        self.product_list.append(product)
+        type_totals = self._type_totals
+        for name, quantity, value, active in added:
+            self._total_quantity += quantity
+            self._stock_value_cents += value
+            totals = type_totals.get(name)
+            if totals is None:
+                totals = type_totals[name] = [0, 0, 0, 0]
+            totals[0] += 1
+            totals[1] += active
+            totals[2] += quantity
+            totals[3] += value
 
     def remove_product(self, product):
         """
@@ -35,8 +417,239 @@ class Store:
         Parameters:
         product (Product): The product to remove from the store.
         """
-        if product in self.product_list:
-            self.product_list.remove(product)
+        with self._index_lock:
+            seq = self._seq_by_id.pop(id(product), None)
+            if seq is None:
+                return
+            del self._products[seq]
+            del self._by_name[product.name]
+            self._discard_active(seq)
+            self._update_search(seq, None)
+            self._shown.pop(seq, None)
+            self._retally(seq, None)
+            product.remove_listener(self)
+        with self._quote_lock:
+            self._quote_state.pop(id(product), None)
+            for cache_key in self._quote_keys.pop(id(product), ()):
+                self._quote_cache.pop(cache_key, None)
+
+    def get_product(self, name):
+        """
+        Get a product by its name.
+
+        Parameters:
+        name (str): The name of the product.
+
+        Returns:
+        Product: The product with that name, or None if there is none.
+        """
+        return self._by_name.get(name)
+
+    def find(self, name):
+        """
+        Find an active product by its name, ignoring case and extra
+        whitespace.
+
+        Parameters:
+        name (str): The name of the product.
+
+        Returns:
+        Product: The first product added with that name, or None if
+                 there is none.
+        """
+        index = self._search()
+        with self._index_lock:
+            seqs = index.exact(name)
+            return self._products[seqs[0]] if seqs else None
+
+    def find_prefix(self, prefix, limit=10):
+        """
+        Find the active products whose name starts with prefix,
+        ignoring case.
+
+        Parameters:
+        prefix (str): The start of the name.
+        limit (int): The most products to return.
+
+        Returns:
+        list: The matching products, in name order.
+        """
+        index = self._search()
+        with self._index_lock:
+            return [self._products[seq]
+                    for seq in index.prefix(prefix, limit)]
+
+    def search(self, query, limit=10):
+        """
+        Search the active products by name. Products whose name starts
+        with the query come first, in name order, followed by products
+        with a similar name, most similar first, so typos and partial
+        words still find something.
+
+        Parameters:
+        query (str): The text to look for.
+        limit (int): The most products to return.
+
+        Returns:
+        list: The matching products.
+        """
+        index = self._search()
+        with self._index_lock:
+            seqs = index.prefix(query, limit)
+            if len(seqs) < limit:
+                seen = set(seqs)
+                for seq, _ in index.fuzzy(query, limit):
+                    if seq not in seen and len(seqs) < limit:
+                        seqs.append(seq)
+            return [self._products[seq] for seq in seqs]
+
+    def _search(self):
+        """
+        Get the search index of the active products, building it on
+        first use. From then on add_product, remove_product and
+        product_changed keep it up to date. The caller must not hold
+        the index lock, and must hold it while reading the index.
+
+        The index is built without the index lock, so orders and
+        other changes go on meanwhile: the lock is only taken to copy
+        the active sequence numbers and, once the index is built, to
+        apply the changes made in between and install it.
+
+        Returns:
+        SearchIndex: The index, keyed by sequence number.
+        """
+        index = self._search_index
+        if index is not None:
+            return index
+        with self._search_lock:
+            if self._search_index is not None:
+                return self._search_index
+            by_seq = self._products
+            with self._index_lock:
+                active_seqs = list(self._active_seqs)
+                self._search_pending = {}
+            try:
+                # A product removed meanwhile is skipped or indexed
+                # here, and removed again with the pending changes.
+                entries = []
+                for seq in active_seqs:
+                    product = by_seq.get(seq)
+                    if product is not None:
+                        entries.append((seq, product.name))
+                index = search.SearchIndex()
+                index.add_many(entries)
+            except BaseException:
+                with self._index_lock:
+                    self._search_pending = None
+                raise
+            with self._index_lock:
+                for seq, name in self._search_pending.items():
+                    if name is None:
+                        index.remove(seq)
+                    else:
+                        index.add(seq, name)
+                self._search_pending = None
+                self._search_index = index
+            return index
+
+    def _update_search(self, seq, name):
+        """
+        Add a product to the search index or remove it, or record the
+        change if the index is being built, see _search. The caller
+        must hold the index lock.
+
+        Parameters:
+        seq (int): The sequence number of the product.
+        name (str): The name of the product, or None to remove it.
+        """
+        index = self._search_index
+        if index is not None:
+            if name is None:
+                index.remove(seq)
+            else:
+                index.add(seq, name)
+        elif self._search_pending is not None:
+            self._search_pending[seq] = name
+
+    def add_listener(self, listener):
+        """
+        Register a listener that is notified whenever a product in the
+        store changes, after the store updated its own indexes.
+
+        Parameters:
+        listener: An object with a product_changed(product) method.
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Unregister a listener added with add_listener.
+
+        Parameters:
+        listener: The listener to remove.
+        """
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def product_changed(self, product):
+        """
+        Update the active products index after a product changed, and
+        pass the change on to the store's listeners. Called by the
+        product itself, see Product.add_listener.
+
+        Parameters:
+        product (Product): The product that changed.
+        """
+        with self._index_lock:
+            seq = self._seq_by_id.get(id(product))
+            if seq is None:
+                return
+            if product.is_active():
+                index = bisect_left(self._active_seqs, seq)
+                if (index == len(self._active_seqs) or
+                        self._active_seqs[index] != seq):
+                    insort(self._active_seqs, seq)
+                self._update_search(seq, product.name)
+            else:
+                self._discard_active(seq)
+                self._update_search(seq, None)
+            self._retally(seq, product)
+        self._invalidate_quotes(product)
+        for listener in self._listeners:
+            listener.product_changed(product)
+
+    def _discard_active(self, seq):
+        """
+        Remove a sequence number from the sorted active products index.
+
+        Parameters:
+        seq (int): The sequence number of the product.
+        """
+        index = bisect_left(self._active_seqs, seq)
+        if (index < len(self._active_seqs) and
+                self._active_seqs[index] == seq):
+            del self._active_seqs[index]
+
+    @staticmethod
+    def lock_products(product_iter):
+        """
+        Acquire the locks of several products at once. Locks are taken
+        in a fixed global order, so two threads locking overlapping
+        sets of products cannot deadlock.
+
+        Parameters:
+        product_iter (iterable): The products to lock. Duplicates are
+                                 allowed.
+
+        Returns:
+        ExitStack: A context manager that releases the locks on exit.
+        """
+        unique = {id(product): product for product in product_iter}
+        stack = ExitStack()
+        for key in sorted(unique):
+            stack.enter_context(unique[key].lock)
+        return stack
 
     def get_total_quantity(self):
         """
@@ -44,14 +657,139 @@ class Store:
         non-stocked and limited products that do not have a defined
         stock quantity.
 
+        The total is kept up to date as products change, so this is
+        O(1).
+
         Returns:
         int: The total quantity of items in the store.
         """
-        total_quantity = 0
+        return self._total_quantity
+
+    def get_active_count(self):
+        """
+        Get the number of active products in the store.
+
+        Returns:
+        int: The number of active products.
+        """
+        return len(self._active_seqs)
+
+    def get_stock_value(self):
+        """
+        Get the value of the stock in the store at list price, without
+        promotions. Non-stocked products do not count.
+
+        Returns:
+        float: The stock value.
+        """
+        return self._stock_value_cents / money.CENTS
+
+    def get_inventory_summary(self):
+        """
+        Get the inventory totals of the store, overall and per product
+        type. The totals are kept up to date as products change, so
+        this costs O(number of product types).
+
+        Returns:
+        dict: total_quantity, active_count and stock_value_cents, and
+              by_type, which maps each product class name to a dict of
+              products, active, quantity and stock_value_cents.
+        """
+        with self._index_lock:
+            return {"total_quantity": self._total_quantity,
+                    "active_count": len(self._active_seqs),
+                    "stock_value_cents": self._stock_value_cents,
+                    "by_type": {name: dict(zip(_TYPE_FIELDS, totals))
+                                for name, totals in
+                                self._type_totals.items()}}
+
+    def check_aggregates(self):
+        """
+        Compare the inventory totals against a full recount of the
+        products, to check that they were kept up to date.
+
+        Returns:
+        list: A description of every total that differs from the
+              recount; empty if they all match.
+        """
+        expected = {"total_quantity": 0, "active_count": 0,
+                    "stock_value_cents": 0, "by_type": {}}
         for product in self.product_list:
-            if not isinstance(product, products.NonStockedProduct):
-                total_quantity += product.get_quantity()
-        return total_quantity
+            name, quantity, value, active = self._tally(product)
+            expected["total_quantity"] += quantity
+            expected["active_count"] += active
+            expected["stock_value_cents"] += value
+            totals = expected["by_type"].setdefault(
+                name, dict.fromkeys(_TYPE_FIELDS, 0))
+            for field, amount in zip(_TYPE_FIELDS,
+                                     (1, active, quantity, value)):
+                totals[field] += amount
+        actual = self.get_inventory_summary()
+        return [f"{key}: kept {actual[key]!r}, recounted {expected[key]!r}"
+                for key in expected if actual[key] != expected[key]]
+
+    @staticmethod
+    def _tally(product):
+        """
+        Get what a product adds to the inventory totals.
+
+        Parameters:
+        product (Product): The product.
+
+        Returns:
+        tuple: (type name, stocked quantity, stock value in cents,
+               1 if active else 0).
+        """
+        if isinstance(product, products.NonStockedProduct):
+            quantity = 0
+        else:
+            quantity = product.quantity
+        return (type(product).__name__, quantity,
+                quantity * product.price_cents, int(product.active))
+
+    def _retally(self, seq, product):
+        """
+        Replace what a product adds to the inventory totals with its
+        current state. The caller must hold the index lock.
+
+        Parameters:
+        seq (int): The sequence number of the product.
+        product (Product): The product, or None if it was removed.
+        """
+        tally = None if product is None else self._tally(product)
+        old = self._tallies.get(seq)
+        if old is not None and tally is not None and old[0] == tally[0]:
+            # The common case, a quantity or price change: apply the
+            # difference.
+            quantity = tally[1] - old[1]
+            value = tally[2] - old[2]
+            self._total_quantity += quantity
+            self._stock_value_cents += value
+            totals = self._type_totals[tally[0]]
+            totals[1] += tally[3] - old[3]
+            totals[2] += quantity
+            totals[3] += value
+            self._tallies[seq] = tally
+            return
+        for sign, entry in ((-1, old), (1, tally)):
+            if entry is None:
+                continue
+            name, quantity, value, active = entry
+            self._total_quantity += sign * quantity
+            self._stock_value_cents += sign * value
+            totals = self._type_totals.get(name)
+            if totals is None:
+                totals = self._type_totals[name] = [0, 0, 0, 0]
+            totals[0] += sign
+            totals[1] += sign * active
+            totals[2] += sign * quantity
+            totals[3] += sign * value
+            if not totals[0]:
+                del self._type_totals[name]
+        if tally is None:
+            self._tallies.pop(seq, None)
+        else:
+            self._tallies[seq] = tally
 
     def get_all_products(self):
         """
@@ -60,16 +798,80 @@ class Store:
         Returns:
         list: A list of active products in the store.
         """
-        all_active_products = []
-        for product in self.product_list:
-            if product.is_active():
-                all_active_products.append(product)
-        return all_active_products
+        by_seq = self._products
+        return [by_seq[seq] for seq in self._active_seqs]
+
+    def iter_products(self, offset=0, limit=None):
+        """
+        Iterate over the active products in the order they were added,
+        with the text of their show() method, one page at a time.
+
+        Only the products that are iterated over are touched, so
+        listing a page costs the same in any size of catalog. The
+        iterator remembers the last product it returned rather than a
+        position, so products activated or deactivated while iterating
+        do not make it skip or repeat the others.
+
+        show() texts are cached per product and rendered again when the
+        product's quantity, price or promotion changed.
+
+        Parameters:
+        offset (int): The number of active products to skip.
+        limit (int): The most products to return, or None for all.
+
+        Yields:
+        tuple: (product, text) for each product.
+
+        Raises:
+        ValueError: If offset or limit is negative.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("Offset and limit must not be negative")
+        by_seq = self._products
+        count = 0
+        last = None
+        while limit is None or count < limit:
+            size = LIST_CHUNK if limit is None else min(LIST_CHUNK,
+                                                        limit - count)
+            with self._index_lock:
+                seqs = self._active_seqs
+                start = (offset if last is None else
+                         bisect_right(seqs, last))
+                chunk = [(seq, by_seq[seq])
+                         for seq in seqs[start:start + size]]
+            if not chunk:
+                return
+            for seq, product in chunk:
+                yield product, self._show(seq, product)
+            last = chunk[-1][0]
+            count += len(chunk)
+
+    def _show(self, seq, product):
+        """
+        Get the show() text of a product from the cache, rendering and
+        caching it if the product changed since it was cached.
+
+        Parameters:
+        seq (int): The sequence number of the product.
+        product (Product): The product.
+
+        Returns:
+        str: The text.
+        """
+        state = (product.quantity, product.price_cents, product.promotion)
+        cached = self._shown.get(seq)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+        text = product.show()
+        self._shown[seq] = (state, text)
+        return text
 
     def order(self, shopping_list):
         """
         Place an order for a list of products and return the total
-        price.
+        price. Lines for an inactive product, for more than the
+        available stock or for a quantity that is not positive are
+        skipped and left out of the total.
 
         Parameters:
         shopping_list (list): A list of tuples, where each tuple
@@ -80,26 +882,708 @@ class Store:
         float: The total price of the order.
 
         Raises:
-        ValueError: If the product is not active or if the requested
-                    quantity exceeds available stock.
+        OrderLimitError: If a line exceeds a LimitedProduct's maximum
+                         per order. The lines before it stay bought.
+        PurchaseError: If a product refuses a line for another reason.
         """
-        total_price = 0.0
-        for product, quantity in shopping_list:
-            try:
-                if not product.is_active():
-                    raise ValueError(
+        if self._holds:
+            self._expire_due()
+        return self._order(shopping_list)
+
+    def _order(self, shopping_list):
+        """
+        Place an order, see order, without releasing expired holds
+        first.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples.
+
+        Returns:
+        float: The total price of the order.
+        """
+        timed = metrics.ENABLED
+        if timed:
+            start = perf_counter()
+        total_cents = 0
+        with self.lock_products(product for product, _ in shopping_list):
+            for product, quantity in shopping_list:
+                reason = products.INVALID_QUANTITY
+                try:
+                    if not product.is_active():
+                        reason = products.INACTIVE
+                        raise ValueError(
+                            f"Product '{product.name}' is not active and "
+                            f"cannot be ordered.")
+                    if isinstance(product, products.NonStockedProduct):
+                        total_cents += product.buy_cents(quantity)
+                    elif quantity > product.get_quantity():
+                        reason = products.INSUFFICIENT_STOCK
+                        raise ValueError(
+                            f"Not enough quantity available for "
+                            f"'{product.name}'. "
+                            f"Available: {product.get_quantity()}, "
+                            f"Requested: {quantity}")
+                    else:
+                        total_cents += product.buy_cents(quantity)
+                except ValueError as e:
+                    if metrics.ENABLED:
+                        metrics.REJECTED_LINES.inc(reason)
+                    if events.ENABLED:
+                        events.emit(events.REJECTED, product.name, quantity,
+                                    reason=reason, message=str(e))
+                    continue
+                except products.PurchaseError as e:
+                    if metrics.ENABLED:
+                        metrics.REJECTED_LINES.inc(e.reason)
+                    if events.ENABLED:
+                        events.emit(events.REJECTED, product.name, quantity,
+                                    reason=e.reason, message=str(e))
+                    raise
+        if timed:
+            metrics.ORDERS.inc()
+            metrics.ORDER_SECONDS.observe(perf_counter() - start)
+        return total_cents / money.CENTS
+
+    def order_many(self, orders):
+        """
+        Place many orders in one pass. The result is the same as
+        calling order() for each shopping list in sequence, but stock
+        is read and written once per product, and each product's lines
+        are priced together with Promotion.apply_promotion_many_cents.
+
+        An order that hits a per-order limit stops at that line, like
+        order() does when LimitedProduct.buy raises; the lines before
+        it stay applied and the error is reported for that order only.
+
+        Parameters:
+        orders (list): A list of shopping lists, each a list of
+                       (product, quantity) tuples.
+
+        Returns:
+        list: One (total_price, errors) tuple per order, where errors
+              is a list of error messages for the lines that failed.
+        """
+        return [(total_cents / money.CENTS,
+                 [line_error.message for line_error in line_errors])
+                for total_cents, line_errors in self.order_many_cents(orders)]
+
+    def order_many_cents(self, orders):
+        """
+        Place many orders in one pass, see order_many, and report the
+        totals in cents with the failed lines as LineError, as the
+        shard workers of sharded.ShardedStore send them back.
+
+        Parameters:
+        orders (list): A list of shopping lists, each a list of
+                       (product, quantity) tuples.
+
+        Returns:
+        list: One (total_cents, line_errors) tuple per order, where
+              line_errors lists a LineError per failed line.
+        """
+        if self._holds:
+            self._expire_due()
+        with self.lock_products(product for shopping_list in orders
+                                for product, _ in shopping_list):
+            return self._order_many(orders)
+
+    def _order_many(self, orders):
+        """
+        Place many orders, see order_many. The caller must hold the
+        locks of every product in the orders.
+
+        Parameters:
+        orders (list): A list of shopping lists.
+
+        Returns:
+        list: One (total_cents, line_errors) tuple per order, where
+              line_errors lists a LineError per failed line.
+        """
+        remaining, sold, all_errors = self._plan(orders)
+        line_prices = [[0] * len(shopping_list)
+                       for shopping_list in orders]
+        for product, quantities, positions in sold.values():
+            if product.promotion:
+                prices = product.promotion.apply_promotion_many_cents(
+                    product, quantities)
+            else:
+                price = product.price_cents
+                prices = [price * quantity for quantity in quantities]
+            for (order_index, line_index), price in zip(positions, prices):
+                line_prices[order_index][line_index] = price
+            if events.ENABLED:
+                # The same events, in the same order, as Product.buy.
+                for quantity, price in zip(quantities, prices):
+                    if product.promotion:
+                        events.emit(events.PROMOTION_APPLIED, product.name,
+                                    quantity,
+                                    promotion=product.promotion.name)
+                    events.emit(events.PURCHASE, product.name, quantity,
+                                price_cents=price)
+            if not isinstance(product, products.NonStockedProduct):
+                product.set_quantity(product.quantity - sum(quantities))
+
+        results = []
+        for prices, line_errors in zip(line_prices, all_errors):
+            if metrics.ENABLED:
+                for line_error in line_errors:
+                    metrics.REJECTED_LINES.inc(line_error.reason)
+            if events.ENABLED:
+                for line_error in line_errors:
+                    events.emit(events.REJECTED, line_error.product.name,
+                                line_error.quantity,
+                                reason=line_error.reason,
+                                message=line_error.message)
+            results.append((sum(prices), line_errors))
+        return results
+
+    def _plan(self, orders):
+        """
+        Validate orders as if order() were called for each of them in
+        sequence, using local stock counters instead of changing the
+        products. The caller must hold the locks of every product.
+
+        Parameters:
+        orders (list): A list of shopping lists.
+
+        Returns:
+        tuple: (remaining, sold, all_errors). remaining maps product
+               ids to the stock left to buy after the orders. sold maps
+               product ids to [product, quantities, positions], with
+               one quantity and (order index, line index) position per
+               line that can be bought. all_errors holds, per order, a
+               list with a LineError per failed line.
+        """
+        remaining = {}
+        active = {}
+        sold = {}
+        all_errors = []
+        for order_index, shopping_list in enumerate(orders):
+            errors = []
+            all_errors.append(errors)
+            for line_index, (product, quantity) in enumerate(shopping_list):
+                key = id(product)
+                if key not in active:
+                    active[key] = product.is_active()
+                    remaining[key] = product.get_quantity()
+                if not active[key]:
+                    errors.append(LineError(
+                        line_index, product, quantity, products.INACTIVE,
                         f"Product '{product.name}' is not active and "
-                        f"cannot be ordered.")
-                if isinstance(product, products.NonStockedProduct):
-                    total_price += product.buy(quantity)
-                elif quantity > product.get_quantity():
-                    raise ValueError(
-                        f"Not enough quantity available for '{product.name}'. "
-                        f"Available: {product.get_quantity()}, "
-                        f"Requested: {quantity}")
-                else:
-                    total_price += product.buy(quantity)
-            except ValueError as e:
-                print(f"Error: {str(e)}")
-                continue
+                        f"cannot be ordered."))
+                    continue
+                non_stocked = isinstance(product,
+                                         products.NonStockedProduct)
+                if not non_stocked and quantity > remaining[key]:
+                    errors.append(LineError(
+                        line_index, product, quantity,
+                        products.INSUFFICIENT_STOCK,
+                        f"Not enough quantity available for "
+                        f"'{product.name}'. Available: {remaining[key]}, "
+                        f"Requested: {quantity}"))
+                    continue
+                if (isinstance(product, products.LimitedProduct) and
+                        quantity > product.max_quantity_per_order):
+                    errors.append(LineError(
+                        line_index, product, quantity, products.ORDER_LIMIT,
+                        f"Cannot buy more than "
+                        f"{product.max_quantity_per_order} of this item "
+                        f"in one order"))
+                    break
+                if quantity <= 0:
+                    errors.append(LineError(
+                        line_index, product, quantity,
+                        products.INVALID_QUANTITY,
+                        "Quantity to buy must be a positive number"))
+                    continue
+                if not non_stocked:
+                    remaining[key] -= quantity
+                    if remaining[key] == 0 and not product.held:
+                        active[key] = False
+                entry = sold.get(key)
+                if entry is None:
+                    entry = sold[key] = [product, [], []]
+                entry[1].append(quantity)
+                entry[2].append((order_index, line_index))
+        return remaining, sold, all_errors
+
+    def quote(self, shopping_list):
+        """
+        Price a shopping list without buying anything. Lines are
+        validated like order() would, but stock is not changed.
+
+        Line prices are memoized in a bounded LRU cache keyed by
+        product, price, promotion and quantity. A product's entries
+        are dropped when its price, promotion or activation changes.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples.
+
+        Returns:
+        tuple: (total_price, errors), the same as one result of
+               order_many.
+        """
+        with self.lock_products(product for product, _ in shopping_list):
+            _, sold, all_errors = self._plan([shopping_list])
+            line_prices = [0] * len(shopping_list)
+            for product, quantities, positions in sold.values():
+                for quantity, (_, line_index) in zip(quantities, positions):
+                    line_prices[line_index] = self._line_price(product,
+                                                               quantity)
+        return (sum(line_prices) / money.CENTS,
+                [line_error.message for line_error in all_errors[0]])
+
+    def _line_price(self, product, quantity):
+        """
+        Get the price of one line from the quote cache, computing and
+        caching it on a miss.
+
+        Parameters:
+        product (Product): The product of the line.
+        quantity (int): The quantity of the line.
+
+        Returns:
+        int: The price of the line in cents.
+        """
+        key = (product, product.price_cents, product.promotion, quantity)
+        cache = self._quote_cache
+        with self._quote_lock:
+            price = cache.get(key)
+            if price is not None:
+                cache.move_to_end(key)
+                self._quote_hits += 1
+                return price
+            self._quote_misses += 1
+        if product.promotion:
+            price = product.promotion.apply_promotion_cents(product,
+                                                            quantity)
+        else:
+            price = product.price_cents * quantity
+        with self._quote_lock:
+            cache[key] = price
+            self._quote_keys.setdefault(id(product), set()).add(key)
+            self._quote_state.setdefault(
+                id(product),
+                (product.price_cents, product.promotion, product.active))
+            if len(cache) > self._quote_cache_size:
+                old_key, _ = cache.popitem(last=False)
+                keys = self._quote_keys.get(id(old_key[0]))
+                if keys is not None:
+                    keys.discard(old_key)
+                    if not keys:
+                        del self._quote_keys[id(old_key[0])]
+        return price
+
+    def _invalidate_quotes(self, product):
+        """
+        Drop the cached quote lines of a product if its price,
+        promotion or activation changed since they were cached.
+
+        Parameters:
+        product (Product): The product that changed.
+        """
+        key = id(product)
+        state = (product.price_cents, product.promotion, product.active)
+        with self._quote_lock:
+            if self._quote_state.get(key) == state:
+                return
+            self._quote_state[key] = state
+            for cache_key in self._quote_keys.pop(key, ()):
+                self._quote_cache.pop(cache_key, None)
+
+    def quote_cache_info(self):
+        """
+        Get statistics about the quote cache.
+
+        Returns:
+        dict: hits, misses, hit_rate, size and maxsize.
+        """
+        with self._quote_lock:
+            lookups = self._quote_hits + self._quote_misses
+            return {"hits": self._quote_hits,
+                    "misses": self._quote_misses,
+                    "hit_rate": self._quote_hits / lookups if lookups
+                    else 0.0,
+                    "size": len(self._quote_cache),
+                    "maxsize": self._quote_cache_size}
+
+    def order_atomic(self, shopping_list, optimizer=None):
+        """
+        Place an order that is applied completely or not at all.
+
+        Stock for every line is reserved first, while the locks of all
+        products in the order are held. If any line fails, all
+        reservations are dropped and an OrderError listing every failed
+        line is raised. Otherwise the total is computed and all lines
+        are committed; should a commit fail halfway, the lines already
+        committed are rolled back.
+
+        Unlike order(), the per-order limit of a LimitedProduct applies
+        to the sum of all lines for that product.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples.
+        optimizer (CartOptimizer): Prices the whole cart with the
+                                   cheapest combination of deals
+                                   instead of line by line, if given.
+
+        Returns:
+        float: The total price of the order.
+
+        Raises:
+        OrderError: If any line cannot be ordered.
+        """
+        if optimizer is None:
+            total_cents, _ = self.order_atomic_cents(shopping_list)
+            return total_cents / money.CENTS
+        if self._holds:
+            self._expire_due()
+        with self.lock_products(product for product, _ in shopping_list):
+            reserved = self._reserve(shopping_list)
+            total_price = optimizer.optimize(shopping_list).total
+            self._commit(reserved)
         return total_price
+
+    def order_atomic_cents(self, shopping_list):
+        """
+        Place an order that is applied completely or not at all, see
+        order_atomic, priced line by line. The result also holds the
+        state of the products before the order, so a caller that
+        places one order across several stores, such as the shard
+        workers of sharded.ShardedStore, can undo it with
+        restore_stock when another store rejects its part.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples.
+
+        Returns:
+        tuple: (total_cents, previous), where previous lists the
+               (product, quantity, active) state before the order of
+               every stocked product in it.
+
+        Raises:
+        OrderError: If any line cannot be ordered.
+        """
+        if self._holds:
+            self._expire_due()
+        with self.lock_products(product for product, _ in shopping_list):
+            reserved = self._reserve(shopping_list)
+            total_cents = self._total_cents(shopping_list)
+            previous = [(product, product.quantity, product.active)
+                        for product, _ in reserved.values()
+                        if not isinstance(product,
+                                          products.NonStockedProduct)]
+            self._commit(reserved)
+        return total_cents, previous
+
+    @staticmethod
+    def restore_stock(previous):
+        """
+        Put back the stock an order_atomic_cents order took.
+
+        Parameters:
+        previous (list): The (product, quantity, active) states
+                         returned by order_atomic_cents.
+        """
+        for product, quantity, active in previous:
+            with product.lock:
+                product.set_quantity(quantity)
+                if active:
+                    product.activate()
+
+    @staticmethod
+    def _total_cents(shopping_list):
+        """
+        Price a shopping list line by line, without checking stock.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples.
+
+        Returns:
+        int: The total price in cents.
+        """
+        total_cents = 0
+        for product, quantity in shopping_list:
+            if product.promotion:
+                total_cents += product.promotion.apply_promotion_cents(
+                    product, quantity)
+            else:
+                total_cents += product.price_cents * quantity
+        return total_cents
+
+    def _reserve(self, shopping_list):
+        """
+        Reserve stock for every line of a shopping list. The caller
+        must hold the locks of every product in the list.
+
+        Parameters:
+        shopping_list (list): A list of (product, quantity) tuples.
+
+        Returns:
+        dict: Maps product ids to (product, reserved quantity).
+
+        Raises:
+        OrderError: If any line cannot be reserved.
+        """
+        reserved = {}
+        line_errors = []
+        for index, (product, quantity) in enumerate(shopping_list):
+            key = id(product)
+            already = reserved[key][1] if key in reserved else 0
+            if not product.is_active():
+                reason = products.INACTIVE
+                message = (f"Product '{product.name}' is not active and "
+                           f"cannot be ordered.")
+            elif not isinstance(quantity, int) or quantity <= 0:
+                reason = products.INVALID_QUANTITY
+                message = (f"Quantity for '{product.name}' must be a "
+                           f"positive number")
+            elif (isinstance(product, products.LimitedProduct) and
+                    already + quantity > product.max_quantity_per_order):
+                reason = products.ORDER_LIMIT
+                message = (f"Cannot buy more than "
+                           f"{product.max_quantity_per_order} of "
+                           f"'{product.name}' in one order")
+            elif (not isinstance(product, products.NonStockedProduct) and
+                    already + quantity > product.get_quantity()):
+                reason = products.INSUFFICIENT_STOCK
+                message = (f"Not enough quantity available for "
+                           f"'{product.name}'. Available: "
+                           f"{product.get_quantity() - already}, "
+                           f"Requested: {quantity}")
+            else:
+                reserved[key] = (product, already + quantity)
+                continue
+            line_errors.append(
+                LineError(index, product, quantity, reason, message))
+        if line_errors:
+            if metrics.ENABLED:
+                for line_error in line_errors:
+                    metrics.REJECTED_LINES.inc(line_error.reason)
+            if events.ENABLED:
+                for line_error in line_errors:
+                    events.emit(events.REJECTED, line_error.product.name,
+                                line_error.quantity,
+                                reason=line_error.reason,
+                                message=line_error.message)
+            raise OrderError(line_errors)
+        return reserved
+
+    def _commit(self, reserved):
+        """
+        Take reserved stock out of the products. If a product fails to
+        update, the products updated before it are restored.
+
+        Parameters:
+        reserved (dict): The reservations returned by _reserve.
+        """
+        committed = []
+        try:
+            for product, quantity in reserved.values():
+                if isinstance(product, products.NonStockedProduct):
+                    continue
+                committed.append((product, product.quantity))
+                product.set_quantity(product.quantity - quantity)
+        except Exception:
+            for product, quantity in reversed(committed):
+                product.set_quantity(quantity)
+                product.activate()
+            raise
+
+    def hold(self, product, quantity, ttl):
+        """
+        Hold stock of a product for a shopper's cart. Held units are
+        not sold, but get_quantity() no longer counts them, so nobody
+        else can buy them until the hold is ordered with order_holds,
+        released with release, or expires after ttl seconds.
+
+        Expired holds are not released by a timer each. Holds are kept
+        in a heap ordered by expiry time, and every hold and order call
+        first releases all holds that are due, in one pass, see
+        expire_holds. Taking a hold and releasing it are O(log n) in
+        the number of outstanding holds.
+
+        Parameters:
+        product (Product): The product to hold.
+        quantity (int): The number of units to hold.
+        ttl (float): The number of seconds until the hold expires.
+
+        Returns:
+        Hold: The hold.
+
+        Raises:
+        ValueError: If the product is not in the store, or quantity or
+                    ttl is not positive.
+        InactiveProductError: If the product is not active.
+        OrderLimitError: If quantity exceeds a LimitedProduct's
+                         maximum per order.
+        InsufficientStockError: If quantity exceeds the available
+                                quantity.
+        """
+        if isinstance(ttl, bool) or not (isinstance(ttl, (int, float)) and
+                                         ttl > 0):
+            raise ValueError("Hold time must be a positive number")
+        if not (isinstance(quantity, int) and quantity > 0):
+            raise ValueError("Quantity to hold must be a positive number")
+        if product not in self:
+            raise ValueError(f"Product '{product.name}' is not in the store")
+        if self._holds:
+            self._expire_due()
+        with product.lock:
+            if not product.is_active():
+                raise products.InactiveProductError("Product is not active")
+            if (isinstance(product, products.LimitedProduct) and
+                    quantity > product.max_quantity_per_order):
+                raise products.OrderLimitError(
+                    f"Cannot buy more than {product.max_quantity_per_order} "
+                    f"of this item in one order")
+            if quantity > product.get_quantity():
+                raise products.InsufficientStockError(
+                    "Quantity larger than available stock")
+            if not isinstance(product, products.NonStockedProduct):
+                product.held += quantity
+            hold = Hold(product, quantity, monotonic() + ttl)
+            with self._hold_lock:
+                heappush(self._holds,
+                         (hold.expires_at, next(self._hold_ids), hold))
+                self._hold_count += 1
+        return hold
+
+    def release(self, hold):
+        """
+        Release a hold, making its units available again.
+
+        Parameters:
+        hold (Hold): A hold returned by hold().
+
+        Returns:
+        bool: True if the hold was active, False if it had already
+              been released, expired or ordered.
+        """
+        with hold.product.lock:
+            released = self._end_hold(hold)
+        if released:
+            self._forget_holds(1)
+        return released
+
+    def order_holds(self, holds):
+        """
+        Order the held units of a cart. Every hold is released and its
+        units bought in one order, while the product locks are held so
+        no other shopper can take them in between. Holds that expired
+        or were released before are ordered like order() would: only
+        if their units are still available.
+
+        Parameters:
+        holds (list): Holds returned by hold().
+
+        Returns:
+        float: The total price of the order.
+
+        Raises:
+        PurchaseError: See order().
+        """
+        shopping_list = [(hold.product, hold.quantity) for hold in holds]
+        if self._holds:
+            self._expire_due()
+        with self.lock_products(product for product, _ in shopping_list):
+            released = sum(self._end_hold(hold) for hold in holds)
+            if released:
+                self._forget_holds(released)
+            return self._order(shopping_list)
+
+    def expire_holds(self, now=None):
+        """
+        Release every hold that expired. Holds are popped off the
+        expiry heap until the first one that is still due later, and
+        grouped by product so each product is locked once.
+
+        Stores call this themselves before every hold and order. Call
+        it periodically as well if stock should come back while the
+        store is idle.
+
+        Parameters:
+        now (float): The time.monotonic() to expire holds up to; the
+                     current time if None.
+
+        Returns:
+        int: The number of holds released.
+        """
+        if now is None:
+            now = monotonic()
+        due = []
+        with self._hold_lock:
+            heap = self._holds
+            while heap and heap[0][0] <= now:
+                due.append(heappop(heap)[2])
+        by_product = {}
+        for hold in due:
+            by_product.setdefault(id(hold.product), []).append(hold)
+        released = 0
+        for holds in by_product.values():
+            with holds[0].product.lock:
+                for hold in holds:
+                    released += self._end_hold(hold)
+        with self._hold_lock:
+            self._hold_count -= released
+            self._released_holds -= len(due) - released
+        return released
+
+    def get_hold_count(self):
+        """
+        Get the number of outstanding holds, including expired holds
+        that were not released yet.
+
+        Returns:
+        int: The number of holds.
+        """
+        return self._hold_count
+
+    def _expire_due(self):
+        """
+        Release the expired holds, if the earliest hold has expired.
+        """
+        try:
+            expires_at = self._holds[0][0]
+        except IndexError:
+            return
+        if expires_at <= monotonic():
+            self.expire_holds()
+
+    @staticmethod
+    def _end_hold(hold):
+        """
+        Mark a hold as no longer active and give its units back to the
+        product. The caller must hold the product's lock.
+
+        Parameters:
+        hold (Hold): The hold.
+
+        Returns:
+        bool: True if the hold was active.
+        """
+        if not hold.active:
+            return False
+        hold.active = False
+        if not isinstance(hold.product, products.NonStockedProduct):
+            hold.product.held -= hold.quantity
+        return True
+
+    def _forget_holds(self, released):
+        """
+        Count holds released before they expired. Their heap entries
+        stay until they are popped; once they make up most of the heap
+        it is rebuilt without them.
+
+        Parameters:
+        released (int): The number of holds released.
+        """
+        with self._hold_lock:
+            self._hold_count -= released
+            self._released_holds += released
+            heap = self._holds
+            if (self._released_holds > _HOLD_COMPACT_MIN and
+                    self._released_holds * 2 > len(heap)):
+                heap[:] = [entry for entry in heap if entry[2].active]
+                heapify(heap)
+                self._released_holds = 0
@@ -0,0 +1,131 @@
+import itertools
+import random
+
+import pytest
+
+from cart import BundleDeal, CartOptimizer
+from products import Product
+from promotions import PercentDiscount, SecondHalfPrice, ThirdOneFree
+from store import OrderError, Store
+
+
+def brute_force(optimizer, shopping_list):
+    quantities = dict(shopping_list)
+    price_line = optimizer._line_pricer()
+    ranges = [range(min(quantities.get(product, 0) // quantity
+                        for product, quantity in deal.items) + 1)
+              for deal in optimizer.bundles]
+    best = float('inf')
+    for counts in itertools.product(*ranges):
+        remaining = dict(quantities)
+        total = 0
+        for deal, count in zip(optimizer.bundles, counts):
+            total += deal.price_cents * count
+            for product, quantity in deal.items:
+                remaining[product] -= quantity * count
+        if min(remaining.values()) < 0:
+            continue
+        total += sum(price_line(product, quantity)[0]
+                     for product, quantity in remaining.items())
+        best = min(best, total)
+    return best / 100
+
+
+# Test that each product gets its cheapest eligible promotion.
+def test_alternative_promotions():
+    phone = Product("Phone", price=100, quantity=100)
+    phone.set_promotion(SecondHalfPrice("Second Half price!"))
+    optimizer = CartOptimizer(
+        alternatives={phone: [PercentDiscount("30% off!", percent=30),
+                              ThirdOneFree("Third One Free!")]})
+    result = optimizer.optimize([(phone, 1)])
+    assert result.total == 70
+    assert result.lines[0][2].name == "30% off!"
+    result = optimizer.optimize([(phone, 3)])
+    assert result.total == 200
+    assert result.exact
+
+
+# Test that a bundle is applied only where it beats line pricing.
+def test_cross_product_bundle():
+    phone = Product("Phone", price=100, quantity=100)
+    case = Product("Case", price=20, quantity=100)
+    case.set_promotion(PercentDiscount("50% off!", percent=50))
+    optimizer = CartOptimizer([BundleDeal("Phone + case", [(phone, 1),
+                                                            (case, 1)],
+                                          105)])
+    result = optimizer.optimize([(phone, 2), (case, 1)])
+    assert result.total == 205
+    assert [count for count in result.bundles.values()] == [1]
+    assert result.lines == [(phone, 1, None, 100)]
+    cheap = CartOptimizer([BundleDeal("Bad deal", [(phone, 1), (case, 1)],
+                                      115)])
+    assert cheap.optimize([(phone, 1), (case, 1)]).bundles == {}
+
+
+# Test that branch-and-bound matches an exhaustive search where the
+# greedy choice is not optimal.
+def test_matches_brute_force():
+    rng = random.Random(7)
+    catalog = [Product(f"P{i}", price=rng.randint(5, 50), quantity=100)
+               for i in range(6)]
+    catalog[0].set_promotion(ThirdOneFree("Third One Free!"))
+    catalog[1].set_promotion(SecondHalfPrice("Second Half price!"))
+    for _ in range(30):
+        bundles = []
+        for b in range(4):
+            items = rng.sample(catalog, rng.randint(1, 3))
+            full = sum(product.price for product in items)
+            bundles.append(BundleDeal(f"B{b}", [(p, 1) for p in items],
+                                      full * rng.uniform(0.5, 1.0)))
+        optimizer = CartOptimizer(bundles, time_budget=10)
+        cart = [(product, rng.randint(0, 4)) for product in catalog]
+        result = optimizer.optimize(cart)
+        assert result.exact
+        assert result.total == brute_force(optimizer, cart)
+
+
+# Test that an exhausted time budget still returns a valid price.
+def test_time_budget_fallback():
+    catalog = [Product(f"P{i}", price=10, quantity=1000) for i in range(50)]
+    bundles = [BundleDeal(f"B{i}", [(catalog[i], 1),
+                                    (catalog[(i + 1) % 50], 1)], 15)
+               for i in range(50)]
+    result = CartOptimizer(bundles, time_budget=0).optimize(
+        [(product, 20) for product in catalog])
+    assert not result.exact
+    assert result.total <= 50 * 20 * 10
+    assert result.total == pytest.approx(
+        sum(deal.price * count for deal, count in result.bundles.items()) +
+        sum(line[3] for line in result.lines))
+
+
+# Test that a search cut short by the time budget keeps the better
+# answer it found over the greedy one.
+def test_time_budget_keeps_improvement():
+    a, b, c = (Product(name, price=0.1, quantity=100) for name in "ABC")
+    bundles = [BundleDeal("AB", [(a, 1), (b, 1)], 0.08),
+               BundleDeal("AC", [(a, 1), (c, 1)], 0.08),
+               BundleDeal("ABC", [(a, 1), (b, 1), (c, 1)], 0.15)]
+    cart = [(a, 40), (b, 20), (c, 20)]
+    assert CartOptimizer(bundles, time_budget=10).optimize(cart).exact
+    result = CartOptimizer(bundles, time_budget=0).optimize(cart)
+    assert not result.exact
+    assert result.total == pytest.approx(3.2)
+    assert {deal.name: count for deal, count in result.bundles.items()} == {
+        "AB": 20, "AC": 20}
+
+
+# Test that an atomic order can be priced by the optimizer.
+def test_order_atomic_with_optimizer():
+    phone = Product("Phone", price=100, quantity=10)
+    case = Product("Case", price=20, quantity=10)
+    store = Store([phone, case])
+    optimizer = CartOptimizer([BundleDeal("Phone + case", [(phone, 1),
+                                                            (case, 1)],
+                                          110)])
+    assert store.order_atomic([(phone, 1), (case, 1)], optimizer) == 110
+    assert phone.get_quantity() == 9 and case.get_quantity() == 9
+    with pytest.raises(OrderError):
+        store.order_atomic([(phone, 1), (case, 50)], optimizer)
+    assert case.get_quantity() == 9
@@ -0,0 +1,68 @@
+import pytest
+
+import catalog
+from columnar import ColumnarStore
+from products import LimitedProduct, NonStockedProduct, Product
+
+
+# Test that the shipped catalog loads the original store.
+def test_default_catalog():
+    best_buy = catalog.load_catalog(catalog.default_catalog_path())
+    assert [product.name for product in best_buy.get_all_products()] == [
+        "MacBook Air M2", "Bose QuietComfort Earbuds", "Google Pixel 7",
+        "Windows License", "Shipping"]
+    assert best_buy.get_total_quantity() == 1100
+    macbook = best_buy.get_product("MacBook Air M2")
+    assert macbook.promotion.name == "Second Half price!"
+    assert best_buy.order([(macbook, 2)]) == 2175
+    windows = best_buy.get_product("Windows License")
+    assert isinstance(windows, NonStockedProduct)
+    assert windows.buy(1) == 87.5
+    assert best_buy.get_product("Shipping").max_quantity_per_order == 1
+
+
+# Test that a CSV catalog builds every product type, in chunks and
+# into another store class.
+def test_csv_catalog(tmp_path):
+    pytest.importorskip("numpy")
+    path = tmp_path / "catalog.csv"
+    path.write_text(
+        "kind,name,price,quantity,max_per_order,promotion,percent\n"
+        "percent,Ten off,,,,,10\n"
+        "product,Phone,19.99,3,,Ten off,\n"
+        ",Case,5,10,,,\n"
+        "non_stocked,Warranty,49.5,,,,\n"
+        "limited,Gift wrap,0.1,100,2,,\n")
+    best_buy = catalog.load_catalog(str(path), chunk_size=2,
+                                    store_class=ColumnarStore)
+    assert isinstance(best_buy, ColumnarStore)
+    phone = best_buy.get_product("Phone")
+    assert type(phone) is Product
+    assert phone.price_cents == 1999
+    assert phone.buy(1) == 17.99
+    assert type(best_buy.get_product("Case")) is Product
+    assert best_buy.get_product("Warranty").price == 49.5
+    wrap = best_buy.get_product("Gift wrap")
+    assert isinstance(wrap, LimitedProduct)
+    assert wrap.max_quantity_per_order == 2
+    assert best_buy.get_total_quantity() == 112
+    assert best_buy.check_aggregates() == []
+
+
+# Test that every invalid record is reported and no store is built.
+def test_invalid_records(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text(
+        '{"name": "Phone", "price": 10, "quantity": 1}\n'
+        '{"name": "Phone", "price": 10, "quantity": 1}\n'
+        '{"name": "Cable", "price": -1, "quantity": 1}\n'
+        'not json\n'
+        '\n'
+        '{"kind": "limited", "name": "Wrap", "price": 1, "quantity": 1}\n'
+        '{"name": "Case", "price": 5, "quantity": 1.5}\n'
+        '{"name": "Bag", "price": 5, "quantity": 1, "promotion": "Nope"}\n'
+        '{"kind": "gadget", "name": "Thing", "price": 5}\n')
+    with pytest.raises(catalog.CatalogError) as info:
+        catalog.load_catalog(str(path), chunk_size=3)
+    assert [line for line, _ in info.value.errors] == [2, 3, 4, 6, 7, 8, 9]
+    assert "duplicate product name 'Phone'" in str(info.value)
@@ -0,0 +1,99 @@
+import pytest
+
+from products import Product, NonStockedProduct, LimitedProduct
+
+# columnar needs numpy, which is optional.
+columnar = pytest.importorskip("columnar")
+
+
+def make_store():
+    return columnar.ColumnarStore([
+        Product("MacBook Air M2", price=1450, quantity=100),
+        NonStockedProduct("Windows License", price=125),
+        LimitedProduct("Shipping", price=10, quantity=250,
+                       max_quantity_per_order=1),
+    ])
+
+
+# Test that the columns follow sales, deactivation and removal.
+def test_columns_follow_products():
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    assert best_buy.get_total_quantity() == 350
+    best_buy.order([(macbook, 100)])
+    assert best_buy.get_total_quantity() == 250
+    assert macbook not in best_buy.get_all_products()
+    best_buy.remove_product(best_buy.get_product("Shipping"))
+    assert best_buy.get_total_quantity() == 0
+    assert best_buy.get_quantity_by_type() == {
+        columnar.PRODUCT: 0, columnar.NON_STOCKED: 0, columnar.LIMITED: 0}
+
+
+def assert_columns_match(best_buy):
+    for product in best_buy.product_list:
+        seq = best_buy._seq_by_id[id(product)]
+        assert best_buy.types[seq] == columnar.type_code(product)
+        assert best_buy.price_cents[seq] == product.price_cents
+        assert best_buy.quantities[seq] == product.quantity
+        assert best_buy.active[seq] == product.is_active()
+
+
+# Test that every column matches its product after buying, setting
+# the quantity, deactivating and holding stock.
+def test_columns_match_products():
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    license_ = best_buy.get_product("Windows License")
+    shipping = best_buy.get_product("Shipping")
+    assert_columns_match(best_buy)
+    best_buy.order([(macbook, 3), (license_, 5), (shipping, 1)])
+    assert_columns_match(best_buy)
+    macbook.set_quantity(40)
+    shipping.set_quantity(0)
+    assert_columns_match(best_buy)
+    license_.deactivate()
+    assert_columns_match(best_buy)
+    best_buy.hold(macbook, 15, ttl=60)
+    assert_columns_match(best_buy)
+    assert best_buy.get_total_quantity() == 40
+    assert best_buy.check_stock([(macbook, 25), (macbook, 26)]).tolist() == [
+        True, False]
+
+
+# Test that the columns grow past their initial capacity.
+def test_columns_grow():
+    catalog = [Product(f"sku-{i}", price=1, quantity=1)
+               for i in range(3000)]
+    best_buy = columnar.ColumnarStore(catalog[:10])
+    for product in catalog[10:]:
+        best_buy.add_product(product)
+    assert best_buy.get_total_quantity() == 3000
+    assert len(best_buy.get_all_products()) == 3000
+
+
+# Test the vectorized stock check against the product state.
+def test_check_stock():
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    license_ = best_buy.get_product("Windows License")
+    stranger = Product("Not in store", price=1, quantity=5)
+    result = best_buy.check_stock(
+        [(macbook, 100), (macbook, 101), (license_, 1000), (stranger, 1)])
+    assert result.tolist() == [True, False, True, False]
+
+
+# Test that units held for carts count as unavailable.
+def test_check_stock_with_holds():
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    hold = best_buy.hold(macbook, 30, ttl=60)
+    result = best_buy.check_stock([(macbook, 70), (macbook, 71)])
+    assert result.tolist() == [True, False]
+    best_buy.release(hold)
+    assert best_buy.check_stock([(macbook, 71)]).tolist() == [True]
+
+
+# Test that the quote cache size reaches the base store.
+def test_quote_cache_size():
+    best_buy = columnar.ColumnarStore([], quote_cache_size=2)
+    assert best_buy.quote_cache_info()["maxsize"] == 2
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+import events
+from products import Product
+from promotions import ThirdOneFree
+from store import Store
+
+
+@pytest.fixture
+def ring():
+    sink = events.RingBufferSink(capacity=100)
+    events.set_sink(sink)
+    yield sink
+    events.set_sink(None)
+
+
+# Test that an order emits purchase, promotion, rejection and
+# deactivation events, and prints nothing.
+def test_order_events(ring, capsys):
+    earbuds = Product("Bose QuietComfort Earbuds", price=250, quantity=3)
+    earbuds.set_promotion(ThirdOneFree("Third One Free!"))
+    best_buy = Store([earbuds])
+    best_buy.order([(earbuds, 3), (earbuds, 1)])
+    assert [event.kind for event in ring.events()] == [
+        events.PROMOTION_APPLIED, events.PURCHASE, events.DEACTIVATED,
+        events.REJECTED]
+    purchase = ring.events(events.PURCHASE)[0]
+    assert purchase.product == "Bose QuietComfort Earbuds"
+    assert purchase.data == {"price_cents": 50000}
+    assert ring.events(events.REJECTED)[0].data["reason"] == "inactive"
+    assert capsys.readouterr().out == ""
+
+
+# Test that order_many emits the same events as order.
+def test_order_many_events(ring):
+    def place(batched):
+        earbuds = Product("Bose QuietComfort Earbuds", price=250,
+                          quantity=3)
+        earbuds.set_promotion(ThirdOneFree("Third One Free!"))
+        best_buy = Store([earbuds])
+        orders = [[(earbuds, 1)], [(earbuds, 2)]]
+        if batched:
+            best_buy.order_many(orders)
+        else:
+            for shopping_list in orders:
+                best_buy.order(shopping_list)
+        kinds = [(event.kind, event.quantity) for event in ring.events()]
+        ring.clear()
+        return kinds
+
+    assert place(True) == place(False)
+
+
+# Test that the ring buffer keeps only the newest events.
+def test_ring_buffer_capacity():
+    sink = events.RingBufferSink(capacity=2)
+    for quantity in range(5):
+        sink.emit(events.Event(0.0, events.PURCHASE, "p", quantity, {}))
+    assert [event.quantity for event in sink.events()] == [3, 4]
+
+
+# Test that the file sink writes every event as JSON Lines by the time
+# it is closed.
+def test_file_sink(tmp_path):
+    path = tmp_path / "events.jsonl"
+    sink = events.FileSink(str(path), batch_size=7)
+    events.set_sink(sink)
+    try:
+        best_buy = Store([Product("Google Pixel 7", price=500,
+                                  quantity=1000)])
+        for _ in range(50):
+            best_buy.order([(best_buy.get_product("Google Pixel 7"), 2)])
+    finally:
+        events.set_sink(None)
+        sink.close()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 50
+    assert records[0]["kind"] == "purchase"
+    assert records[0]["price_cents"] == 100000
+
+
+# Test that the console sink prints what the menu always printed.
+def test_console_sink(capsys):
+    events.set_sink(events.ConsoleSink())
+    try:
+        product = Product("Test Product", price=10, quantity=1)
+        product.set_promotion(ThirdOneFree("Third One Free!"))
+        Store([product]).order([(product, 1), (product, 1)])
+    finally:
+        events.set_sink(None)
+    assert capsys.readouterr().out.splitlines() == [
+        "Applying promotion: Third One Free! to Test Product",
+        "Error: Product 'Test Product' is not active and cannot be "
+        "ordered."]
+
+
+# Test that events emitted after close are counted as dropped.
+def test_file_sink_after_close(tmp_path):
+    path = tmp_path / "events.jsonl"
+    sink = events.FileSink(str(path))
+    sink.close()
+    sink.emit(events.Event(0.0, events.PURCHASE, "p", 1, {}))
+    assert sink.dropped == 1
+    assert path.read_text() == ""
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import loadgen
+from products import LimitedProduct, NonStockedProduct, Product
+
+
+# Test that the catalog mixes every product type and promotions, and
+# is the same for the same seed.
+def test_make_catalog():
+    product_list = loadgen.make_catalog(500, seed=3)
+    kinds = {type(product) for product in product_list}
+    assert kinds == {Product, NonStockedProduct, LimitedProduct}
+    assert any(product.promotion for product in product_list)
+    again = loadgen.make_catalog(500, seed=3)
+    assert ([product.show() for product in product_list] ==
+            [product.show() for product in again])
+
+
+# Test that carts follow the cart size distribution, favour popular
+# products and respect per-order limits.
+def test_make_carts():
+    product_list = loadgen.make_catalog(200, seed=1)
+    ranking = list(range(200))
+    cum_weights = loadgen.zipf_weights(200, 1.2)
+    carts = loadgen.make_carts(product_list, ranking, cum_weights, 7, 500,
+                               1, "uniform", 3)
+    assert carts == loadgen.make_carts(product_list, ranking, cum_weights,
+                                       7, 500, 1, "uniform", 3)
+    assert {len(cart) for cart in carts} == {1, 2, 3, 4, 5}
+    counts = [0] * 200
+    for cart in carts:
+        assert len({product.name for product, _ in cart}) == len(cart)
+        for product, quantity in cart:
+            counts[product_list.index(product)] += 1
+            assert quantity <= getattr(product, "max_quantity_per_order", 3)
+    assert counts[0] > counts[10] > counts[150]
+    rng = random.Random(0)
+    assert {loadgen.draw_cart_size(rng, "fixed", 4) for _ in range(20)} == {4}
+
+
+# Test that a single-threaded run is reproducible and that stockouts
+# appear once popular products sell out.
+def test_run_reproducible():
+    options = {"product_count": 50, "shoppers": 20, "orders": 10,
+               "threads": 1, "max_stock": 5, "seed": 2}
+    report = loadgen.run(**options)
+    again = loadgen.run(**options)
+    for key in ("orders", "lines", "stockout_lines", "rejected", "revenue"):
+        assert report[key] == again[key]
+    assert report["orders"] == 200
+    assert report["stockout_lines"] > 0
+    assert 0 < report["stockout_rate"] < 1
+    assert report["revenue"] > 0
+    assert set(report["latency_ms"]) == {"p50", "p90", "p99", "max"}
+    assert "throughput" in loadgen.format_report(report)
+    with pytest.raises(ValueError):
+        loadgen.run(cart="normal")
@@ -0,0 +1,60 @@
+import pytest
+
+import metrics
+from products import Product, LimitedProduct
+from promotions import ThirdOneFree
+from store import Store
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.REGISTRY.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.REGISTRY.reset()
+
+
+# Test that orders, buys, promotions and rejections are counted.
+def test_order_metrics(enabled_metrics, capsys):
+    earbuds = Product("Bose QuietComfort Earbuds", price=250, quantity=5)
+    earbuds.set_promotion(ThirdOneFree("Third One Free!"))
+    shipping = LimitedProduct("Shipping", price=10, quantity=250,
+                              max_quantity_per_order=1)
+    best_buy = Store([earbuds, shipping])
+    best_buy.order([(earbuds, 3), (earbuds, 3), (earbuds, 0)])
+    with pytest.raises(Exception):
+        best_buy.order([(shipping, 2)])
+
+    snapshot = metrics.snapshot()
+    assert snapshot["bestbuy_orders_total"] == {None: 1}
+    assert snapshot["bestbuy_buys_total"] == {None: 1}
+    assert snapshot["bestbuy_rejected_lines_total"] == {
+        "insufficient_stock": 1, "invalid_quantity": 1, "order_limit": 1}
+    promotion = snapshot["bestbuy_promotion_seconds"]["ThirdOneFree"]
+    assert promotion["count"] == 1
+
+    text = metrics.to_prometheus()
+    assert "# TYPE bestbuy_order_seconds histogram" in text
+    assert 'bestbuy_rejected_lines_total{reason="order_limit"} 1' in text
+    assert 'bestbuy_order_seconds_bucket{le="+Inf"} 1' in text
+
+
+# Test that nothing is recorded while metrics are disabled.
+def test_disabled_metrics_record_nothing(capsys):
+    metrics.REGISTRY.reset()
+    best_buy = Store([Product("Google Pixel 7", price=500, quantity=5)])
+    best_buy.order([(best_buy.get_product("Google Pixel 7"), 9)])
+    assert metrics.snapshot()["bestbuy_orders_total"] == {}
+
+
+# Test that histogram label values are escaped like counter labels.
+def test_histogram_label_escaping():
+    histogram = metrics.Histogram("test_seconds", "Test", buckets=(1,),
+                                  label_name="type")
+    histogram.observe(0.5, 'a\\b"c')
+    assert histogram.to_prometheus()[2:] == [
+        'test_seconds_bucket{type="a\\\\b\\"c",le="1"} 1',
+        'test_seconds_bucket{type="a\\\\b\\"c",le="+Inf"} 1',
+        'test_seconds_sum{type="a\\\\b\\"c"} 0.5',
+        'test_seconds_count{type="a\\\\b\\"c"} 1']
@@ -0,0 +1,40 @@
+import pytest
+
+import money
+from products import Product
+from promotions import PercentDiscount, RulePromotion, SecondHalfPrice
+from store import Store
+
+
+# Test conversion to cents, including floats that are not exact in
+# binary and rounding of sub-cent amounts.
+def test_to_cents():
+    assert money.to_cents(1450) == 145000
+    assert money.to_cents(19.99) == 1999
+    assert money.to_cents(0.125) == 13
+    assert money.to_cents("2.675") == 268
+    assert money.format_cents(145000) == "1450.00"
+    assert money.format_cents(-5) == "-0.05"
+    with pytest.raises(ValueError):
+        money.to_cents(float('nan'))
+
+
+# Test the documented rounding of percentage and half price deals.
+def test_rounding_rules():
+    assert money.discount(999, 5000) == 500
+    product = Product("Test Product", price=9.99, quantity=100)
+    assert SecondHalfPrice("Half").apply_promotion_cents(product, 2) == 1498
+    assert PercentDiscount("33.33% off", percent=33.33).apply_promotion_cents(
+        product, 3) == 3 * (999 - 333)
+    threshold = RulePromotion("Spend", {"type": "spend_threshold",
+                                        "threshold": 10, "percent": 15})
+    assert threshold.apply_promotion_cents(product, 3) == 2997 - 450
+
+
+# Test that large orders total exactly instead of drifting.
+def test_order_totals_are_exact():
+    catalog = [Product(f"sku-{i}", price=0.1, quantity=10)
+               for i in range(1000)]
+    best_buy = Store(catalog)
+    assert best_buy.order([(product, 3) for product in catalog]) == 300.0
+    assert sum(0.1 * 3 for _ in catalog) != 300.0
@@ -0,0 +1,132 @@
+import os
+import stat
+import threading
+
+import pytest
+
+import persistence
+from products import Product, NonStockedProduct
+from store import Store
+
+
+def make_store():
+    return Store([
+        Product("MacBook Air M2", price=1450, quantity=100),
+        Product("Google Pixel 7", price=500, quantity=250),
+        NonStockedProduct("Windows License", price=125),
+    ])
+
+
+# Test that sales survive a restart through the journal.
+def test_recover_from_journal(tmp_path):
+    best_buy = make_store()
+    log = persistence.open_log(str(tmp_path), best_buy)
+    best_buy.order([(best_buy.get_product("MacBook Air M2"), 10)])
+    best_buy.order([(best_buy.get_product("Google Pixel 7"), 250)])
+    best_buy.get_product("Windows License").deactivate()
+    assert log.wait_durable(timeout=5)
+    log.close()
+
+    restarted = make_store()
+    log = persistence.InventoryLog(str(tmp_path))
+    assert log.recover(restarted) == 3
+    assert restarted.get_product("MacBook Air M2").get_quantity() == 90
+    assert not restarted.get_product("Google Pixel 7").is_active()
+    assert not restarted.get_product("Windows License").is_active()
+
+
+# Test that snapshots replace old journal segments and recovery
+# combines the snapshot with the journal tail.
+def test_recover_from_snapshot_and_tail(tmp_path):
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    log = persistence.open_log(str(tmp_path), best_buy)
+    for _ in range(5):
+        best_buy.order([(macbook, 1)])
+    log.snapshot()
+    best_buy.order([(macbook, 2)])
+    log.close()
+    segments = [name for name in os.listdir(tmp_path)
+                if name.startswith("journal-")]
+    assert len(segments) == 1
+
+    restarted = make_store()
+    log = persistence.InventoryLog(str(tmp_path))
+    assert log.recover(restarted) == 1
+    assert restarted.get_product("MacBook Air M2").get_quantity() == 93
+
+
+# Test that a torn record at the end of the journal is ignored.
+def test_torn_journal_tail_is_ignored(tmp_path):
+    best_buy = make_store()
+    log = persistence.open_log(str(tmp_path), best_buy)
+    best_buy.order([(best_buy.get_product("MacBook Air M2"), 10)])
+    log.close()
+    segment = [name for name in os.listdir(tmp_path)
+               if name.startswith("journal-")][0]
+    with open(tmp_path / segment, "ab") as journal_file:
+        journal_file.write(b"\x01\x02\x03torn")
+
+    restarted = make_store()
+    persistence.InventoryLog(str(tmp_path)).recover(restarted)
+    assert restarted.get_product("MacBook Air M2").get_quantity() == 90
+
+
+# Test that a buy does not wait for a slow fsync of an earlier batch.
+def test_buy_does_not_wait_for_fsync(tmp_path, monkeypatch):
+    syncing = threading.Event()
+    release = threading.Event()
+    real_fsync = os.fsync
+
+    def slow_fsync(descriptor):
+        syncing.set()
+        release.wait(10)
+        real_fsync(descriptor)
+
+    monkeypatch.setattr(persistence.os, "fsync", slow_fsync)
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    log = persistence.open_log(str(tmp_path), best_buy)
+    try:
+        macbook.buy(1)
+        assert syncing.wait(5)
+        buyer = threading.Thread(target=macbook.buy, args=(1,))
+        buyer.start()
+        buyer.join(2)
+        assert not buyer.is_alive()
+        assert macbook.get_quantity() == 98
+    finally:
+        release.set()
+    assert log.wait_durable(timeout=5)
+    log.close()
+
+
+# Test that a failed journal write is raised to waiters instead of
+# leaving them blocked.
+def test_write_error_reaches_waiters(tmp_path, monkeypatch):
+    def failing_fsync(descriptor):
+        raise OSError("disk full")
+
+    best_buy = make_store()
+    log = persistence.open_log(str(tmp_path), best_buy)
+    monkeypatch.setattr(persistence.os, "fsync", failing_fsync)
+    best_buy.get_product("MacBook Air M2").buy(1)
+    with pytest.raises(OSError, match="disk full"):
+        log.wait_durable()
+    with pytest.raises(OSError, match="disk full"):
+        log.close()
+
+
+# Test that the rename of a new snapshot is flushed to the directory.
+def test_snapshot_syncs_directory(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+
+    def recording_fsync(descriptor):
+        synced.append(stat.S_ISDIR(os.fstat(descriptor).st_mode))
+        real_fsync(descriptor)
+
+    monkeypatch.setattr(persistence.os, "fsync", recording_fsync)
+    path = str(tmp_path / persistence.SNAPSHOT_FILE)
+    persistence.write_snapshot(path, 0, make_store().product_list)
+    assert synced == [False, True]
@@ -1,5 +1,7 @@
 import pytest
-from products import Product
+from products import Product, LimitedProduct
+from promotions import PercentDiscount
+from store import Store
 
 
 # Test that creating a normal product works.
@@ -45,4 +47,32 @@ def test_purchase_too_large_exception():
         product.buy(10)
 
 
+# Test that products have no per-instance dict and that equal
+# promotions are shared between products.
+def test_product_is_compact():
+    product = Product("Test Product", price=100.0, quantity=10)
+    limited = LimitedProduct("Limited Product", price=10.0, quantity=5,
+                             max_quantity_per_order=1)
+    assert not hasattr(product, "__dict__")
+    assert not hasattr(limited, "__dict__")
+    product.set_promotion(PercentDiscount("30% off!", percent=30))
+    limited.set_promotion(PercentDiscount("30% off!", percent=30))
+    assert product.promotion is limited.promotion
+    limited.set_promotion(PercentDiscount("30% off!", percent=20))
+    assert product.promotion is not limited.promotion
+
+
+# Test that assigning the price goes through set_price: it is
+# validated and the store's totals follow it.
+def test_price_assignment():
+    product = Product("Test Product", price=100.0, quantity=10)
+    best_buy = Store([product])
+    product.price = 12.5
+    assert product.price == 12.5
+    assert best_buy.get_stock_value() == 125
+    with pytest.raises(ValueError):
+        product.price = -1
+    assert product.price == 12.5
+
+
 pytest.main()
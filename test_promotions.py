@@ -0,0 +1,146 @@
+import gc
+import random
+
+import pytest
+
+import money
+from products import Product
+import promotions
+from promotions import (PercentDiscount, RulePromotion, SecondHalfPrice,
+                        ThirdOneFree)
+
+
+def price(rule, quantity, unit_price=10):
+    product = Product("Test Product", price=unit_price, quantity=10 ** 6)
+    return RulePromotion("Test", rule).apply_promotion(product, quantity)
+
+
+# Test that the built-in promotions keep their prices.
+def test_builtin_promotions():
+    product = Product("Test Product", price=100.0, quantity=10)
+    assert PercentDiscount("30% off!", percent=30).apply_promotion(
+        product, 2) == 140.0
+    assert SecondHalfPrice("Second Half price!").apply_promotion(
+        product, 3) == 250.0
+    assert ThirdOneFree("Third One Free!").apply_promotion(
+        product, 7) == 500.0
+
+
+# Test every rule type with quantities below and above its
+# thresholds.
+def test_rule_types():
+    buy_two_get_one_half = {"type": "buy_x_get_y", "buy": 2, "get": 1,
+                            "percent_off": 50}
+    assert price(buy_two_get_one_half, 2) == 20
+    assert price(buy_two_get_one_half, 7) == 60
+    tiered = {"type": "tiered_percent", "tiers": [[50, 10], [10, 5]]}
+    assert price(tiered, 9) == 90
+    assert price(tiered, 10) == 95
+    assert price(tiered, 50) == 450
+    bundle = {"type": "bundle", "size": 3, "price": 25}
+    assert price(bundle, 7) == 60
+    threshold = {"type": "spend_threshold", "threshold": 100,
+                 "percent": 10}
+    assert price(threshold, 9) == 90
+    assert price(threshold, 10) == 90
+
+
+# Test that malformed rules are rejected when the promotion is made.
+def test_invalid_rules():
+    with pytest.raises(ValueError):
+        RulePromotion("Bad", {"type": "mystery"})
+    with pytest.raises(ValueError):
+        RulePromotion("Bad", {"type": "buy_x_get_y", "buy": 0, "get": 1})
+    with pytest.raises(ValueError):
+        RulePromotion("Bad", {"type": "percent", "percent": 120})
+    for tiers in (5, [5], [[10]], [[10, 5, 1]], ["ab"], [None]):
+        with pytest.raises(ValueError):
+            RulePromotion("Bad", {"type": "tiered_percent",
+                                  "tiers": tiers})
+
+
+def reference_cents(rule, unit, quantity):
+    """
+    Price a line unit by unit, the slow way, for comparison with the
+    compiled rules.
+    """
+    def off(cents, percent):
+        return money.discount(cents, money.to_basis_points(percent))
+
+    kind = rule["type"]
+    if kind == "percent":
+        return sum(unit - off(unit, rule["percent"])
+                   for _ in range(quantity))
+    if kind == "buy_x_get_y":
+        group = rule["buy"] + rule["get"]
+        return sum(unit - off(unit, rule["percent_off"])
+                   if position % group >= rule["buy"] else unit
+                   for position in range(quantity))
+    if kind == "tiered_percent":
+        percent = 0
+        for min_quantity, tier_percent in sorted(rule["tiers"]):
+            if quantity >= min_quantity:
+                percent = tier_percent
+        return sum(unit - off(unit, percent) for _ in range(quantity))
+    if kind == "bundle":
+        full, rest = divmod(quantity, rule["size"])
+        return full * money.to_cents(rule["price"]) + rest * unit
+    subtotal = unit * quantity
+    if subtotal < money.to_cents(rule["threshold"]):
+        return subtotal
+    return subtotal - off(subtotal, rule["percent"])
+
+
+# Test the compiled rules against a unit by unit reference on random
+# rules, prices and quantities.
+def test_rules_match_reference():
+    rng = random.Random(5)
+    for _ in range(300):
+        kind = rng.choice(["percent", "buy_x_get_y", "tiered_percent",
+                           "bundle", "spend_threshold"])
+        percent = rng.choice([0, 12.5, 30, 33.33, 50, 100])
+        rule = {
+            "percent": {"type": kind, "percent": percent},
+            "buy_x_get_y": {"type": kind, "buy": rng.randint(1, 4),
+                            "get": rng.randint(1, 3),
+                            "percent_off": percent},
+            "tiered_percent": {"type": kind, "tiers": [
+                [rng.randint(1, 30), rng.choice([5, 12.5, 40])]
+                for _ in range(rng.randint(1, 3))]},
+            "bundle": {"type": kind, "size": rng.randint(1, 5),
+                       "price": rng.randint(1, 5000) / 100},
+            "spend_threshold": {"type": kind,
+                                "threshold": rng.randint(0, 500),
+                                "percent": percent},
+        }[kind]
+        promotion = RulePromotion("Random", rule)
+        product = Product("Test Product", price=rng.randint(1, 9999) / 100,
+                          quantity=10 ** 6)
+        quantities = [rng.randint(0, 40) for _ in range(5)]
+        expected = [reference_cents(rule, product.price_cents, quantity)
+                    for quantity in quantities]
+        assert [promotion.apply_promotion_cents(product, quantity)
+                for quantity in quantities] == expected
+        assert promotion.apply_promotion_many_cents(
+            product, quantities) == expected
+        assert [promotion.apply_promotion(product, quantity)
+                for quantity in quantities] == [
+            cents / money.CENTS for cents in expected]
+
+
+# Test that interning keeps subclass state apart and lets go of
+# promotions nothing uses.
+def test_intern_subclass_state_and_release():
+    class Clearance(PercentDiscount):
+        def __init__(self, name, percent, region):
+            super().__init__(name, percent)
+            self.region = region
+
+    north = promotions.intern(Clearance("Clearance", 40, "north"))
+    south = promotions.intern(Clearance("Clearance", 40, "south"))
+    assert south is not north
+    assert promotions.intern(Clearance("Clearance", 40, "north")) is north
+    key = north.intern_key()
+    del north
+    gc.collect()
+    assert key not in promotions._interned
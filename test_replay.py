@@ -0,0 +1,57 @@
+import io
+import json
+
+import pytest
+
+import main
+import replay
+from products import Product
+from store import Store
+
+
+# Test that replayed orders are written in order with their errors.
+def test_replay_streams_results():
+    best_buy = Store([Product("Google Pixel 7", price=500, quantity=3)])
+    orders = io.StringIO(
+        '{"id": 1, "lines": [{"product": "Google Pixel 7", "quantity": 2}]}\n'
+        '\n'
+        'not json\n'
+        '{"id": 3, "lines": [{"product": "Google Pixel 7", "quantity": 2},'
+        ' {"product": "Pager", "quantity": 1}]}\n'
+        '{"id": 4, "lines": [{"product": "Google Pixel 7", "quantity": 1}]}\n'
+        '{"lines": [{"product": "Pager", "quantity": 1}]}\n')
+    output = io.StringIO()
+    assert replay.replay(best_buy, orders, output, batch_size=2) == 5
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert results[0] == {"id": 1, "total": 1000.0, "errors": []}
+    assert results[1] == {"line": 3, "error": "Record is not a JSON object"}
+    assert results[2]["id"] == 3
+    assert results[2]["total"] == 0.0
+    assert len(results[2]["errors"]) == 2
+    assert results[3] == {"id": 4, "total": 500.0, "errors": []}
+    assert results[4] == {"line": 6, "total": 0.0, "errors": [
+        "Unknown product: 'Pager'"]}
+    assert best_buy.get_total_quantity() == 0
+
+
+# Test that malformed records are reported on their own result line
+# without stopping the replay, and that batches must not be empty.
+def test_malformed_records():
+    best_buy = Store([Product("Google Pixel 7", price=500, quantity=3)])
+    orders = io.StringIO(
+        '{"id": 1, "lines": 5}\n'
+        '{"id": 2, "lines": [{"product": ["Google Pixel 7"], '
+        '"quantity": 1}]}\n'
+        '{"id": 3, "lines": [{"product": "Google Pixel 7", '
+        '"quantity": true}]}\n'
+        '{"id": 4, "lines": [{"product": "Google Pixel 7", "quantity": 1}]}\n')
+    output = io.StringIO()
+    assert replay.replay(best_buy, orders, output) == 4
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [len(result["errors"]) for result in results] == [1, 1, 1, 0]
+    assert results[3]["total"] == 500.0
+    assert best_buy.get_total_quantity() == 2
+    with pytest.raises(ValueError):
+        replay.replay(best_buy, io.StringIO(""), io.StringIO(), batch_size=0)
+    with pytest.raises(SystemExit):
+        main.parse_args(["--batch-size", "0"])
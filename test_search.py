@@ -0,0 +1,102 @@
+import random
+import threading
+
+from products import Product
+from search import SearchIndex, trigrams
+from store import Store
+
+
+def make_store():
+    return Store([
+        Product("MacBook Air M2", price=1450, quantity=100),
+        Product("MacBook Pro 14", price=2000, quantity=10),
+        Product("Bose QuietComfort Earbuds", price=250, quantity=500),
+        Product("Google Pixel 7", price=500, quantity=250),
+    ])
+
+
+# Test exact, prefix and fuzzy lookups ignoring case.
+def test_find_prefix_and_fuzzy():
+    best_buy = make_store()
+    assert best_buy.find("macbook  air m2").name == "MacBook Air M2"
+    assert best_buy.find("MacBook") is None
+    assert [p.name for p in best_buy.find_prefix("macb")] == [
+        "MacBook Air M2", "MacBook Pro 14"]
+    assert best_buy.find_prefix("macb", limit=1)[0].name == "MacBook Air M2"
+    assert best_buy.search("Gogle Pixle")[0].name == "Google Pixel 7"
+    assert best_buy.search("zzzz") == []
+
+
+# Test that the index follows additions, removals and deactivation
+# after it was built.
+def test_index_is_maintained():
+    best_buy = make_store()
+    assert best_buy.find("Google Pixel 7") is not None
+    pixel = best_buy.get_product("Google Pixel 7")
+    pixel.set_quantity(0)
+    assert best_buy.find("Google Pixel 7") is None
+    assert best_buy.search("Google Pixel") == []
+    pixel.set_quantity(5)
+    pixel.activate()
+    assert best_buy.find("google pixel 7") is pixel
+    best_buy.remove_product(pixel)
+    assert best_buy.find("Google Pixel 7") is None
+    best_buy.add_product(Product("Google Pixel 8", price=600, quantity=1))
+    assert [p.name for p in best_buy.find_prefix("google")] == [
+        "Google Pixel 8"]
+
+
+# Test fuzzy search against a brute-force ranking of random names.
+def test_fuzzy_matches_brute_force():
+    rng = random.Random(3)
+    words = ["air", "pro", "max", "mini", "ultra", "plus", "lite"]
+    names = {i: " ".join(rng.choice(words) for _ in range(3)) + f" {i}"
+             for i in range(300)}
+    index = SearchIndex()
+    index.add_many(list(names.items())[:150])
+    for key, name in list(names.items())[150:]:
+        index.add(key, name)
+    for key in range(0, 300, 7):
+        index.remove(key)
+        del names[key]
+    for query in ("ultra mxa pro 1", "mini lite 2", "pro plsu max 14"):
+        wanted = trigrams(query)
+        expected = []
+        for key, name in names.items():
+            grams = trigrams(name)
+            shared = len(wanted & grams)
+            if shared >= len(wanted) / 2:
+                expected.append((-shared / len(wanted | grams), key))
+        expected.sort()
+        for limit in (1, 8):
+            assert index.fuzzy(query, limit=limit) == [
+                (key, -score) for score, key in expected[:limit]]
+
+
+# Test that orders and other changes go on while the search index is
+# built, and that the index picks them up.
+def test_build_does_not_block_orders(monkeypatch):
+    best_buy = make_store()
+    pixel = best_buy.get_product("Google Pixel 7")
+    building = threading.Event()
+    resume = threading.Event()
+    add_many = SearchIndex.add_many
+
+    def slow_add_many(self, entries):
+        building.set()
+        assert resume.wait(5)
+        add_many(self, entries)
+
+    monkeypatch.setattr(SearchIndex, "add_many", slow_add_many)
+    found = []
+    searcher = threading.Thread(
+        target=lambda: found.extend(best_buy.find_prefix("")))
+    searcher.start()
+    assert building.wait(5)
+    assert best_buy.order([(pixel, 250)]) == 125000
+    best_buy.add_product(Product("Google Pixel 8", price=600, quantity=1))
+    resume.set()
+    searcher.join()
+    assert [product.name for product in found] == [
+        "Bose QuietComfort Earbuds", "Google Pixel 8", "MacBook Air M2",
+        "MacBook Pro 14"]
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import server
+from products import Product, NonStockedProduct
+from promotions import ThirdOneFree
+from server import OrderServer
+from store import Store
+
+
+def make_store():
+    earbuds = Product("Bose QuietComfort Earbuds", price=250, quantity=10)
+    earbuds.set_promotion(ThirdOneFree("Third One Free!"))
+    return Store([earbuds, NonStockedProduct("Windows License", price=125)])
+
+
+async def send(requests):
+    server = OrderServer(make_store())
+    port = await server.start(port=0)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    for request in requests:
+        if not isinstance(request, bytes):
+            request = json.dumps(request).encode() + b"\n"
+        writer.write(request)
+        await writer.drain()
+        responses.append(json.loads(await reader.readline()))
+    writer.close()
+    await server.close()
+    return responses
+
+
+# Test the list, total, quote and order operations over a socket.
+def test_operations():
+    lines = [{"product": "Bose QuietComfort Earbuds", "quantity": 3}]
+    listing, total, quote, order, after = asyncio.run(send([
+        {"op": "list"},
+        {"op": "total"},
+        {"op": "quote", "lines": lines},
+        {"op": "order", "lines": lines},
+        {"op": "total"},
+    ]))
+    assert [item["name"] for item in listing["result"]] == [
+        "Bose QuietComfort Earbuds", "Windows License"]
+    assert total["result"] == 10
+    assert quote["result"] == {"total": 500.0, "errors": []}
+    assert order["result"] == {"total": 500.0, "errors": []}
+    assert after["result"] == 7
+
+
+# Test that bad requests get an error response and keep the
+# connection usable.
+def test_bad_requests():
+    unknown_op, unknown_product, too_many, total = asyncio.run(send([
+        {"op": "refund"},
+        {"op": "order", "lines": [{"product": "Nope", "quantity": 1}]},
+        {"op": "order", "lines": [
+            {"product": "Bose QuietComfort Earbuds", "quantity": 11}]},
+        {"op": "total"},
+    ]))
+    assert not unknown_op["ok"]
+    assert not unknown_product["ok"]
+    assert too_many["result"]["errors"]
+    assert total["result"] == 10
+
+
+# Test that list pages through the products and rejects bad offsets
+# and limits.
+def test_list_pages():
+    page, rest, negative, text, flag = asyncio.run(send([
+        {"op": "list", "offset": 0, "limit": 1},
+        {"op": "list", "offset": 1},
+        {"op": "list", "offset": -1},
+        {"op": "list", "limit": "10"},
+        {"op": "list", "limit": True},
+    ]))
+    assert [item["name"] for item in page["result"]] == [
+        "Bose QuietComfort Earbuds"]
+    assert [item["name"] for item in rest["result"]] == [
+        "Windows License"]
+    assert not negative["ok"]
+    assert not text["ok"]
+    assert not flag["ok"]
+
+
+# Test that an over-long request line is skipped with an error and
+# the next request is still answered.
+def test_line_too_long():
+    padding = " " * (server.MAX_LINE * 3)
+    too_long, total = asyncio.run(send([
+        b'{"op": "total",' + padding.encode() + b'"x": 1}\n',
+        {"op": "total"},
+    ]))
+    assert not too_long["ok"]
+    assert "too long" in too_long["error"]
+    assert total["result"] == 10
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from products import LimitedProduct, NonStockedProduct, Product
+from promotions import SecondHalfPrice, ThirdOneFree
+from sharded import ShardedStore, shard_for
+from store import OrderError, Store
+
+
+def make_catalog():
+    catalog = [Product(f"sku-{i}", price=1 + i % 7 * 2.5, quantity=40)
+               for i in range(24)]
+    catalog[0].set_promotion(SecondHalfPrice("Second Half price!"))
+    catalog[1].set_promotion(ThirdOneFree("Third One Free!"))
+    catalog.append(NonStockedProduct("Windows License", price=125))
+    catalog.append(LimitedProduct("Shipping", price=10, quantity=250,
+                                  max_quantity_per_order=1))
+    return catalog
+
+
+@pytest.fixture
+def sharded():
+    with ShardedStore(make_catalog(), shards=3) as sharded_store:
+        yield sharded_store
+
+
+# Test that products are spread over the shards by a stable key.
+def test_shard_for_is_stable():
+    assert shard_for("sku-1", 4) == shard_for("sku-1", 4)
+    assert len({shard_for(f"sku-{i}", 4) for i in range(100)}) == 4
+
+
+# Test that sharded orders give the same totals, errors and stock as
+# one store.
+def test_order_many_matches_store(sharded):
+    single = Store(make_catalog())
+    rng = random.Random(3)
+    names = [product.name for product in single.product_list
+             if product.name != "Shipping"]
+    orders = [[(rng.choice(names), rng.randint(-1, 12))
+               for _ in range(rng.randint(1, 5))] for _ in range(200)]
+    expected = single.order_many([[(single.get_product(name), quantity)
+                                   for name, quantity in shopping_list]
+                                  for shopping_list in orders])
+    assert sharded.order_many(orders) == expected
+    assert sharded.get_total_quantity() == single.get_total_quantity()
+    assert ([product.name for product in sharded.get_all_products()] ==
+            [product.name for product in single.get_all_products()])
+    with pytest.raises(ValueError):
+        sharded.order([("Unknown", 1)])
+
+
+# Test that an atomic order across shards is applied completely or
+# not at all.
+def test_order_atomic_across_shards(sharded):
+    first, second = "sku-0", next(
+        f"sku-{i}" for i in range(1, 24)
+        if shard_for(f"sku-{i}", 3) != shard_for("sku-0", 3))
+    assert sharded.order_atomic([(first, 2), (second, 3)]) == 1.5 + 7
+    with pytest.raises(OrderError) as error:
+        sharded.order_atomic([(first, 4), (second, 100), ("Shipping", 2)])
+    assert [line.index for line in error.value.line_errors] == [1, 2]
+    assert sharded.get_product(first).get_quantity() == 38
+    assert sharded.get_product(second).get_quantity() == 37
+    sharded.order_atomic([(first, 38), (second, 37)])
+    assert not sharded.get_product(first).is_active()
+    assert sharded.get_total_quantity() == 22 * 40 + 250
+
+
+class FailingProduct(Product):
+    """
+    A product whose stock check fails, to make a shard raise.
+    """
+    __slots__ = ()
+
+    def get_quantity(self):
+        raise RuntimeError("stock check failed")
+
+
+# Test that a shard raising mid-order leaves no stale reply behind and
+# no stock reserved on the other shards.
+def test_shard_failure_drains_and_aborts():
+    broken = FailingProduct("broken", price=1, quantity=5)
+    other = next(f"sku-{i}" for i in range(100)
+                 if shard_for(f"sku-{i}", 2) != shard_for("broken", 2))
+    catalog = [broken, Product(other, price=2, quantity=10)]
+    with ShardedStore(catalog, shards=2) as sharded_store:
+        with pytest.raises(RuntimeError):
+            sharded_store.order_many([[(other, 1), ("broken", 1)]])
+        assert sharded_store.get_total_quantity() == 14
+        with pytest.raises(RuntimeError):
+            sharded_store.order_atomic([(other, 3), ("broken", 1)])
+        assert sharded_store.get_total_quantity() == 14
+        assert sharded_store.get_product(other).quantity == 9
+        assert sharded_store.order([(other, 9)]) == 18
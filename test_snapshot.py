@@ -0,0 +1,110 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import kinds
+import snapshot
+from columnar import ColumnarStore
+from products import LimitedProduct, NonStockedProduct, Product
+from promotions import PercentDiscount, ThirdOneFree
+from store import Store
+
+
+def make_store():
+    macbook = Product("MacBook Air M2", price=1450, quantity=100)
+    macbook.set_promotion(PercentDiscount("30% off!", percent=30))
+    earbuds = Product("Bose QuietComfort Earbuds", price=250, quantity=500)
+    earbuds.set_promotion(ThirdOneFree("Third One Free!"))
+    pixel = Product("Google Pixel 7", price=500, quantity=250)
+    pixel.deactivate()
+    return Store([
+        macbook, earbuds, pixel,
+        NonStockedProduct("Windows License", price=125),
+        LimitedProduct("Shipping", price=10, quantity=250,
+                       max_quantity_per_order=1),
+    ])
+
+
+# Test that a store saved to a snapshot loads back the same, lazily and
+# all at once.
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "store.snap")
+    original = make_store()
+    original.save(path)
+    for best_buy in (Store.load(path), Store.load(path, lazy=False),
+                     ColumnarStore.load(path, lazy=False)):
+        assert len(best_buy) == 5
+        assert ([product.show() for product in best_buy.product_list] ==
+                [product.show() for product in original.product_list])
+        assert ([type(product) for product in best_buy.product_list] ==
+                [type(product) for product in original.product_list])
+        assert (best_buy.get_inventory_summary() ==
+                original.get_inventory_summary())
+        assert best_buy.check_aggregates() == []
+    with pytest.raises(ValueError):
+        ColumnarStore.load(path)
+
+
+# Test that a lazily loaded store builds products on lookup and keeps
+# its indexes and totals up to date as products change.
+def test_lazy_store(tmp_path):
+    path = str(tmp_path / "store.snap")
+    make_store().save(path)
+    best_buy = Store.load(path)
+    assert best_buy.get_total_quantity() == 1100
+    assert best_buy.get_active_count() == 4
+    assert best_buy.get_product("Nope") is None
+    macbook = best_buy.get_product("MacBook Air M2")
+    assert macbook is best_buy.get_product("MacBook Air M2")
+    assert macbook in best_buy
+    assert best_buy.order([(macbook, 2)]) == 2030
+    assert best_buy.get_total_quantity() == 1098
+    pixel = best_buy.get_product("Google Pixel 7")
+    pixel.activate()
+    assert best_buy.get_active_count() == 5
+    best_buy.remove_product(best_buy.get_product("Shipping"))
+    assert best_buy.get_product("Shipping") is None
+    assert len(best_buy) == 4
+    best_buy.add_product(LimitedProduct("Shipping", price=20, quantity=5,
+                                        max_quantity_per_order=1))
+    assert best_buy.get_product("Shipping").price == 20
+    assert [product.name for product, _ in best_buy.iter_products()] == [
+        "MacBook Air M2", "Bose QuietComfort Earbuds", "Google Pixel 7",
+        "Windows License", "Shipping"]
+    assert best_buy.find("google pixel 7") is pixel
+    assert best_buy.check_aggregates() == []
+
+
+# Test that a file that is not a snapshot is rejected.
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "store.snap"
+    path.write_bytes(b"not a snapshot, just some text")
+    with pytest.raises(ValueError):
+        Store.load(str(path))
+
+
+# Test that saving over the file a lazy store maps leaves the store
+# readable and the new snapshot complete.
+def test_save_over_mapped_file(tmp_path):
+    path = str(tmp_path / "store.snap")
+    Store([Product(f"sku-{i}", price=1, quantity=1)
+           for i in range(2000)]).save(path)
+    best_buy = Store.load(path)
+    for i in range(1900):
+        best_buy.remove_product(best_buy.get_product(f"sku-{i}"))
+    best_buy.save(path)
+    assert best_buy.get_product("sku-1999").name == "sku-1999"
+    assert best_buy.get_total_quantity() == 100
+    assert len(Store.load(path)) == 100
+    assert [entry.name for entry in tmp_path.iterdir()] == ["store.snap"]
+
+
+# Test that the kind codes written to snapshots stay the same and that
+# the modules import in any order.
+def test_kinds_and_imports():
+    assert kinds.KINDS == ("product", "non_stocked", "limited")
+    for module in ("kinds", "catalog", "snapshot", "store", "main"):
+        subprocess.run([sys.executable, "-c", f"import {module}"],
+                       check=True, cwd=os.path.dirname(__file__))
@@ -0,0 +1,107 @@
+import math
+import sqlite3
+import threading
+
+import pytest
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import PercentDiscount, SecondHalfPrice
+from sqlite_store import SQLiteStore
+
+
+def make_products():
+    macbook = Product("MacBook Air M2", price=1450, quantity=100)
+    macbook.set_promotion(SecondHalfPrice("Second Half price!"))
+    windows = NonStockedProduct("Windows License", price=125)
+    windows.set_promotion(PercentDiscount("30% off!", percent=30))
+    return [macbook, windows,
+            LimitedProduct("Shipping", price=10, quantity=250,
+                           max_quantity_per_order=1)]
+
+
+# Test that orders decrement stock and are priced with promotions.
+def test_order_and_aggregates(tmp_path):
+    best_buy = SQLiteStore(make_products(), str(tmp_path / "store.db"))
+    assert best_buy.get_total_quantity() == 350
+    total = best_buy.order([(best_buy.get_product("MacBook Air M2"), 2),
+                            (best_buy.get_product("Windows License"), 1),
+                            (best_buy.get_product("Shipping"), 1)])
+    assert total == 1450 + 725 + 87.5 + 10
+    assert best_buy.get_total_quantity() == 347
+    best_buy.order([(best_buy.get_product("MacBook Air M2"), 98)])
+    assert [product.name for product in best_buy.get_all_products()] == [
+        "Windows License", "Shipping"]
+    best_buy.close()
+
+
+# Test that reopening a database restores the products and that
+# saving its promotions again reuses their rows.
+def test_reopen_reuses_promotions(tmp_path):
+    database = str(tmp_path / "store.db")
+    SQLiteStore(make_products(), database).close()
+    best_buy = SQLiteStore([], database)
+    macbook = best_buy.get_product("MacBook Air M2")
+    assert (macbook.price, macbook.get_quantity()) == (1450, 100)
+    assert best_buy.get_product("Shipping").max_quantity_per_order == 1
+    assert best_buy.get_product("Windows License").get_quantity() == math.inf
+    ipad = Product("iPad", price=500, quantity=5)
+    ipad.set_promotion(macbook.promotion)
+    pixel = Product("Google Pixel 7", price=500, quantity=5)
+    pixel.set_promotion(PercentDiscount("30% off!", percent=30))
+    best_buy.add_products([ipad, pixel])
+    assert best_buy.order([(best_buy.get_product("iPad"), 2),
+                           (best_buy.get_product("Google Pixel 7"), 1)]
+                          ) == 750 + 350
+    best_buy.close()
+    with sqlite3.connect(database) as connection:
+        (count,) = connection.execute(
+            "SELECT COUNT(*) FROM promotions").fetchone()
+    assert count == 2
+
+
+# Test that a promotion inserted by a batch that was rolled back is
+# inserted again with the next batch that uses it.
+def test_rolled_back_promotion(tmp_path):
+    database = str(tmp_path / "store.db")
+    best_buy = SQLiteStore(make_products(), database)
+    ipad = Product("iPad", price=500, quantity=5)
+    ipad.set_promotion(PercentDiscount("10% off!", percent=10))
+    with pytest.raises(sqlite3.IntegrityError):
+        best_buy.add_products([ipad, Product("Shipping", price=1,
+                                             quantity=1)])
+    best_buy.add_product(ipad)
+    best_buy.close()
+    best_buy = SQLiteStore([], database)
+    assert best_buy.get_product("iPad").promotion.name == "10% off!"
+    assert best_buy.order([(best_buy.get_product("iPad"), 2)]) == 900
+    best_buy.close()
+
+
+# Test that exceeding a per-order limit rolls the whole order back.
+def test_order_limit_rolls_back():
+    best_buy = SQLiteStore(make_products())
+    with pytest.raises(Exception):
+        best_buy.order([(best_buy.get_product("MacBook Air M2"), 2),
+                        (best_buy.get_product("Shipping"), 2)])
+    assert best_buy.get_total_quantity() == 350
+
+
+# Test that concurrent orders through the pool never oversell.
+def test_concurrent_orders(tmp_path):
+    best_buy = SQLiteStore([Product("Google Pixel 7", price=1,
+                                    quantity=200)],
+                           str(tmp_path / "store.db"))
+    pixel = best_buy.get_product("Google Pixel 7")
+    revenue = []
+
+    def shopper():
+        for _ in range(50):
+            revenue.append(best_buy.order([(pixel, 1)]))
+
+    threads = [threading.Thread(target=shopper) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(revenue) == 200
+    assert best_buy.get_total_quantity() == 0
+    best_buy.close()
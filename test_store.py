@@ -0,0 +1,373 @@
+import random
+import sys
+import threading
+
+import pytest
+import store
+from products import (Product, NonStockedProduct, LimitedProduct,
+                      InsufficientStockError)
+from promotions import PercentDiscount, SecondHalfPrice, ThirdOneFree
+from store import OrderError, Store
+
+
+def make_store():
+    return Store([
+        Product("MacBook Air M2", price=1450, quantity=100),
+        Product("Bose QuietComfort Earbuds", price=250, quantity=500),
+        NonStockedProduct("Windows License", price=125),
+        LimitedProduct("Shipping", price=10, quantity=250,
+                       max_quantity_per_order=1),
+    ])
+
+
+# Test that products can be looked up by name and removed.
+def test_lookup_and_remove():
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    assert macbook.price == 1450
+    assert macbook in best_buy
+    best_buy.remove_product(macbook)
+    assert macbook not in best_buy
+    assert best_buy.get_product("MacBook Air M2") is None
+    assert len(best_buy) == 3
+    # Removing a product twice is a no-op.
+    best_buy.remove_product(macbook)
+
+
+# Test that adding a different product with a taken name fails.
+def test_duplicate_name_rejected():
+    best_buy = make_store()
+    with pytest.raises(ValueError):
+        best_buy.add_product(Product("Shipping", price=5, quantity=1))
+
+
+# Test that product_list lists every product and refuses changes
+# instead of silently dropping them.
+def test_product_list_is_read_only():
+    best_buy = make_store()
+    catalog = best_buy.product_list
+    assert [product.name for product in catalog] == [
+        "MacBook Air M2", "Bose QuietComfort Earbuds", "Windows License",
+        "Shipping"]
+    assert catalog == best_buy.get_all_products()
+    extra = Product("Google Pixel 7", price=500, quantity=250)
+    with pytest.raises(TypeError):
+        catalog.append(extra)
+    with pytest.raises(TypeError):
+        catalog += [extra]
+    with pytest.raises(TypeError):
+        del catalog[0]
+    assert len(best_buy.product_list) == 4
+
+
+# Test that the active products index follows the products' state
+# and keeps the original ordering.
+def test_active_index_follows_products():
+    best_buy = make_store()
+    names = [p.name for p in best_buy.get_all_products()]
+    macbook = best_buy.get_product("MacBook Air M2")
+    macbook.deactivate()
+    assert macbook not in best_buy.get_all_products()
+    macbook.activate()
+    assert [p.name for p in best_buy.get_all_products()] == names
+    macbook.set_quantity(0)
+    assert macbook not in best_buy.get_all_products()
+
+
+# Test that the total quantity skips non-stocked products.
+def test_total_quantity():
+    best_buy = make_store()
+    assert best_buy.get_total_quantity() == 850
+    best_buy.order([(best_buy.get_product("MacBook Air M2"), 10)])
+    assert best_buy.get_total_quantity() == 840
+
+
+def make_promoted_store():
+    best_buy = make_store()
+    best_buy.add_product(Product("Google Pixel 7", price=500, quantity=25))
+    best_buy.get_product("MacBook Air M2").set_promotion(
+        SecondHalfPrice("Second Half price!"))
+    best_buy.get_product("Bose QuietComfort Earbuds").set_promotion(
+        ThirdOneFree("Third One Free!"))
+    best_buy.get_product("Windows License").set_promotion(
+        PercentDiscount("30% off!", percent=30))
+    return best_buy
+
+
+def random_orders(best_buy, seed):
+    rng = random.Random(seed)
+    catalog = best_buy.product_list
+    return [[(rng.choice(catalog), rng.randint(-1, 40))
+             for _ in range(rng.randint(1, 6))]
+            for _ in range(300)]
+
+
+# Test that order_many gives the same totals and final stock as
+# calling order for each shopping list in sequence.
+def test_order_many_matches_sequential_orders():
+    sequential = make_promoted_store()
+    batched = make_promoted_store()
+    expected = []
+    for shopping_list in random_orders(sequential, seed=7):
+        try:
+            expected.append(sequential.order(shopping_list))
+        except Exception:
+            expected.append(None)
+    results = batched.order_many(random_orders(batched, seed=7))
+    for total, (batch_total, errors) in zip(expected, results):
+        if total is None:
+            assert errors[-1].startswith("Cannot buy more than")
+        else:
+            assert batch_total == total
+    for before, after in zip(sequential.product_list,
+                             batched.product_list):
+        assert before.get_quantity() == after.get_quantity()
+        assert before.is_active() == after.is_active()
+
+
+# Test that many threads ordering from one store never oversell.
+def test_concurrent_orders_never_oversell(capsys):
+    catalog = [Product(f"sku-{i}", price=1, quantity=2000)
+               for i in range(2)]
+    best_buy = Store(catalog)
+    revenue = []
+
+    def shopper(seed):
+        rng = random.Random(seed)
+        for _ in range(2000):
+            shopping_list = [(rng.choice(catalog), rng.randint(1, 3))
+                             for _ in range(2)]
+            revenue.append(best_buy.order(shopping_list))
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=shopper, args=(seed,))
+                   for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    capsys.readouterr()
+    assert all(product.get_quantity() >= 0 for product in catalog)
+    assert sum(revenue) == 4000 - best_buy.get_total_quantity()
+    assert best_buy.get_all_products() == [
+        product for product in catalog if product.get_quantity() > 0]
+
+
+# Test that an atomic order applies every line when all of them
+# can be fulfilled.
+def test_order_atomic_commits_all_lines():
+    best_buy = make_promoted_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    shipping = best_buy.get_product("Shipping")
+    total = best_buy.order_atomic([(macbook, 3), (shipping, 1),
+                                   (macbook, 97)])
+    assert total == 2 * 1450 + 725 + 10 + 49 * 1450 + 48 * 725
+    assert macbook.get_quantity() == 0
+    assert not macbook.is_active()
+    assert shipping.get_quantity() == 249
+
+
+# Test that a failing line rejects the whole order without
+# touching stock, and every failed line is reported.
+def test_order_atomic_rolls_back_on_failure():
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    shipping = best_buy.get_product("Shipping")
+    earbuds = best_buy.get_product("Bose QuietComfort Earbuds")
+    earbuds.deactivate()
+    with pytest.raises(OrderError) as info:
+        best_buy.order_atomic([(macbook, 60), (shipping, 1),
+                               (macbook, 60), (shipping, 1),
+                               (earbuds, 1), (macbook, 0)])
+    assert [(error.index, error.reason)
+            for error in info.value.line_errors] == [
+        (2, "insufficient_stock"), (3, "order_limit"), (4, "inactive"),
+        (5, "invalid_quantity")]
+    assert macbook.get_quantity() == 100
+    assert shipping.get_quantity() == 250
+
+
+# Test that an order placed with order_atomic_cents can be undone
+# with restore_stock, reactivating products it sold out.
+def test_order_atomic_cents_restores_stock():
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    windows = best_buy.get_product("Windows License")
+    total_cents, previous = best_buy.order_atomic_cents(
+        [(macbook, 100), (windows, 2)])
+    assert total_cents == 100 * 145000 + 2 * 12500
+    assert not macbook.is_active()
+    best_buy.restore_stock(previous)
+    assert macbook.get_quantity() == 100
+    assert macbook.is_active()
+
+
+# Test that quotes do not change stock and match the order total.
+def test_quote_has_no_side_effects():
+    best_buy = make_promoted_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    shopping_list = [(macbook, 60), (macbook, 60),
+                     (best_buy.get_product("Windows License"), 2)]
+    total, errors = best_buy.quote(shopping_list)
+    assert len(errors) == 1
+    assert macbook.get_quantity() == 100
+    assert total == best_buy.order_many([shopping_list])[0][0]
+
+
+# Test that cached quote lines are reused and dropped when the
+# price or promotion of the product changes.
+def test_quote_cache_invalidation():
+    best_buy = make_promoted_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    assert best_buy.quote([(macbook, 2)])[0] == 2175
+    assert best_buy.quote([(macbook, 2)])[0] == 2175
+    best_buy.order([(macbook, 1)])
+    assert best_buy.quote([(macbook, 2)])[0] == 2175
+    assert best_buy.quote_cache_info()["hits"] == 2
+    macbook.set_price(1000)
+    assert best_buy.quote([(macbook, 2)])[0] == 1500
+    macbook.set_promotion(None)
+    assert best_buy.quote([(macbook, 2)])[0] == 2000
+    info = best_buy.quote_cache_info()
+    assert (info["hits"], info["misses"], info["size"]) == (2, 3, 1)
+
+
+# Test that listing pages through active products in insertion order.
+def test_iter_products_pages(monkeypatch):
+    best_buy = make_store()
+    names = [product.name for product, _ in best_buy.iter_products()]
+    assert names == ["MacBook Air M2", "Bose QuietComfort Earbuds",
+                     "Windows License", "Shipping"]
+    page = list(best_buy.iter_products(offset=1, limit=2))
+    assert [product.name for product, _ in page] == [
+        "Bose QuietComfort Earbuds", "Windows License"]
+    assert page[0][1] == page[0][0].show()
+    assert list(best_buy.iter_products(offset=10)) == []
+    with pytest.raises(ValueError):
+        list(best_buy.iter_products(offset=-1))
+
+    # Deactivating products while iterating neither skips nor repeats
+    # the others, even across chunks.
+    monkeypatch.setattr("store.LIST_CHUNK", 1)
+    listing = best_buy.iter_products()
+    first, _ = next(listing)
+    first.deactivate()
+    best_buy.get_product("Windows License").deactivate()
+    assert [product.name for product, _ in listing] == [
+        "Bose QuietComfort Earbuds", "Shipping"]
+
+
+# Test that cached listing text follows quantity, price and promotion
+# changes.
+def test_iter_products_cache_invalidation():
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+
+    def text():
+        return next(best_buy.iter_products(limit=1))[1]
+    assert text() is text()
+    macbook.buy(1)
+    assert "Quantity: 99" in text()
+    macbook.set_price(1000)
+    assert "Price: 1000.00" in text()
+    macbook.set_promotion(PercentDiscount("10% off!", percent=10))
+    assert text() == macbook.show()
+    assert text().endswith("Promotion: 10% off!")
+
+
+# Test that the inventory totals follow sales, price changes,
+# activation and removals.
+def test_inventory_aggregates():
+    best_buy = make_store()
+    summary = best_buy.get_inventory_summary()
+    assert summary["total_quantity"] == 850
+    assert summary["active_count"] == 4
+    assert summary["stock_value_cents"] == (1450 * 100 + 250 * 500 +
+                                            10 * 250) * 100
+    assert summary["by_type"]["NonStockedProduct"] == {
+        "products": 1, "active": 1, "quantity": 0, "stock_value_cents": 0}
+    assert best_buy.get_stock_value() == 1450 * 100 + 250 * 500 + 10 * 250
+
+    rng = random.Random(7)
+    catalog = best_buy.product_list
+    for _ in range(300):
+        product = rng.choice(catalog)
+        action = rng.randrange(5)
+        if action == 0 and product.is_active():
+            best_buy.order([(product, 1)])
+        elif action == 1:
+            product.set_price(rng.randint(1, 50))
+        elif action == 2 and not isinstance(product, NonStockedProduct):
+            product.set_quantity(rng.randint(0, 20))
+        elif action == 3:
+            if product in best_buy:
+                best_buy.remove_product(product)
+            else:
+                best_buy.add_product(product)
+        elif rng.random() < 0.5:
+            product.deactivate()
+        else:
+            product.activate()
+        assert best_buy.check_aggregates() == []
+    assert best_buy.get_active_count() == len(best_buy.get_all_products())
+
+
+# Test that held stock cannot be bought by others, is bought by the
+# holder, and comes back when released or expired.
+def test_holds(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(store, "monotonic", lambda: clock[0])
+    best_buy = make_store()
+    macbook = best_buy.get_product("MacBook Air M2")
+    windows = best_buy.get_product("Windows License")
+    cart = [best_buy.hold(macbook, 60, ttl=10),
+            best_buy.hold(windows, 5, ttl=10)]
+    assert macbook.get_quantity() == 40
+    assert best_buy.get_hold_count() == 2
+    assert best_buy.order([(macbook, 50)]) == 0
+    with pytest.raises(InsufficientStockError):
+        best_buy.hold(macbook, 41, ttl=10)
+    assert best_buy.order_holds(cart) == 60 * 1450 + 5 * 125
+    assert macbook.quantity == 40
+    assert macbook.get_quantity() == 40
+    assert best_buy.get_hold_count() == 0
+    assert not best_buy.release(cart[0])
+
+    early = best_buy.hold(macbook, 10, ttl=5)
+    late = best_buy.hold(macbook, 10, ttl=20)
+    assert best_buy.release(late)
+    assert macbook.get_quantity() == 30
+    clock[0] += 6
+    assert best_buy.order([(macbook, 40)]) == 40 * 1450
+    assert not early.active
+    assert best_buy.get_hold_count() == 0
+    assert not macbook.is_active()
+    assert best_buy.check_aggregates() == []
+    with pytest.raises(ValueError):
+        best_buy.hold(windows, 1, ttl=0)
+
+
+# Test that many holds expire in one pass and released holds are
+# compacted out of the expiry heap.
+def test_hold_expiry_in_bulk(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(store, "monotonic", lambda: clock[0])
+    earbuds = Product("Bose QuietComfort Earbuds", price=250,
+                      quantity=10000)
+    best_buy = Store([earbuds])
+    holds = [best_buy.hold(earbuds, 1, ttl=1 + i % 100)
+             for i in range(5000)]
+    for hold in holds[:3000]:
+        best_buy.release(hold)
+    assert len(best_buy._holds) < 5000
+    assert earbuds.get_quantity() == 8000
+    assert best_buy.expire_holds(now=50.5) == 1000
+    assert earbuds.get_quantity() == 9000
+    clock[0] = 100
+    best_buy.hold(earbuds, 1, ttl=1)
+    assert best_buy.get_hold_count() == 1
+    assert earbuds.get_quantity() == 9999